@@ -1,6 +1,9 @@
 import streamlit as st
 from src.chatbot_coordinator import ChatbotCoordinator
 from src.response_formatter import ResponseFormatter
+from src import data_loader
+from src.result_export import EXPORT_FORMATS, get_result_exporter
+import uuid
 import pandas as pd
 import geopandas as gpd
 import json
@@ -105,6 +108,8 @@ def initialize_session_state():
 
     if 'coordinator' not in st.session_state:
         st.session_state.coordinator = ChatbotCoordinator()
+        # Pick up new dataset releases without a restart (idempotent)
+        data_loader.store.start_watcher()
 
     if 'formatter' not in st.session_state:
         st.session_state.formatter = ResponseFormatter()
@@ -143,6 +148,8 @@ def display_chat_history():
 
             if "dataframe" in message:
                 st.dataframe(message["dataframe"])
+                if "result_id" in message:
+                    display_export(message["dataframe"], message["result_id"])
 
 
 def handle_user_input():
@@ -246,6 +253,45 @@ def prepare_geodataframe_for_display(df):
     return pd.DataFrame(display_df)
 
 
+def display_export(df, result_id):
+    """
+    Download controls for a result. The file is built (chunk by chunk) only
+    after "Prepare download" is clicked and then comes from the export cache,
+    so reruns don't re-encode the result.
+
+    Args:
+        df: DataFrame or GeoDataFrame of the result
+        result_id: Id stored with the chat message
+    """
+    ready_key = f"export_ready_{result_id}"
+    choice, prepare = st.columns([3, 1])
+    fmt = choice.selectbox(
+        "Export format",
+        list(EXPORT_FORMATS),
+        format_func=lambda f: EXPORT_FORMATS[f][0],
+        key=f"export_format_{result_id}",
+        label_visibility="collapsed"
+    )
+    if prepare.button("📦 Prepare download", key=f"export_prepare_{result_id}"):
+        st.session_state[ready_key] = fmt
+
+    ready = st.session_state.get(ready_key)
+    if ready:
+        label, extension, mime = EXPORT_FORMATS[ready]
+        try:
+            data = get_result_exporter().export(df, result_id, ready)
+        except Exception as e:
+            st.warning(f"⚠️ {label} export failed: {e}")
+            return
+        st.download_button(
+            label=f"📥 Download as {label}",
+            data=data,
+            file_name=f"query_results{extension}",
+            mime=mime,
+            key=f"download_{result_id}_{ready}"
+        )
+
+
 def display_response(response):
     """Display formatted response"""
     # Display text content
@@ -265,19 +311,9 @@ def display_response(response):
         else:
             st.dataframe(display_df, use_container_width=True)
 
-        # 🔧 FIX: Use a simpler unique key that doesn't hash the dataframe
-        import time
-        unique_key = f"download_{len(display_df)}_{int(time.time() * 1000000)}"
-
-        # Add download button
-        csv = display_df.to_csv(index=False)
-        st.download_button(
-            label="📥 Download as CSV",
-            data=csv,
-            file_name="query_results.csv",
-            mime="text/csv",
-            key=unique_key
-        )
+        # Exports are generated only when requested (see display_export)
+        result_id = uuid.uuid4().hex
+        display_export(df, result_id)
 
     # Display map if present
     if 'map_html' in response:
@@ -294,6 +330,7 @@ def display_response(response):
     # Streamlit can handle these specific types
     if 'dataframe' in response:
         message_to_store['dataframe'] = response['dataframe']
+        message_to_store['result_id'] = result_id
     if 'map_html' in response:
         message_to_store['map_html'] = response['map_html']
 
@@ -369,24 +406,20 @@ def display_sidebar():
         # 📈 DATABASE STATS - COOL!
         st.markdown("### 📈 Database Stats")
         try:
-            gdf = st.session_state.coordinator.query_processor.gdf
+            # Precomputed once per dataset version - no frame scans on rerun
+            stats = st.session_state.coordinator.query_processor.stats.summary()
 
             col1, col2 = st.columns(2)
             with col1:
-                st.metric("📍 Locations", f"{len(gdf):,}")
-                unique_films = gdf[['Title', 'Year']].drop_duplicates()
-                st.metric("🎬 Films", f"{len(unique_films):,}")
+                st.metric("📍 Locations", f"{stats['total_locations']:,}")
+                st.metric("🎬 Films", f"{stats['total_films']:,}")
 
             with col2:
-                unique_actors = pd.concat([
-                    gdf['Actor_1'], gdf['Actor_2'], gdf['Actor_3']
-                ]).dropna().nunique()
-                st.metric("⭐ Actors", f"{unique_actors:,}")
+                st.metric("⭐ Actors", f"{stats['unique_actors']:,}")
 
-                years = pd.to_numeric(gdf['Year'], errors='coerce').dropna()
-                if len(years) > 0:
+                if stats['year_min'] is not None:
                     st.metric(
-                        "📅 Years", f"{int(years.min())}-{int(years.max())}")
+                        "📅 Years", f"{stats['year_min']}-{stats['year_max']}")
         except Exception as e:
             st.info("Stats loading...")
        
@@ -0,0 +1,285 @@
+"""
+Artifact Writer Module
+Moves disk writes (map files, HTML reports) off the request path; JSONL
+logs have their own batched writer (src/logger.py).
+QueryProcessor submits each write as a task; a small pool of writer threads
+runs them from a bounded queue, so the answer reaches the user without
+waiting on serialization or the filesystem.
+
+When the queue is full (SF_FILM_ARTIFACT_QUEUE tasks waiting) the policy
+decides (SF_FILM_ARTIFACT_POLICY):
+    'block'        wait up to SF_FILM_ARTIFACT_BLOCK_SECONDS for a slot
+                   (backpressure), then drop the new task
+    'drop_newest'  drop the new task immediately
+    'drop_oldest'  drop the oldest waiting task to make room
+
+Pending tasks are flushed at interpreter exit. SF_FILM_ARTIFACT_WORKERS=0
+runs every task inline (the previous synchronous behaviour).
+"""
+
+import os
+import time
+import atexit
+import threading
+from collections import deque
+from typing import Dict, Any, Callable, Optional
+
+
+ARTIFACT_WORKERS = int(os.getenv('SF_FILM_ARTIFACT_WORKERS', '2'))
+ARTIFACT_QUEUE = int(os.getenv('SF_FILM_ARTIFACT_QUEUE', '64'))
+ARTIFACT_POLICY = os.getenv('SF_FILM_ARTIFACT_POLICY', 'block').strip().lower()
+ARTIFACT_BLOCK_SECONDS = float(os.getenv('SF_FILM_ARTIFACT_BLOCK_SECONDS', '1'))
+# Seconds given to pending writes at interpreter exit
+ARTIFACT_FLUSH_SECONDS = float(os.getenv('SF_FILM_ARTIFACT_FLUSH_SECONDS', '10'))
+
+ARTIFACT_POLICIES = ('block', 'drop_newest', 'drop_oldest')
+
+
+class _Task:
+    """One submitted write"""
+
+    __slots__ = ('name', 'fn', 'args', 'kwargs', 'submitted')
+
+    def __init__(self, name: str, fn: Callable, args: tuple, kwargs: dict):
+        self.name = name
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.submitted = time.perf_counter()
+
+
+class ArtifactWriter:
+    """
+    Bounded queue of write tasks served by background threads.
+    """
+
+    def __init__(self, num_workers: int = ARTIFACT_WORKERS, max_queue: int = ARTIFACT_QUEUE,
+                 policy: str = ARTIFACT_POLICY, block_seconds: float = ARTIFACT_BLOCK_SECONDS):
+        """
+        Initialize the writer and start its threads.
+
+        Args:
+            num_workers: Writer threads (0 runs tasks inline in submit())
+            max_queue: Tasks that may wait before the policy applies
+            policy: 'block', 'drop_newest' or 'drop_oldest'
+            block_seconds: How long 'block' waits for a free slot
+        """
+        if policy not in ARTIFACT_POLICIES:
+            raise ValueError(f"Unknown artifact policy '{policy}' (expected one of {ARTIFACT_POLICIES})")
+        self.num_workers = max(0, num_workers)
+        self.max_queue = max(1, max_queue)
+        self.policy = policy
+        self.block_seconds = block_seconds
+
+        self._tasks: deque = deque()
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self._idle = threading.Condition(self._lock)  # no task queued or running
+        self._running = 0
+        self._closed = False
+        self._stats = {"submitted": 0, "written": 0, "failed": 0, "dropped": 0,
+                       "submit_seconds": 0.0, "wait_seconds": 0.0, "write_seconds": 0.0,
+                       "max_wait_seconds": 0.0}
+
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"artifact-writer-{i}", daemon=True)
+            for i in range(self.num_workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, name: str, fn: Callable, *args: Any, **kwargs: Any) -> bool:
+        """
+        Queue a write; returns as soon as it is queued (or dropped).
+
+        Args:
+            name: Label used in warnings (e.g. 'report')
+            fn: Function doing the write
+            *args, **kwargs: Passed to fn
+
+        Returns:
+            True if the task was queued (or run), False if it was dropped
+        """
+        start = time.perf_counter()
+        task = _Task(name, fn, args, kwargs)
+        if not self.num_workers or self._closed:
+            # Inline mode, or after close(): the caller pays for the write
+            self._run(task)
+            self._record_submit(start)
+            return True
+
+        dropped = None
+        with self._lock:
+            if len(self._tasks) >= self.max_queue:
+                if self.policy == 'block':
+                    self._not_full.wait_for(lambda: len(self._tasks) < self.max_queue,
+                                            timeout=self.block_seconds)
+                elif self.policy == 'drop_oldest':
+                    dropped = self._tasks.popleft()
+            if len(self._tasks) >= self.max_queue:
+                dropped = task
+            else:
+                self._tasks.append(task)
+                self._not_empty.notify()
+            self._stats["submitted"] += 1
+            if dropped is not None:
+                self._stats["dropped"] += 1
+            self._stats["submit_seconds"] += time.perf_counter() - start
+
+        if dropped is not None:
+            print(f"⚠️ Artifact queue full ({self.policy}): dropped '{dropped.name}' write")
+        return dropped is not task
+
+    def _record_submit(self, start: float) -> None:
+        with self._lock:
+            self._stats["submitted"] += 1
+            self._stats["submit_seconds"] += time.perf_counter() - start
+
+    def _worker(self) -> None:
+        while True:
+            with self._lock:
+                self._not_empty.wait_for(lambda: self._tasks or self._closed)
+                if not self._tasks:
+                    return  # closed and drained
+                task = self._tasks.popleft()
+                self._running += 1
+                self._not_full.notify()
+            try:
+                self._run(task)
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    if not self._tasks and not self._running:
+                        self._idle.notify_all()
+
+    def _run(self, task: _Task) -> None:
+        """Run one task, recording how long it waited and how long it took"""
+        started = time.perf_counter()
+        try:
+            task.fn(*task.args, **task.kwargs)
+            ok = True
+        except Exception as e:
+            print(f"⚠️ Artifact write '{task.name}' failed: {e}")
+            ok = False
+        finished = time.perf_counter()
+        with self._lock:
+            self._stats["written" if ok else "failed"] += 1
+            wait = started - task.submitted
+            self._stats["wait_seconds"] += wait
+            self._stats["max_wait_seconds"] = max(self._stats["max_wait_seconds"], wait)
+            self._stats["write_seconds"] += finished - started
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until every queued write has finished.
+
+        Args:
+            timeout: Seconds to wait at most (None waits indefinitely)
+
+        Returns:
+            True if the queue drained, False on timeout
+        """
+        with self._lock:
+            return self._idle.wait_for(lambda: not self._tasks and not self._running, timeout=timeout)
+
+    def close(self, timeout: Optional[float] = ARTIFACT_FLUSH_SECONDS) -> bool:
+        """
+        Flush pending writes and stop the threads. Later submits run inline.
+
+        Args:
+            timeout: Seconds to wait for pending writes
+
+        Returns:
+            True if everything was written
+        """
+        drained = self.flush(timeout)
+        with self._lock:
+            self._closed = True
+            pending = len(self._tasks)
+            self._not_empty.notify_all()
+        if pending:
+            print(f"⚠️ Artifact writer closed with {pending} writes pending")
+        return drained
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get writer counters and latencies.
+
+        Returns:
+            Dictionary of task counts, queue depth, mean submit latency (the
+            request-path cost), mean/max queue wait and mean write time
+        """
+        with self._lock:
+            submitted = self._stats["submitted"]
+            done = self._stats["written"] + self._stats["failed"]
+            return {
+                "submitted": submitted,
+                "written": self._stats["written"],
+                "failed": self._stats["failed"],
+                "dropped": self._stats["dropped"],
+                "queued": len(self._tasks),
+                "running": self._running,
+                "workers": self.num_workers,
+                "policy": self.policy,
+                "mean_submit_ms": 1000 * self._stats["submit_seconds"] / submitted if submitted else 0.0,
+                "mean_wait_ms": 1000 * self._stats["wait_seconds"] / done if done else 0.0,
+                "max_wait_ms": 1000 * self._stats["max_wait_seconds"],
+                "mean_write_ms": 1000 * self._stats["write_seconds"] / done if done else 0.0
+            }
+
+
+_shared_writer: Optional[ArtifactWriter] = None
+_shared_lock = threading.Lock()
+
+
+def get_artifact_writer() -> ArtifactWriter:
+    """
+    Get the process-wide artifact writer shared by all sessions
+    (flushed at interpreter exit).
+
+    Returns:
+        Shared ArtifactWriter
+    """
+    global _shared_writer
+    with _shared_lock:
+        if _shared_writer is None:
+            _shared_writer = ArtifactWriter()
+            atexit.register(_shared_writer.close)
+        return _shared_writer
+
+
+if __name__ == "__main__":
+    # Request-path latency of one map query's map and report writes, inline vs queued
+    import tempfile
+    from pathlib import Path
+    from src import data_loader
+    from src.map_analyzer import MapDataAnalyzer
+    from src.map_generator import MapGenerator, embed_html
+    from src.map_embed_in_html import embed_in_custom_html
+
+    gdf = data_loader.store.current().gdf
+    execution_result = {"success": True, "data": {"data": gdf, "summary": "All locations", "metadata": {}}}
+    analysis = MapDataAnalyzer(gdf).analyze(execution_result["data"], "all locations")
+    document = MapGenerator().render_map(analysis["location_data"], use_cache=False)
+    map_html = embed_html(document)
+    out_dir = tempfile.mkdtemp()
+
+    def query_writes(writer: ArtifactWriter, i: int) -> float:
+        """The writes of one map query, as QueryProcessor submits them"""
+        start = time.perf_counter()
+        writer.submit('map', (Path(out_dir) / f"map_{i}.html").write_text, document, encoding='utf-8')
+        writer.submit('report', embed_in_custom_html, f"q{i}", execution_result, map_html,
+                      output_dir=out_dir)
+        return time.perf_counter() - start
+
+    queries = 5
+    for label, workers in (('inline', 0), ('queued', ARTIFACT_WORKERS or 2)):
+        writer = ArtifactWriter(num_workers=workers)
+        latencies = [query_writes(writer, i) for i in range(queries)]
+        flush_start = time.perf_counter()
+        writer.close()
+        stats = writer.get_stats()
+        print(f"📊 {label:7s} request path {1000 * sum(latencies) / queries:8.2f} ms per query "
+              f"(write {stats['mean_write_ms']:.1f} ms per task, max queue wait "
+              f"{stats['max_wait_ms']:.0f} ms, flush {1000 * (time.perf_counter() - flush_start):.0f} ms)")
@@ -4,12 +4,67 @@ Handles safe execution of dynamically generated GeoPandas code with proper
 namespace setup, error handling, and result formatting.
 """
 
+import hashlib
+import threading
 import traceback
+from collections import OrderedDict
+from types import CodeType
 import pandas as pd
 import geopandas as gpd
 import numpy as np
 from shapely.geometry import Point
-from typing import Dict, Any, Optional, Callable
+from src.code_validator import CodeValidator
+from src.code_optimizer import CodeOptimizer
+from src.sandbox_pool import (SandboxPool, get_sandbox_pool, SANDBOX_WORKERS, POOL_CLOSED_STATUS,
+                              _failure_result)
+from src.result_cache import ResultCache, get_result_cache, RESULT_CACHE_MB
+from src.code_profiler import ExecutionProfiler, PROFILE_MODE, PROFILE_MODES
+from src.logger import write_to_log_file
+from typing import Dict, Any, List, Optional, Callable, Tuple
+
+
+# Scripts receive a shallow view of the shared frame; with Copy-on-Write any
+# write to the view copies the touched block instead of mutating shared data.
+# pandas >= 3.0 always behaves this way (and deprecates the option).
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option('mode.copy_on_write', True)
+
+
+def _buffer_token(values: Any) -> Any:
+    """Identify the memory behind a block's values (changes when a block is copied)"""
+    if isinstance(values, np.ndarray):
+        return values.__array_interface__['data'][0]
+    arrow_data = getattr(values, '_pa_array', None)  # Arrow-backed extension arrays
+    if arrow_data is not None:
+        return tuple(buf.address for chunk in arrow_data.chunks
+                     for buf in chunk.buffers() if buf is not None)
+    inner = getattr(values, '_data', getattr(values, '_ndarray', None))  # e.g. GeometryArray
+    if isinstance(inner, np.ndarray):
+        return inner.__array_interface__['data'][0]
+    return id(values)
+
+
+def _caught_error(formatted: Dict[str, Any]) -> Optional[str]:
+    """Error a script caught itself and reported in its result's metadata (the template's except branch)"""
+    data = formatted.get("data")
+    if isinstance(data, dict) and isinstance(data.get("metadata"), dict):
+        return data["metadata"].get("error")
+    return None
+
+
+def _frame_fingerprint(df: pd.DataFrame) -> Dict[str, Any]:
+    """Cheap O(#columns) fingerprint of a frame's layout and data buffers"""
+    buffers = {}
+    for block in df._mgr.blocks:
+        token = _buffer_token(block.values)
+        for column in df.columns[block.mgr_locs.indexer]:
+            buffers[column] = token
+    return {
+        "columns": list(df.columns),
+        "index": df.index,
+        "crs": getattr(df, 'crs', None),
+        "buffers": buffers
+    }
 
 
 class CodeExecutor:
@@ -18,15 +73,124 @@ class CodeExecutor:
     Provides namespace setup, execution monitoring, and standardized result formatting.
     """
     
-    def __init__(self, gdf: gpd.GeoDataFrame):
+    # Filename shown in tracebacks of generated code
+    CODE_FILENAME = "<generated_query>"
+
+    def __init__(
+        self,
+        gdf: gpd.GeoDataFrame,
+        compile_cache_size: int = 128,
+        dataset_version: Optional[str] = None,
+        sandbox_workers: int = SANDBOX_WORKERS,
+        max_complexity: Optional[str] = 'O(k*n)',
+        optimize: bool = True,
+        cache_results: bool = True,
+        profile: str = PROFILE_MODE
+    ):
         """
         Initialize the CodeExecutor with the target GeoDataFrame.
         
         Args:
             gdf: The GeoPandas dataframe to operate on
+            compile_cache_size: Max number of compiled code objects kept (LRU)
+            dataset_version: Version of gdf; executors of the same version share a sandbox pool
+            sandbox_workers: Run code in this many pre-forked worker processes
+                (0 executes in the calling thread)
+            max_complexity: Reject code whose estimated cost class is higher
+                (see code_validator.COMPLEXITY_LEVELS; None disables)
+            optimize: Rewrite slow pandas idioms into vectorized form before
+                compiling (see CodeOptimizer)
+            cache_results: Memoize successful results (see ResultCache); shared
+                by all executors when dataset_version is given
+            profile: Default profiling mode for execute_code - '' (off),
+                'basic' or 'lines' (see code_profiler)
         """
+        if profile not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode '{profile}' (expected one of {PROFILE_MODES})")
         self.gdf = gdf
+        self.dataset_version = dataset_version
+        self.validator = CodeValidator(max_complexity=max_complexity,
+                                       extra_attributes={str(c) for c in gdf.columns})
+        self.profile = profile
+        self.optimizer = CodeOptimizer(text_columns=self._text_columns(gdf)) if optimize else None
+        self.sandbox: Optional[SandboxPool] = None
+        if sandbox_workers > 0:
+            if dataset_version is not None:
+                self.sandbox = get_sandbox_pool(gdf, dataset_version, sandbox_workers)
+            else:
+                self.sandbox = SandboxPool(gdf, num_workers=sandbox_workers)
+        self.result_cache: Optional[ResultCache] = None
+        if cache_results and RESULT_CACHE_MB > 0:
+            self.result_cache = get_result_cache() if dataset_version is not None else ResultCache()
+        self.compile_cache_size = compile_cache_size
+        # key -> (code object, applied rewrites, compiled source)
+        self._compile_cache: "OrderedDict[str, Tuple[CodeType, List[Dict[str, Any]], str]]" = OrderedDict()
+        self._compile_lock = threading.Lock()
+        self._compile_stats = {"hits": 0, "misses": 0}
+        # Hashes of scripts whose optimized form failed; they run unoptimized
+        # from then on (LRU, bounded like the compile cache)
+        self._optimization_failures: "OrderedDict[str, None]" = OrderedDict()
+        self._gdf_fingerprint = self._fingerprint(gdf)
         self.base_namespace = self._setup_base_namespace()
+
+    @staticmethod
+    def _fingerprint(df: pd.DataFrame) -> Optional[Dict[str, Any]]:
+        """Fingerprint a frame, or None if this pandas version's internals differ"""
+        try:
+            return _frame_fingerprint(df)
+        except Exception:
+            return None
+
+    @staticmethod
+    def _text_columns(df: pd.DataFrame) -> set:
+        """Columns whose non-null values are all strings"""
+        columns = set()
+        for column in df.columns:
+            series = df[column]
+            if pd.api.types.is_string_dtype(series.dtype) and not isinstance(series.dtype, pd.CategoricalDtype):
+                if series.dropna().map(type).eq(str).all():
+                    columns.add(column)
+        return columns
+
+    def _dataset_view(self) -> gpd.GeoDataFrame:
+        """
+        Get a copy-free view of the shared dataset for one execution.
+        The view shares all data buffers; Copy-on-Write makes any write
+        land in a private copy, so scripts don't need gdf.copy().
+        """
+        return self.gdf.copy(deep=False)
+
+    def _detect_dataset_writes(self, view: pd.DataFrame) -> List[str]:
+        """
+        Compare a view handed to generated code with the shared frame.
+
+        Args:
+            view: The view passed to the script as 'gdf'
+
+        Returns:
+            Descriptions of the writes the script attempted (empty if none)
+        """
+        if self._gdf_fingerprint is None:
+            return []
+        after = self._fingerprint(view)
+        if after is None:
+            return []
+
+        before = self._gdf_fingerprint
+        writes = []
+        if after["columns"] != before["columns"]:
+            added = [c for c in after["columns"] if c not in before["columns"]]
+            removed = [c for c in before["columns"] if c not in after["columns"]]
+            writes.append(f"columns changed (added={added}, removed={removed})")
+        if not after["index"].equals(before["index"]):
+            writes.append("index changed")
+        if after["crs"] != before["crs"]:
+            writes.append("crs changed")
+        modified = [c for c, token in before["buffers"].items()
+                    if c in after["buffers"] and after["buffers"][c] != token]
+        if modified:
+            writes.append(f"values written in columns {modified}")
+        return writes
     
     def _setup_base_namespace(self) -> Dict[str, Any]:
         """
@@ -65,11 +229,91 @@ class CodeExecutor:
 result = {function_name}(gdf)
 """
     
+    def _get_compiled(
+        self, code: str, function_name: str, optimize: bool = True
+    ) -> Tuple[CodeType, bool, List[Dict[str, Any]], str]:
+        """
+        Get the compiled code object for a script, compiling it on first use.
+        The optimizer rewrite and the _prepare_code wrapper are applied once,
+        before compilation.
+        
+        Args:
+            code: The Python code to execute
+            function_name: Name of the main function to call
+            optimize: Apply the CodeOptimizer rewrites
+            
+        Returns:
+            Tuple of (code object, True if it came from the cache, applied
+            rewrites, source that was compiled)
+        """
+        digest = self._code_digest(code)
+        with self._compile_lock:
+            failed = digest in self._optimization_failures
+        optimize = optimize and self.optimizer is not None and not failed
+        key = hashlib.sha256(f"{function_name}\0{int(optimize)}\0{code}".encode('utf-8')).hexdigest()
+
+        with self._compile_lock:
+            cached = self._compile_cache.get(key)
+            if cached is not None:
+                self._compile_cache.move_to_end(key)
+                self._compile_stats["hits"] += 1
+                return cached[0], True, cached[1], cached[2]
+
+        rewrites: List[Dict[str, Any]] = []
+        if optimize:
+            code, rewrites = self.optimizer.optimize(code, function_name)
+
+        # Compile outside the lock; a SyntaxError propagates and is not cached
+        source = self._prepare_code(code, function_name)
+        compiled = compile(source, self.CODE_FILENAME, "exec")
+
+        with self._compile_lock:
+            self._compile_stats["misses"] += 1
+            self._compile_cache[key] = (compiled, rewrites, source)
+            self._compile_cache.move_to_end(key)
+            while len(self._compile_cache) > self.compile_cache_size:
+                self._compile_cache.popitem(last=False)
+        return compiled, False, rewrites, source
+
+    @staticmethod
+    def _code_digest(code: str) -> str:
+        return hashlib.sha256(code.encode('utf-8')).hexdigest()
+
+    def _record_optimization_failure(self, code: str) -> None:
+        """Run this script unoptimized from now on"""
+        digest = self._code_digest(code)
+        with self._compile_lock:
+            self._optimization_failures[digest] = None
+            self._optimization_failures.move_to_end(digest)
+            while len(self._optimization_failures) > self.compile_cache_size:
+                self._optimization_failures.popitem(last=False)
+
+    def get_compile_stats(self) -> Dict[str, Any]:
+        """
+        Get compiled-code cache statistics.
+        
+        Returns:
+            Dictionary with hits (compilations skipped), misses, size and hit rate
+        """
+        with self._compile_lock:
+            hits = self._compile_stats["hits"]
+            misses = self._compile_stats["misses"]
+            return {
+                "hits": hits,
+                "misses": misses,
+                "size": len(self._compile_cache),
+                "max_size": self.compile_cache_size,
+                "hit_rate": hits / (hits + misses) if hits + misses else 0.0
+            }
+
     def execute_code(
         self, 
         code: str, 
         function_name: str = "process_sf_film_query",
-        custom_namespace: Optional[Dict[str, Any]] = None
+        custom_namespace: Optional[Dict[str, Any]] = None,
+        optimize: bool = True,
+        profile: Optional[str] = None,
+        cancel_event: Optional[threading.Event] = None
     ) -> Dict[str, Any]:
         """
         Execute the provided code and return formatted results.
@@ -78,28 +322,152 @@ result = {function_name}(gdf)
             code: The Python code to execute
             function_name: Name of the main function to call
             custom_namespace: Additional variables to add to the namespace
+            optimize: Run the optimizer rewrites (ignored if the executor was
+                created with optimize=False)
+            profile: Profiling mode for this run ('', 'basic' or 'lines');
+                defaults to the executor's. Profiled runs bypass the result
+                cache, report under metadata['profile'] and are logged to
+                log/code_profiles.jsonl
+            cancel_event: Abandon the run once this is set - a sandboxed job
+                is killed mid-run, an in-process one is only skipped if it
+                has not started yet
             
         Returns:
             Dictionary containing execution results and metadata
+
+        Raises:
+            ValueError: If profile is not one of code_profiler.PROFILE_MODES
         """
+        profile = self.profile if profile is None else profile
+        if profile not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode '{profile}' (expected one of {PROFILE_MODES})")
+        if profile:
+            formatted = self._execute_uncached(code, function_name, custom_namespace, optimize,
+                                               profile, cancel_event)
+            self._log_profile(code, formatted)
+            return formatted
+
+        cache_key = None
+        if self.result_cache is not None:
+            cache_key = ResultCache.make_key(code, self.dataset_version or '', custom_namespace,
+                                             function_name, optimize and self.optimizer is not None)
+            if cache_key is not None:
+                cached = self.result_cache.get(cache_key)
+                if cached is not None:
+                    cached["metadata"]["result_cache_hit"] = True
+                    return cached
+
+        formatted = self._execute_uncached(code, function_name, custom_namespace, optimize,
+                                           cancel_event=cancel_event)
+        formatted["metadata"]["result_cache_hit"] = False
+        # A script that caught its own error reports success; don't keep that
+        if cache_key is not None and formatted["success"] and not _caught_error(formatted):
+            self.result_cache.put(cache_key, formatted)
+        return formatted
+
+    def _execute_uncached(
+        self,
+        code: str,
+        function_name: str,
+        custom_namespace: Optional[Dict[str, Any]],
+        optimize: bool,
+        profile: str = '',
+        cancel_event: Optional[threading.Event] = None
+    ) -> Dict[str, Any]:
+        """Run the code (in the sandbox or in-process) without consulting the result cache"""
+        if cancel_event is not None and cancel_event.is_set():
+            return _failure_result("CancelledError", "Execution was cancelled", "cancelled")
+
+        if self.sandbox is not None and not self.sandbox.closed:
+            # Time- and memory-limited worker process; it runs this same
+            # method in-process on its side
+            formatted = self.sandbox.execute(code, function_name, custom_namespace,
+                                             optimize=optimize and self.optimizer is not None,
+                                             profile=profile, cancel_event=cancel_event)
+            if formatted["metadata"].get("execution_status") != POOL_CLOSED_STATUS:
+                return formatted
+            # The dataset version was retired while this job waited for a
+            # worker; the pool is closed now, so this runs in-process
+            return self._execute_uncached(code, function_name, custom_namespace, optimize,
+                                          profile, cancel_event)
+
         # Create execution namespace
         namespace = self.base_namespace.copy()
+        # Fresh copy-free view per run - the shared frame itself is never exposed
+        dataset_view = self._dataset_view()
+        namespace["gdf"] = dataset_view
         if custom_namespace:
             namespace.update(custom_namespace)
         
+        compile_cache_hit = False
+        rewrites: List[Dict[str, Any]] = []
+        profiler = None
         try:
-            # Prepare the complete code
-            full_code = self._prepare_code(code, function_name)
+            # Optimize, prepare and compile the complete code (cached by source hash)
+            compiled, compile_cache_hit, rewrites, source = self._get_compiled(code, function_name, optimize)
             
             # Execute the code
-            exec(full_code, namespace)
+            if profile:
+                profiler = ExecutionProfiler(profile, self.CODE_FILENAME, source)
+                with profiler:
+                    exec(compiled, namespace)
+            else:
+                exec(compiled, namespace)
             
             # Extract and format the result
-            return self._format_success_result(namespace.get('result'))
+            formatted = self._format_success_result(namespace.get('result'))
             
         except Exception as e:
-            return self._format_error_result(e)
+            formatted = self._format_error_result(e)
+
+        caught_error = _caught_error(formatted)
+        if rewrites and (not formatted["success"] or caught_error):
+            # A rewrite may not hold for this data (e.g. unexpected dtypes);
+            # the original code is the reference, so run it as written. The
+            # generated try/except turns a failure into a result with
+            # metadata['error'], so that counts as failing too.
+            error_type = formatted["metadata"].get("error_type", "error caught by the script")
+            print(f"⚠️ Optimized code failed ({error_type}), re-running original code")
+            self._record_optimization_failure(code)
+            fallback = self._execute_uncached(code, function_name, custom_namespace, False, profile,
+                                              cancel_event)
+            fallback["metadata"]["optimizations"] = {
+                "applied": [],
+                "reverted": rewrites,
+                "error": formatted["metadata"].get("error", caught_error)
+            }
+            return fallback
+
+        formatted["metadata"]["compile_cache_hit"] = compile_cache_hit
+        if profiler is not None:
+            formatted["metadata"]["profile"] = profiler.report()
+        if rewrites:
+            formatted["metadata"]["optimizations"] = {"applied": rewrites}
+
+        writes = self._detect_dataset_writes(dataset_view)
+        if writes:
+            print(f"⚠️ Generated code wrote to the dataset view (shared data untouched): {writes}")
+            formatted["metadata"]["dataset_writes"] = writes
+        return formatted
     
+    def _log_profile(self, code: str, formatted: Dict[str, Any]) -> None:
+        """Append a profiled run to log/code_profiles.jsonl"""
+        profile = formatted["metadata"].get("profile")
+        if profile is None:
+            return
+        write_to_log_file(
+            {
+                "code": code,
+                "success": formatted["success"],
+                "dataset_version": self.dataset_version,
+                "optimizations": formatted["metadata"].get("optimizations"),
+                "profile": profile
+            },
+            'code_profiles.jsonl',
+            hashlib.sha256(code.encode('utf-8')).hexdigest()[:16],
+            jsonlines_flag=True
+        )
+
     def _format_success_result(self, result: Any) -> Dict[str, Any]:
         """
         Format a successful execution result.
@@ -233,42 +601,17 @@ result = {function_name}(gdf)
     
     def validate_code(self, code: str) -> Dict[str, Any]:
         """
-        Perform basic validation on code before execution.
+        Validate code before execution: AST-based safety checks plus a static
+        cost estimate (see CodeValidator).
         
         Args:
             code: The code to validate
             
         Returns:
-            Validation result dictionary
+            Validation result dictionary with 'is_valid', 'issues',
+            'code_length' and 'cost' (estimated complexity and findings)
         """
-        issues = []
-        
-        # Check for potentially dangerous operations
-        dangerous_patterns = [
-            'import os',
-            'import sys',
-            'import subprocess',
-            'exec(',
-            'eval(',
-            # 'open(',
-            '__import__',
-            'globals()',
-            'locals()'
-        ]
-        
-        for pattern in dangerous_patterns:
-            if pattern in code:
-                issues.append(f"Potentially unsafe operation detected: {pattern}")
-        
-        # Check for required function
-        if 'def process_sf_film_query(' not in code:
-            issues.append("Required function 'process_sf_film_query' not found")
-        
-        return {
-            "is_valid": len(issues) == 0,
-            "issues": issues,
-            "code_length": len(code)
-        }
+        return self.validator.validate(code)
     
     def execute_with_validation(self, code: str, **kwargs) -> Dict[str, Any]:
         """
@@ -0,0 +1,581 @@
+"""
+Code Optimizer Module
+AST rewrite pass that runs between code generation and execution. It
+pattern-matches slow idioms that LLM-written scripts use often and
+rewrites them into vectorized pandas equivalents:
+
+- Series.apply(lambda x: x.lower()) and friends  -> Series.str.lower()
+- Series.apply(lambda x: 'abc' in x)              -> Series.str.contains('abc', regex=False, na=False)
+- Series.apply(lambda x: x in [a, b])             -> Series.isin([a, b])
+- (s == a) | (s == b) | ...                       -> s.isin([a, b, ...])
+- for _, row in df.iterrows(): out.append(row[c]) -> out.extend(df[c].tolist())   (optionally filtered)
+- for _, row in df.iterrows(): counts[row[c]] ... -> one groupby(c).size() pass
+- identical .str.contains(...) masks              -> computed once and reused
+
+Every rewrite is recorded so execution metadata can report what changed.
+Rewrites only fire on shapes whose vectorized form gives the same result
+for non-null data, and only on columns of names known to hold a frame
+(gdf, copies and filters of it) - row['col'] inside a row-wise apply is a
+scalar. CodeExecutor re-runs the original code if the optimized version
+raises or reports an error it caught itself.
+"""
+
+import ast
+import copy
+from typing import Dict, Any, List, Optional, Set, Tuple
+
+
+# Zero-argument string methods that exist on the .str accessor
+_STR_METHODS = {
+    'lower', 'upper', 'strip', 'lstrip', 'rstrip', 'title', 'capitalize',
+    'casefold', 'swapcase', 'isdigit', 'isalpha', 'isalnum', 'isspace',
+    'islower', 'isupper', 'istitle', 'isnumeric', 'isdecimal',
+    'startswith', 'endswith', 'replace', 'split', 'rsplit', 'zfill', 'center',
+    'ljust', 'rjust', 'find', 'rfind',
+}
+# (count is left out: Series.str.count always treats its pattern as a regex)
+
+# Methods whose pandas pattern may be a regex: passed regex=False to match str
+_LITERAL_PATTERN_METHODS = {'replace', 'split'}
+# str.split(sep, maxsplit) -> .str.split(sep, n=maxsplit) (n is keyword-only)
+_SPLIT_METHODS = {'split', 'rsplit'}
+
+# Series methods that return a Series
+_SERIES_METHODS = {
+    'dropna', 'fillna', 'astype', 'head', 'tail', 'sort_values', 'drop_duplicates', 'copy',
+}
+
+# Frame methods that return a frame (rows or columns of the receiver)
+_FRAME_METHODS = {
+    'copy', 'dropna', 'fillna', 'head', 'tail', 'sort_values', 'drop_duplicates',
+    'reset_index', 'query', 'to_crs', 'drop', 'sample', 'nlargest', 'nsmallest',
+    'set_geometry', 'rename',
+}
+
+# Subscripts of a frame that select rows (a boolean mask, a slice) or columns (a list)
+_ROW_SELECTORS = (ast.Compare, ast.UnaryOp, ast.Call, ast.List, ast.Slice)
+
+# Calls that mutate their receiver - block mask hoisting past them
+_MUTATING_METHODS = {
+    'update', 'insert', 'pop', 'append', 'extend', 'clear', 'remove',
+    'setdefault', 'popitem', 'set_crs',
+}
+
+
+def _names_in(node: ast.AST) -> Set[str]:
+    return {n.id for n in ast.walk(node) if isinstance(n, ast.Name)}
+
+
+def _is_constant(node: ast.AST) -> bool:
+    return isinstance(node, ast.Constant) or (
+        isinstance(node, (ast.List, ast.Tuple, ast.Set))
+        and all(isinstance(e, ast.Constant) for e in node.elts)
+    )
+
+
+def _is_column(node: ast.AST) -> bool:
+    """df['col'] - statically known to be a Series"""
+    return (isinstance(node, ast.Subscript) and isinstance(node.value, (ast.Name, ast.Attribute))
+            and isinstance(node.slice, ast.Constant) and isinstance(node.slice.value, str))
+
+
+def _is_frame_column(node: ast.AST, frames: Set[str]) -> bool:
+    """df['col'] where df is one of the known frame names"""
+    return _is_column(node) and isinstance(node.value, ast.Name) and node.value.id in frames
+
+
+def _is_series(node: ast.AST, frames: Set[str]) -> bool:
+    """df['col'] optionally followed by Series-returning calls such as .dropna()"""
+    while (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)
+           and node.func.attr in _SERIES_METHODS):
+        node = node.func.value
+    return _is_frame_column(node, frames)
+
+
+def _is_frame(node: ast.AST, frames: Set[str]) -> bool:
+    """Expression statically known to be a frame: a frame name, a copy or a filter of one"""
+    if isinstance(node, ast.Name):
+        return node.id in frames
+    if isinstance(node, ast.Call):
+        func = node.func
+        if isinstance(func, ast.Attribute) and func.attr in _FRAME_METHODS:
+            return _is_frame(func.value, frames)
+        # gpd.GeoDataFrame(df) / pd.DataFrame(df)
+        return (isinstance(func, ast.Attribute) and func.attr in ('GeoDataFrame', 'DataFrame')
+                and bool(node.args) and _is_frame(node.args[0], frames))
+    if isinstance(node, ast.Subscript) and (
+            isinstance(node.slice, _ROW_SELECTORS)
+            or (isinstance(node.slice, ast.BinOp) and isinstance(node.slice.op, (ast.BitAnd, ast.BitOr)))):
+        value = node.value
+        if isinstance(value, ast.Attribute) and value.attr in ('loc', 'iloc'):
+            value = value.value
+        return _is_frame(value, frames)
+    return False
+
+
+def _frame_names(tree: ast.AST, function_name: str) -> Set[str]:
+    """
+    Names that only ever hold a frame: gdf (the dataset, also as the first
+    parameter of the entry function), and names whose every assignment is a
+    copy or filter of a frame name. Anything bound another way (loop and
+    comprehension targets, lambda and other parameters, unpacking) is not.
+    """
+    sources: Dict[str, List[ast.AST]] = {}
+    excluded: Set[str] = set()
+    frame_params: Set[str] = set()
+    assigned = set()
+
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Assign, ast.AnnAssign)) and node.value is not None:
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            for target in targets:
+                if isinstance(target, ast.Name):
+                    sources.setdefault(target.id, []).append(node.value)
+                    assigned.add(id(target))
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda)):
+            params = node.args.posonlyargs + node.args.args
+            for i, param in enumerate(params + node.args.kwonlyargs):
+                if (i == 0 and isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef))
+                        and node.name == function_name):
+                    frame_params.add(param.arg)
+                else:
+                    excluded.add(param.arg)
+            for param in (node.args.vararg, node.args.kwarg):
+                if param is not None:
+                    excluded.add(param.arg)
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and not isinstance(node.ctx, ast.Load) and id(node) not in assigned:
+            excluded.add(node.id)
+
+    seeds = ({'gdf'} | frame_params) - excluded
+    # A seed that is also assigned something else (e.g. gdf = 5) is not a frame
+    frames = {name for name in seeds if all(_is_frame(value, seeds) for value in sources.get(name, []))}
+    changed = True
+    while changed:
+        changed = False
+        for name, values in sources.items():
+            if name in frames or name in excluded:
+                continue
+            if all(_is_frame(value, frames | {name}) for value in values):
+                frames.add(name)
+                changed = True
+    return frames
+
+
+def _row_field(node: ast.AST, row: str) -> Optional[str]:
+    """Column name if node is row['col'] or row.col, else None"""
+    if (isinstance(node, ast.Subscript) and isinstance(node.value, ast.Name)
+            and node.value.id == row and isinstance(node.slice, ast.Constant)
+            and isinstance(node.slice.value, str)):
+        return node.slice.value
+    return None
+
+
+def _attr_call(value: ast.AST, attr: str, args: List[ast.AST],
+               keywords: Optional[List[ast.keyword]] = None) -> ast.Call:
+    return ast.Call(func=ast.Attribute(value=value, attr=attr, ctx=ast.Load()),
+                    args=args, keywords=keywords or [])
+
+
+def _column(frame: ast.AST, name: str) -> ast.Subscript:
+    return ast.Subscript(value=copy.deepcopy(frame), slice=ast.Constant(name), ctx=ast.Load())
+
+
+def _series_column(node: ast.AST) -> Optional[str]:
+    """Column name at the root of a _is_series expression"""
+    while isinstance(node, ast.Call):
+        node = node.func.value
+    return node.slice.value
+
+
+class _ExpressionRewriter(ast.NodeTransformer):
+    """Rewrites apply(lambda) idioms and OR-chains of equality tests"""
+
+    def __init__(self, record, is_text_column, frames: Set[str]):
+        self.record = record
+        self.is_text_column = is_text_column
+        self.frames = frames
+
+    def visit_Call(self, node: ast.Call) -> ast.AST:
+        self.generic_visit(node)
+        func = node.func
+        if not (isinstance(func, ast.Attribute) and func.attr in ('apply', 'map')
+                and _is_series(func.value, self.frames) and len(node.args) == 1 and not node.keywords
+                and isinstance(node.args[0], ast.Lambda)):
+            return node
+
+        lam = node.args[0]
+        if len(lam.args.args) != 1 or lam.args.vararg or lam.args.kwarg:
+            return node
+        arg = lam.args.args[0].arg
+        body = lam.body
+        series = func.value
+        text = self.is_text_column(_series_column(series))
+
+        # lambda x: x.method(<constants>)
+        if (text and isinstance(body, ast.Call) and isinstance(body.func, ast.Attribute)
+                and isinstance(body.func.value, ast.Name) and body.func.value.id == arg
+                and body.func.attr in _STR_METHODS and not body.keywords
+                and all(isinstance(a, ast.Constant) for a in body.args)):
+            method, args, keywords = body.func.attr, list(body.args), []
+            if method in _SPLIT_METHODS and len(args) > 1:
+                if len(args) > 2:
+                    return node
+                keywords.append(ast.keyword(arg='n', value=args.pop()))
+            if method in _LITERAL_PATTERN_METHODS and args:
+                keywords.append(ast.keyword(arg='regex', value=ast.Constant(False)))
+            new = _attr_call(ast.Attribute(value=series, attr='str', ctx=ast.Load()),
+                             method, args, keywords)
+            return self.record(node, 'str_accessor', f".{func.attr}(lambda) -> .str.{body.func.attr}()", new)
+
+        if isinstance(body, ast.Compare) and len(body.ops) == 1:
+            left, op, right = body.left, body.ops[0], body.comparators[0]
+            # lambda x: 'abc' in x
+            if (text and isinstance(op, ast.In) and isinstance(left, ast.Constant)
+                    and isinstance(left.value, str) and isinstance(right, ast.Name) and right.id == arg):
+                new = _attr_call(
+                    ast.Attribute(value=series, attr='str', ctx=ast.Load()), 'contains', [left],
+                    [ast.keyword(arg='regex', value=ast.Constant(False)),
+                     ast.keyword(arg='na', value=ast.Constant(False))])
+                return self.record(node, 'str_contains', f".{func.attr}(lambda: 'substr' in x) -> .str.contains()", new)
+            # lambda x: x in [a, b, c]
+            if (isinstance(op, ast.In) and isinstance(left, ast.Name) and left.id == arg
+                    and isinstance(right, (ast.List, ast.Tuple, ast.Set)) and _is_constant(right)):
+                new = _attr_call(series, 'isin', [ast.List(elts=right.elts, ctx=ast.Load())])
+                return self.record(node, 'isin', f".{func.attr}(lambda: x in [...]) -> .isin()", new)
+
+        return node
+
+    def visit_BinOp(self, node: ast.BinOp) -> ast.AST:
+        self.generic_visit(node)
+        if not isinstance(node.op, ast.BitOr):
+            return node
+
+        # Flatten (s == a) | (s == b) | (s == c)
+        terms, stack = [], [node]
+        while stack:
+            current = stack.pop()
+            if isinstance(current, ast.BinOp) and isinstance(current.op, ast.BitOr):
+                stack.extend([current.right, current.left])
+            else:
+                terms.append(current)
+
+        series_dump, values = None, []
+        for term in terms:
+            if not (isinstance(term, ast.Compare) and len(term.ops) == 1
+                    and isinstance(term.ops[0], ast.Eq) and _is_frame_column(term.left, self.frames)
+                    and isinstance(term.comparators[0], ast.Constant)):
+                return node
+            dump = ast.dump(term.left)
+            if series_dump is None:
+                series_dump = dump
+            elif dump != series_dump:
+                return node
+            values.append(term.comparators[0])
+
+        if len(values) < 2:
+            return node
+        new = _attr_call(terms[0].left, 'isin', [ast.List(elts=values, ctx=ast.Load())])
+        return self.record(node, 'isin', f"{len(values)} OR-ed equality tests -> .isin()", new)
+
+
+class CodeOptimizer:
+    """
+    Rewrites slow pandas idioms in generated code into vectorized form.
+    """
+
+    def __init__(self, text_columns: Optional[Set[str]] = None):
+        """
+        Initialize the optimizer.
+
+        Args:
+            text_columns: Dataset columns holding only strings (or nulls). The
+                .str rewrites change behaviour for non-string values (e.g.
+                'a' in some_list), so they only fire on these columns. None
+                trusts every column.
+        """
+        self.text_columns = text_columns
+
+    def _is_text_column(self, column: str) -> bool:
+        """Column known to hold strings and not reassigned by the script"""
+        if column in self._assigned_columns:
+            return False
+        return self.text_columns is None or column in self.text_columns
+
+    def optimize(self, code: str, function_name: str = "process_sf_film_query") -> Tuple[str, List[Dict[str, Any]]]:
+        """
+        Optimize a generated script.
+
+        Args:
+            code: The Python source produced by the code generation step
+            function_name: Function the script is called through with gdf
+
+        Returns:
+            Tuple of (optimized source, list of applied rewrites). If nothing
+            was rewritten (or the code does not parse) the source is returned
+            unchanged.
+        """
+        try:
+            tree = ast.parse(code)
+        except SyntaxError:
+            return code, []
+
+        self._rewrites: List[Dict[str, Any]] = []
+        self._taken_names = _names_in(tree)
+        self._assigned_columns = {
+            node.slice.value for node in ast.walk(tree)
+            if isinstance(node, ast.Subscript) and isinstance(node.ctx, ast.Store)
+            and isinstance(node.slice, ast.Constant) and isinstance(node.slice.value, str)
+        }
+        self._frames = _frame_names(tree, function_name)
+
+        for func in [n for n in ast.walk(tree) if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef))]:
+            self._rewrite_loops(func)
+            self._hoist_masks(func)
+
+        tree = _ExpressionRewriter(self._record, self._is_text_column, self._frames).visit(tree)
+
+        if not self._rewrites:
+            return code, []
+        ast.fix_missing_locations(tree)
+        return ast.unparse(tree), self._rewrites
+
+    def _record(self, node: ast.AST, kind: str, description: str, new: ast.AST) -> ast.AST:
+        self._rewrites.append({'rewrite': kind, 'line': getattr(node, 'lineno', None),
+                               'description': description})
+        return ast.copy_location(new, node)
+
+    def _fresh_name(self, prefix: str) -> str:
+        i = 0
+        while f"{prefix}{i}" in self._taken_names:
+            i += 1
+        name = f"{prefix}{i}"
+        self._taken_names.add(name)
+        return name
+
+    # --- iterrows loops ---------------------------------------------------
+
+    def _rewrite_loops(self, func: ast.AST) -> None:
+        for parent in ast.walk(func):
+            for field in ('body', 'orelse', 'finalbody'):
+                block = getattr(parent, field, None)
+                if not isinstance(block, list):
+                    continue
+                for i, stmt in enumerate(block):
+                    replacement = self._rewrite_iterrows(stmt, func)
+                    if replacement is not None:
+                        block[i] = replacement
+
+    def _rewrite_iterrows(self, loop: ast.AST, func: ast.AST) -> Optional[ast.stmt]:
+        """Rewrite a `for _, row in df.iterrows()` loop with a single recognised body"""
+        if not (isinstance(loop, ast.For) and not loop.orelse
+                and isinstance(loop.iter, ast.Call) and not loop.iter.args
+                and isinstance(loop.iter.func, ast.Attribute) and loop.iter.func.attr == 'iterrows'
+                and isinstance(loop.target, ast.Tuple) and len(loop.target.elts) == 2
+                and all(isinstance(e, ast.Name) for e in loop.target.elts)
+                and len(loop.body) == 1):
+            return None
+
+        index_name, row = loop.target.elts[0].id, loop.target.elts[1].id
+        frame = loop.iter.func.value
+        if not (isinstance(frame, ast.Name) and frame.id in self._frames):
+            return None
+
+        # The loop variables must not be used anywhere but inside the loop body
+        inside = {id(n) for stmt in loop.body for n in ast.walk(stmt)}
+        for node in ast.walk(func):
+            if (isinstance(node, ast.Name) and node.id in (index_name, row)
+                    and id(node) not in inside and node not in loop.target.elts):
+                return None
+        if any(isinstance(n, ast.Name) and n.id == index_name for stmt in loop.body for n in ast.walk(stmt)):
+            return None
+
+        body, mask = loop.body[0], None
+        if isinstance(body, ast.If) and not body.orelse and len(body.body) == 1:
+            mask = self._vectorize_condition(body.test, row, frame)
+            if mask is None:
+                return None
+            body = body.body[0]
+
+        source = frame if mask is None else ast.Subscript(
+            value=ast.Attribute(value=copy.deepcopy(frame), attr='loc', ctx=ast.Load()),
+            slice=mask, ctx=ast.Load())
+
+        # out.append(row['col'])  ->  out.extend(df['col'].tolist())
+        if (isinstance(body, ast.Expr) and isinstance(body.value, ast.Call)
+                and isinstance(body.value.func, ast.Attribute) and body.value.func.attr == 'append'
+                and isinstance(body.value.func.value, ast.Name) and len(body.value.args) == 1
+                and not body.value.keywords):
+            column = _row_field(body.value.args[0], row)
+            if column is None:
+                return None
+            target = body.value.func.value
+            new = ast.Expr(_attr_call(target, 'extend',
+                                      [_attr_call(_column(source, column), 'tolist', [])]))
+            return self._record(loop, 'iterrows_collect',
+                                f"iterrows() loop collecting '{column}' -> column .tolist()", new)
+
+        # counts[row['col']] = counts.get(row['col'], 0) + 1   /   counts[row['col']] += 1
+        counted = self._counted_column(body, row)
+        if counted is not None:
+            counts, column = counted
+            key, size = self._fresh_name('_key'), self._fresh_name('_size')
+            grouped = _attr_call(
+                _attr_call(source, 'groupby', [ast.Constant(column)],
+                           [ast.keyword(arg='sort', value=ast.Constant(False)),
+                            ast.keyword(arg='dropna', value=ast.Constant(False))]),
+                'size', [])
+            if isinstance(body, ast.AugAssign):
+                update = ast.AugAssign(
+                    target=ast.Subscript(value=ast.Name(counts, ast.Load()), slice=ast.Name(key, ast.Load()), ctx=ast.Store()),
+                    op=ast.Add(), value=ast.Call(func=ast.Name('int', ast.Load()), args=[ast.Name(size, ast.Load())], keywords=[]))
+            else:
+                update = ast.Assign(
+                    targets=[ast.Subscript(value=ast.Name(counts, ast.Load()), slice=ast.Name(key, ast.Load()), ctx=ast.Store())],
+                    value=ast.BinOp(
+                        left=_attr_call(ast.Name(counts, ast.Load()), 'get', [ast.Name(key, ast.Load()), ast.Constant(0)]),
+                        op=ast.Add(),
+                        right=ast.Call(func=ast.Name('int', ast.Load()), args=[ast.Name(size, ast.Load())], keywords=[])))
+            new = ast.For(
+                target=ast.Tuple(elts=[ast.Name(key, ast.Store()), ast.Name(size, ast.Store())], ctx=ast.Store()),
+                iter=_attr_call(grouped, 'items', []), body=[update], orelse=[])
+            return self._record(loop, 'iterrows_count',
+                                f"iterrows() counting loop over '{column}' -> groupby().size()", new)
+
+        return None
+
+    def _counted_column(self, stmt: ast.AST, row: str) -> Optional[Tuple[str, str]]:
+        """Match counts[row[c]] += 1 or counts[row[c]] = counts.get(row[c], 0) + 1"""
+        if (isinstance(stmt, ast.AugAssign) and isinstance(stmt.op, ast.Add)
+                and isinstance(stmt.value, ast.Constant) and stmt.value.value == 1
+                and isinstance(stmt.target, ast.Subscript) and isinstance(stmt.target.value, ast.Name)):
+            column = _row_field(stmt.target.slice, row)
+            return (stmt.target.value.id, column) if column else None
+
+        if (isinstance(stmt, ast.Assign) and len(stmt.targets) == 1
+                and isinstance(stmt.targets[0], ast.Subscript)
+                and isinstance(stmt.targets[0].value, ast.Name)):
+            counts = stmt.targets[0].value.id
+            column = _row_field(stmt.targets[0].slice, row)
+            value = stmt.value
+            if (column and isinstance(value, ast.BinOp) and isinstance(value.op, ast.Add)
+                    and isinstance(value.right, ast.Constant) and value.right.value == 1
+                    and isinstance(value.left, ast.Call) and isinstance(value.left.func, ast.Attribute)
+                    and value.left.func.attr == 'get' and isinstance(value.left.func.value, ast.Name)
+                    and value.left.func.value.id == counts and len(value.left.args) == 2
+                    and _row_field(value.left.args[0], row) == column
+                    and isinstance(value.left.args[1], ast.Constant) and value.left.args[1].value == 0):
+                return counts, column
+        return None
+
+    def _vectorize_condition(self, test: ast.AST, row: str, frame: ast.AST) -> Optional[ast.AST]:
+        """Turn a per-row condition on row['col'] and constants into a boolean mask"""
+        if isinstance(test, ast.BoolOp):
+            parts = [self._vectorize_condition(v, row, frame) for v in test.values]
+            if any(p is None for p in parts):
+                return None
+            op = ast.BitAnd() if isinstance(test.op, ast.And) else ast.BitOr()
+            mask = parts[0]
+            for part in parts[1:]:
+                mask = ast.BinOp(left=mask, op=op, right=part)
+            return mask
+
+        if not (isinstance(test, ast.Compare) and len(test.ops) == 1):
+            return None
+        left, op, right = test.left, test.ops[0], test.comparators[0]
+
+        column = _row_field(left, row)
+        if column and isinstance(right, ast.Constant) and isinstance(
+                op, (ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE)):
+            return ast.Compare(left=_column(frame, column), ops=[op], comparators=[right])
+
+        column = _row_field(right, row)
+        if column and self._is_text_column(column) and isinstance(op, ast.In) and isinstance(left, ast.Constant) and isinstance(left.value, str):
+            return _attr_call(ast.Attribute(value=_column(frame, column), attr='str', ctx=ast.Load()),
+                              'contains', [left],
+                              [ast.keyword(arg='regex', value=ast.Constant(False)),
+                               ast.keyword(arg='na', value=ast.Constant(False))])
+        return None
+
+    # --- repeated masks ---------------------------------------------------
+
+    def _hoist_masks(self, func: ast.AST) -> None:
+        """Compute identical .str.contains(...) masks once per block"""
+        for parent in list(ast.walk(func)):
+            if isinstance(parent, (ast.For, ast.AsyncFor, ast.While, ast.Lambda,
+                                   ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp)):
+                continue  # loop bodies re-run; keep it simple and skip them
+            if parent is not func and isinstance(parent, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                continue
+            for field in ('body', 'orelse', 'finalbody'):
+                block = getattr(parent, field, None)
+                if isinstance(block, list) and block and isinstance(block[0], ast.stmt):
+                    self._hoist_in_block(block, func)
+
+    def _hoist_in_block(self, block: List[ast.stmt], func: ast.AST) -> None:
+        occurrences: Dict[str, List[Tuple[int, ast.Call]]] = {}
+        for index, stmt in enumerate(block):
+            for node in ast.walk(stmt):
+                if (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)
+                        and node.func.attr == 'contains' and isinstance(node.func.value, ast.Attribute)
+                        and node.func.value.attr == 'str'):
+                    occurrences.setdefault(ast.dump(node), []).append((index, node))
+
+        for dump, found in occurrences.items():
+            if len(found) < 2:
+                continue
+            first_index, first = found[0]
+            if not self._safe_to_hoist(block[first_index], first, func):
+                continue
+
+            name = self._fresh_name('_mask')
+            replaced = {id(node) for _, node in found}
+            _ReplaceNodes(replaced, name).visit(ast.Module(body=block[first_index:], type_ignores=[]))
+            assign = ast.Assign(targets=[ast.Name(name, ast.Store())], value=first)
+            block.insert(first_index, ast.copy_location(assign, block[first_index]))
+            self._record(first, 'hoisted_mask',
+                         f"identical .str.contains() mask computed once instead of {len(found)} times",
+                         first)
+
+    def _safe_to_hoist(self, stmt: ast.stmt, expr: ast.Call, func: ast.AST) -> bool:
+        """
+        The first occurrence must be evaluated unconditionally by its statement,
+        and nothing it reads may be rebound or mutated afterwards.
+        """
+        if not isinstance(stmt, (ast.Assign, ast.AugAssign, ast.AnnAssign, ast.Expr, ast.Return)):
+            return False
+        for node in ast.walk(stmt):
+            if isinstance(node, (ast.Lambda, ast.IfExp, ast.BoolOp, ast.ListComp, ast.SetComp,
+                                 ast.DictComp, ast.GeneratorExp)):
+                if any(n is expr for n in ast.walk(node)):
+                    return False
+
+        names = _names_in(expr)
+        start = (expr.lineno, expr.col_offset)
+        for node in ast.walk(func):
+            position = (getattr(node, 'lineno', 0), getattr(node, 'col_offset', 0))
+            if isinstance(node, ast.Name) and node.id in names and isinstance(node.ctx, ast.Store):
+                if position >= start:
+                    return False
+            elif isinstance(node, (ast.Subscript, ast.Attribute)) and isinstance(node.ctx, (ast.Store, ast.Del)):
+                if _names_in(node.value) & names and position >= start:
+                    return False
+            elif isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute):
+                if position >= start and _names_in(node.func.value) & names and (
+                        node.func.attr in _MUTATING_METHODS
+                        or any(kw.arg == 'inplace' for kw in node.keywords)):
+                    return False
+        return True
+
+
+class _ReplaceNodes(ast.NodeTransformer):
+    """Replace specific node instances with a name reference"""
+
+    def __init__(self, node_ids: Set[int], name: str):
+        self.node_ids = node_ids
+        self.name = name
+
+    def visit(self, node: ast.AST) -> ast.AST:
+        if id(node) in self.node_ids:
+            return ast.copy_location(ast.Name(self.name, ast.Load()), node)
+        return super().visit(node)
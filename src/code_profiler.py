@@ -0,0 +1,169 @@
+"""
+Code Profiler Module
+Opt-in profiling of generated code: cProfile function stats, peak memory via
+tracemalloc and, optionally, per-line timings of the generated script itself.
+Used by CodeExecutor when profiling is requested, so slow LLM-written
+patterns can be spotted in the logs and fed back into the prompts.
+
+Modes (SF_FILM_PROFILE or the `profile` argument of execute_code):
+    ''       off
+    'basic'  cProfile + tracemalloc
+    'lines'  basic + line timings of the generated code
+"""
+
+import os
+import sys
+import time
+import pstats
+import cProfile
+import threading
+import tracemalloc
+from typing import Dict, Any, List, Optional
+
+
+PROFILE_MODE = os.getenv('SF_FILM_PROFILE', '').strip().lower()
+PROFILE_MODES = ('', 'basic', 'lines')
+
+if PROFILE_MODE not in PROFILE_MODES:
+    raise ValueError(f"Invalid SF_FILM_PROFILE '{PROFILE_MODE}' (expected 'basic', 'lines' or empty)")
+
+# Number of functions / lines reported
+TOP_FUNCTIONS = 15
+TOP_LINES = 20
+
+# tracemalloc is process-wide: profiled runs in concurrent threads share one
+# tracing session, started by the first and stopped by the last. Tracing
+# started by someone else is left running.
+_tracemalloc_lock = threading.Lock()
+_tracemalloc_users = 0
+_tracemalloc_owned = False
+
+
+def _acquire_tracemalloc() -> None:
+    global _tracemalloc_users, _tracemalloc_owned
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                _tracemalloc_owned = True
+            # Only the sole user may reset the shared peak; overlapping runs
+            # see a peak that includes each other's allocations
+            tracemalloc.reset_peak()
+        _tracemalloc_users += 1
+
+
+def _release_tracemalloc() -> None:
+    global _tracemalloc_users, _tracemalloc_owned
+    with _tracemalloc_lock:
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0 and _tracemalloc_owned:
+            tracemalloc.stop()
+            _tracemalloc_owned = False
+
+
+class ExecutionProfiler:
+    """
+    Context manager that profiles one execution of generated code.
+    """
+
+    def __init__(self, mode: str = 'basic', filename: str = "<generated_query>",
+                 source: Optional[str] = None):
+        """
+        Initialize the profiler.
+
+        Args:
+            mode: 'basic' or 'lines'
+            filename: Code filename whose lines are timed in 'lines' mode
+            source: Source compiled under that filename (to show line text)
+        """
+        if mode not in PROFILE_MODES or not mode:
+            raise ValueError(f"Unknown profile mode '{mode}' (expected 'basic' or 'lines')")
+        self.mode = mode
+        self.filename = filename
+        self.source_lines = source.splitlines() if source else []
+        self._profiler = cProfile.Profile()
+        self._line_times: Dict[int, List[float]] = {}  # line -> [hits, seconds]
+        self._frames: Dict[int, tuple] = {}  # id(frame) -> (line, timestamp)
+        self._previous_trace = None
+
+    def __enter__(self) -> 'ExecutionProfiler':
+        _acquire_tracemalloc()
+        self._baseline = tracemalloc.get_traced_memory()[0]
+
+        if self.mode == 'lines':
+            self._previous_trace = sys.gettrace()
+            sys.settrace(self._trace)
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+        self._profiler.enable()
+        return self
+
+    def __exit__(self, *exc_info) -> bool:
+        self._profiler.disable()
+        self.wall_time = time.perf_counter() - self._wall_start
+        self.cpu_time = time.process_time() - self._cpu_start
+        if self.mode == 'lines':
+            sys.settrace(self._previous_trace)
+        self.peak_memory = max(0, tracemalloc.get_traced_memory()[1] - self._baseline)
+        _release_tracemalloc()
+        return False  # never swallow the script's exception
+
+    def _trace(self, frame, event, arg):
+        """Global trace hook: only frames of the generated code get a local tracer"""
+        if frame.f_code.co_filename != self.filename:
+            return None
+        self._frames[id(frame)] = (frame.f_lineno, time.perf_counter())
+        return self._trace_lines
+
+    def _trace_lines(self, frame, event, arg):
+        """Charge the time since the previous event to the line that was running"""
+        now = time.perf_counter()
+        key = id(frame)
+        previous = self._frames.get(key)
+        if previous is not None and previous[0] > 0:
+            line, started = previous
+            self._line_times.setdefault(line, [0, 0.0])[1] += now - started
+        if event == 'line':
+            self._line_times.setdefault(frame.f_lineno, [0, 0.0])[0] += 1
+        if event == 'return':
+            self._frames.pop(key, None)
+        else:
+            self._frames[key] = (frame.f_lineno, time.perf_counter())
+        return self._trace_lines
+
+    def report(self) -> Dict[str, Any]:
+        """
+        Summarize the collected measurements.
+
+        Returns:
+            Dictionary with wall/cpu time, peak memory, the top functions by
+            cumulative time and (in 'lines' mode) the slowest lines
+        """
+        stats = pstats.Stats(self._profiler)
+        functions = []
+        for (filename, line, name), (_, calls, total, cumulative, _) in stats.stats.items():
+            functions.append({
+                "function": f"{os.path.basename(filename)}:{line}({name})",
+                "calls": calls,
+                "total_time": round(total, 6),
+                "cumulative_time": round(cumulative, 6)
+            })
+        functions.sort(key=lambda f: f["cumulative_time"], reverse=True)
+
+        report = {
+            "mode": self.mode,
+            "wall_time": round(self.wall_time, 6),
+            "cpu_time": round(self.cpu_time, 6),
+            "peak_memory_bytes": self.peak_memory,
+            "top_functions": functions[:TOP_FUNCTIONS]
+        }
+
+        if self.mode == 'lines':
+            lines = []
+            for line, (hits, seconds) in self._line_times.items():
+                text = self.source_lines[line - 1].strip() if 0 < line <= len(self.source_lines) else ""
+                lines.append({"line": line, "hits": hits, "time": round(seconds, 6), "source": text})
+            lines.sort(key=lambda l: l["time"], reverse=True)
+            report["line_timings"] = lines[:TOP_LINES]
+
+        return report
@@ -0,0 +1,522 @@
+"""
+Code Validator Module
+AST-based safety validation and static cost analysis for generated
+GeoPandas code. Replaces substring checks, which were easy to bypass and
+tripped over harmless mentions in comments or strings.
+"""
+
+import re
+import ast
+import types
+import builtins
+import importlib
+from typing import Dict, Any, List, Optional, Set
+
+import numpy as np
+import pandas as pd
+
+
+# Top-level modules generated code may import
+ALLOWED_IMPORTS = {
+    'pandas', 'geopandas', 'numpy', 'shapely', 'math', 're', 'collections',
+    'itertools', 'functools', 'operator', 'datetime', 'json', 'statistics',
+    'typing', 'decimal', 'fractions', 'difflib', 'unicodedata',
+}
+
+# Builtins generated code may reference
+ALLOWED_BUILTINS = {
+    'abs', 'all', 'any', 'bool', 'dict', 'divmod', 'enumerate', 'filter',
+    'float', 'format', 'frozenset', 'hash', 'int', 'isinstance', 'issubclass',
+    'iter', 'len', 'list', 'map', 'max', 'min', 'next', 'print', 'range',
+    'repr', 'reversed', 'round', 'set', 'slice', 'sorted', 'str', 'sum',
+    'tuple', 'type', 'zip', 'None', 'True', 'False', 'NotImplemented',
+    'Exception', 'ValueError', 'TypeError', 'KeyError', 'IndexError',
+    'AttributeError', 'ZeroDivisionError', 'RuntimeError', 'StopIteration',
+}
+
+# Dunder attributes with no escape potential (e.g. type(e).__name__)
+ALLOWED_DUNDER_ATTRIBUTES = {'__name__', '__doc__'}
+# Dunder names inside string constants: subscript keys (g['__builtins__']) and
+# format fields ('{0.__globals__}') reach objects without an ast.Attribute
+DUNDER_IN_STRING = re.compile(r'__\w+__')
+
+# The code generation template appends to a local log file; open() is only
+# allowed for that: a constant relative *.log path
+LOG_FILE_SUFFIX = '.log'
+
+# Names provided by CodeExecutor's namespace
+NAMESPACE_NAMES = {'gdf', 'pd', 'gpd', 'np', 'Point', 'result'}
+
+# Submodules generated code may reach through an allowed module (np.linalg,
+# pd.api.types, shapely.geometry, ...); their public members are allowed too
+ALLOWED_SUBMODULES = {
+    'numpy.linalg', 'numpy.random', 'pandas.api.types', 'pandas.api.typing',
+    'shapely.geometry', 'shapely.ops', 'shapely.wkt', 'shapely.wkb',
+}
+
+# Never allowed, even where a library exposes them publicly: module
+# traversal (pd.io.common.os) and attribute indirection
+MODULE_ATTRIBUTES = {
+    'io', 'common', 'os', 'sys', 'subprocess', 'builtins', 'shutil', 'pathlib',
+    'importlib', 'ctypes', 'ctypeslib', 'lib', 'core', 'compat', 'util', 'tools',
+    'system', 'popen', 'attrgetter', 'methodcaller', 'eval',
+    'Formatter', 'get_field', 'vformat',
+}
+# Methods that write to (or read from) the filesystem, a database or the network
+IO_ATTRIBUTES = {
+    'save', 'savez', 'savez_compressed', 'savetxt', 'tofile', 'fromfile', 'load',
+    'loadtxt', 'genfromtxt', 'fromregex', 'memmap', 'DataSource', 'dump', 'open',
+    'to_file', 'to_parquet', 'to_feather', 'to_pickle', 'to_sql', 'to_excel',
+    'to_hdf', 'to_stata', 'to_clipboard', 'to_orc', 'to_postgis', 'to_gbq',
+    'ExcelWriter', 'HDFStore',
+}
+# Prefix of reader functions (read_csv, read_file, read_parquet, ...)
+IO_ATTRIBUTE_PREFIX = 'read_'
+
+
+def _public_names(obj: Any) -> Set[str]:
+    """Public attribute names of obj and, for classes among its members, of those classes"""
+    names = set()
+    for name in dir(obj):
+        if name.startswith('_'):
+            continue
+        try:
+            member = getattr(obj, name)
+        except Exception:
+            continue
+        if isinstance(member, types.ModuleType):
+            continue  # submodules are only reachable via ALLOWED_SUBMODULES
+        names.add(name)
+        if isinstance(obj, types.ModuleType) and isinstance(member, type):
+            names.update(n for n in dir(member) if not n.startswith('_'))
+    return names
+
+
+def _allowed_attributes() -> Set[str]:
+    """
+    Attribute allowlist: the public API of the allowed modules and their
+    classes (DataFrame, GeoSeries, ndarray, Point, Counter, ...), builtin
+    types, and the pandas .str/.dt/.cat accessors.
+    """
+    allowed = {name.rsplit('.', 1)[1] for name in ALLOWED_SUBMODULES} | {'api'}
+    for module_name in sorted(ALLOWED_IMPORTS) + sorted(ALLOWED_SUBMODULES):
+        try:
+            allowed |= _public_names(importlib.import_module(module_name))
+        except ImportError:
+            continue
+    for cls in (str, bytes, int, float, complex, bool, list, tuple, dict, set,
+                frozenset, range, slice, BaseException):
+        allowed |= _public_names(cls)
+    accessors = (pd.Series(['']).str, pd.Series(pd.to_datetime(['2000-01-01'])).dt,
+                 pd.Series([''], dtype='category').cat, pd.Series([pd.Timedelta(0)]).dt)
+    for accessor in accessors:
+        allowed |= _public_names(accessor)
+    allowed |= _public_names(np.ndarray) | _public_names(np.generic) | _public_names(np.dtype)
+    return {name for name in allowed
+            if name not in MODULE_ATTRIBUTES and name not in IO_ATTRIBUTES
+            and not name.startswith(IO_ATTRIBUTE_PREFIX)}
+
+
+ALLOWED_ATTRIBUTES = _allowed_attributes()
+
+# Only unsafe when given a path/buffer argument
+PATH_WRITING_ATTRIBUTES = {'to_csv', 'to_json', 'to_html', 'to_markdown', 'to_string'}
+
+# Methods whose result is still (a filtered/reshaped) full frame
+FRAME_PRESERVING_METHODS = {
+    'copy', 'drop_duplicates', 'dropna', 'fillna', 'reset_index', 'set_index',
+    'sort_values', 'sort_index', 'merge', 'join', 'explode', 'melt', 'assign',
+    'rename', 'drop', 'astype', 'query', 'to_crs', 'iterrows', 'itertuples',
+    'items', 'stack', 'str', 'loc', 'iloc', 'where', 'mask', 'filter',
+}
+# Vectorized operations that scan a full frame each time they run
+SCAN_METHODS = {
+    'contains', 'isin', 'query', 'merge', 'join', 'apply', 'map', 'drop_duplicates',
+    'groupby', 'value_counts', 'sort_values', 'unique', 'nunique', 'match',
+    'startswith', 'endswith', 'eq', 'ne', 'distance', 'within', 'intersects',
+}
+
+# Ordered from cheapest to most expensive
+COMPLEXITY_LEVELS = ['O(1)', 'O(n)', 'O(n) python-level', 'O(k*n)', 'O(n^2)']
+
+FRAME, DERIVED = 'frame', 'derived'
+
+
+class _CostVisitor(ast.NodeVisitor):
+    """
+    Walks the AST tracking which names hold (a view of) the full frame
+    and which hold data derived from it, and records expensive patterns.
+    """
+
+    def __init__(self):
+        self.taint: Dict[str, str] = {'gdf': FRAME}
+        self.loop_stack: List[Dict[str, Any]] = []
+        self.findings: List[Dict[str, Any]] = []
+        self.complexity = 'O(1)'
+
+    def _raise_to(self, level: str) -> None:
+        if COMPLEXITY_LEVELS.index(level) > COMPLEXITY_LEVELS.index(self.complexity):
+            self.complexity = level
+
+    def _add(self, node: ast.AST, pattern: str, message: str, level: str) -> None:
+        self.findings.append({
+            'line': getattr(node, 'lineno', None),
+            'pattern': pattern,
+            'message': message,
+            'complexity': level
+        })
+        self._raise_to(level)
+
+    def classify(self, node: Optional[ast.AST]) -> Optional[str]:
+        """Is this expression the full frame, something derived from it, or unrelated?"""
+        if node is None:
+            return None
+        if isinstance(node, ast.Name):
+            return self.taint.get(node.id)
+        if isinstance(node, ast.Subscript):
+            return FRAME if self.classify(node.value) == FRAME else self._any_tainted(node)
+        if isinstance(node, ast.Attribute):
+            base = self.classify(node.value)
+            return FRAME if base == FRAME else base
+        if isinstance(node, ast.Call):
+            func = node.func
+            if isinstance(func, ast.Attribute):
+                base = self.classify(func.value)
+                if base == FRAME and func.attr in FRAME_PRESERVING_METHODS:
+                    return FRAME
+                return DERIVED if base else self._any_tainted(node)
+            if isinstance(func, ast.Name):
+                if func.id == 'range' and node.args and self._is_len_of_frame(node.args[-1]):
+                    return FRAME
+                if func.id in ('zip', 'enumerate', 'list', 'sorted', 'reversed', 'set', 'tuple'):
+                    kinds = [self.classify(arg) for arg in node.args]
+                    if FRAME in kinds:
+                        return FRAME
+                    return DERIVED if DERIVED in kinds else None
+        return self._any_tainted(node)
+
+    def _is_len_of_frame(self, node: ast.AST) -> bool:
+        return (isinstance(node, ast.Call) and isinstance(node.func, ast.Name)
+                and node.func.id == 'len' and bool(node.args)
+                and self.classify(node.args[0]) == FRAME)
+
+    def _any_tainted(self, node: ast.AST) -> Optional[str]:
+        for child in ast.walk(node):
+            if isinstance(child, ast.Name) and child.id in self.taint:
+                return DERIVED
+        return None
+
+    def _assign(self, targets: List[ast.AST], value: ast.AST) -> None:
+        kind = self.classify(value)
+        for target in targets:
+            for name in ast.walk(target):
+                if isinstance(name, ast.Name):
+                    if kind:
+                        self.taint[name.id] = kind
+                    else:
+                        self.taint.pop(name.id, None)
+
+    # --- statements -------------------------------------------------------
+
+    def visit_Assign(self, node: ast.Assign) -> None:
+        self.visit(node.value)
+        self._assign(node.targets, node.value)
+
+    def visit_AnnAssign(self, node: ast.AnnAssign) -> None:
+        if node.value is not None:
+            self.visit(node.value)
+            self._assign([node.target], node.value)
+
+    def _enter_loop(self, node: ast.AST, iterable: ast.AST, target: ast.AST) -> Dict[str, Any]:
+        kind = self.classify(iterable)
+        # Iterating a loop variable of an enclosing loop (e.g. a groupby group)
+        # partitions the data rather than multiplying the work
+        partitioned = any(
+            isinstance(name, ast.Name) and any(name.id in outer['targets'] for outer in self.loop_stack)
+            for name in ast.walk(iterable)
+        )
+        outer_frame_loops = [outer for outer in self.loop_stack if outer['kind'] == FRAME]
+
+        if kind == FRAME and not partitioned:
+            if outer_frame_loops:
+                self._add(node, 'nested_frame_loop',
+                          "Nested Python loops over the full frame", 'O(n^2)')
+            elif self._is_row_iteration(iterable):
+                self._add(node, 'iterrows',
+                          f"Row-wise iteration via .{iterable.func.attr}() - use vectorized operations",
+                          'O(n) python-level')
+            else:
+                self._add(node, 'frame_loop', "Python loop over the full frame", 'O(n) python-level')
+
+        targets = {name.id for name in ast.walk(target) if isinstance(name, ast.Name)}
+        # Loop variables are rows/values, not frames
+        for name in targets:
+            self.taint.pop(name, None)
+        if kind == DERIVED:
+            for name in targets:
+                self.taint[name] = DERIVED
+
+        loop = {'kind': kind if not partitioned else DERIVED, 'targets': targets}
+        self.loop_stack.append(loop)
+        return loop
+
+    def _is_row_iteration(self, node: ast.AST) -> bool:
+        return (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)
+                and node.func.attr in ('iterrows', 'itertuples'))
+
+    def visit_For(self, node: ast.For) -> None:
+        self.visit(node.iter)
+        self._enter_loop(node, node.iter, node.target)
+        for stmt in node.body + node.orelse:
+            self.visit(stmt)
+        self.loop_stack.pop()
+
+    visit_AsyncFor = visit_For
+
+    def visit_While(self, node: ast.While) -> None:
+        self._add(node, 'while_loop', "While loop - iteration count unknown statically",
+                  'O(n) python-level')
+        self.loop_stack.append({'kind': None, 'targets': set()})
+        self.generic_visit(node)
+        self.loop_stack.pop()
+
+    def _visit_comprehension(self, node: ast.AST) -> None:
+        depth = 0
+        for generator in node.generators:
+            self.visit(generator.iter)
+            self._enter_loop(node, generator.iter, generator.target)
+            depth += 1
+            for condition in generator.ifs:
+                self.visit(condition)
+        for field in ('elt', 'key', 'value'):
+            if getattr(node, field, None) is not None:
+                self.visit(getattr(node, field))
+        for _ in range(depth):
+            self.loop_stack.pop()
+
+    visit_ListComp = visit_SetComp = visit_GeneratorExp = visit_DictComp = _visit_comprehension
+
+    # --- expressions ------------------------------------------------------
+
+    def _inside_loop(self) -> Optional[str]:
+        """Strongest enclosing loop kind (frame > derived > other)"""
+        kinds = [loop['kind'] for loop in self.loop_stack]
+        if FRAME in kinds:
+            return FRAME
+        if kinds:
+            return DERIVED
+        return None
+
+    def _flag_scan_in_loop(self, node: ast.AST, what: str) -> None:
+        loop = self._inside_loop()
+        if loop == FRAME:
+            self._add(node, 'scan_in_frame_loop',
+                      f"{what} on the full frame inside a loop over the frame", 'O(n^2)')
+        elif loop == DERIVED:
+            self._add(node, 'scan_in_loop',
+                      f"{what} on the full frame inside a loop - consider groupby/merge", 'O(k*n)')
+
+    def visit_Call(self, node: ast.Call) -> None:
+        func = node.func
+        if isinstance(func, ast.Attribute):
+            base = self.classify(func.value)
+            if base == FRAME:
+                self._raise_to('O(n)')
+                if func.attr == 'apply':
+                    row_wise = any(
+                        kw.arg == 'axis' and isinstance(kw.value, ast.Constant)
+                        and kw.value.value in (1, 'columns')
+                        for kw in node.keywords
+                    )
+                    series_lambda = (isinstance(func.value, ast.Subscript)
+                                     and isinstance(func.value.slice, ast.Constant)
+                                     and node.args and isinstance(node.args[0], ast.Lambda))
+                    if row_wise:
+                        self._add(node, 'row_apply', "Row-wise .apply(axis=1) runs Python per row",
+                                  'O(n) python-level')
+                    elif series_lambda:
+                        self._add(node, 'element_apply',
+                                  "Element-wise .apply(lambda) - prefer .str / vectorized methods",
+                                  'O(n) python-level')
+                if func.attr in SCAN_METHODS:
+                    self._flag_scan_in_loop(node, f".{func.attr}()")
+        self.generic_visit(node)
+
+    def visit_Compare(self, node: ast.Compare) -> None:
+        operands = [node.left] + node.comparators
+        if any(self.classify(operand) == FRAME for operand in operands):
+            self._raise_to('O(n)')
+            self._flag_scan_in_loop(node, "Vectorized comparison")
+        self.generic_visit(node)
+
+    def visit_Name(self, node: ast.Name) -> None:
+        if self.taint.get(node.id) == FRAME:
+            self._raise_to('O(n)')
+
+
+class CodeValidator:
+    """
+    Validates generated code by walking its AST: allowlists of imports,
+    builtins and attributes (no module traversal or I/O), and a static cost
+    analysis that can reject code above a complexity limit.
+    """
+
+    def __init__(self, max_complexity: Optional[str] = 'O(k*n)',
+                 required_function: str = "process_sf_film_query",
+                 extra_attributes: Optional[Set[str]] = None):
+        """
+        Initialize the validator.
+
+        Args:
+            max_complexity: Highest acceptable entry of COMPLEXITY_LEVELS
+                (None disables cost-based rejection)
+            required_function: Function the generated code must define
+            extra_attributes: Attribute names allowed on top of
+                ALLOWED_ATTRIBUTES, e.g. the dataset's column names for
+                gdf.Title or itertuples() rows
+        """
+        if max_complexity is not None and max_complexity not in COMPLEXITY_LEVELS:
+            raise ValueError(f"Unknown complexity class: {max_complexity}")
+        self.max_complexity = max_complexity
+        self.required_function = required_function
+        self.allowed_attributes = ALLOWED_ATTRIBUTES | {
+            name for name in (extra_attributes or ())
+            if name not in MODULE_ATTRIBUTES and name not in IO_ATTRIBUTES
+        }
+
+    def validate(self, code: str) -> Dict[str, Any]:
+        """
+        Validate code and estimate its cost.
+
+        Args:
+            code: The code to validate
+
+        Returns:
+            {'is_valid', 'issues', 'code_length', 'cost'} where cost holds
+            'complexity' and a list of 'findings' (None on syntax errors)
+        """
+        try:
+            tree = ast.parse(code)
+        except SyntaxError as e:
+            return {
+                "is_valid": False,
+                "issues": [f"Syntax error at line {e.lineno}: {e.msg}"],
+                "code_length": len(code),
+                "cost": None
+            }
+
+        issues = self._check_safety(tree)
+
+        if not any(isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef))
+                   and node.name == self.required_function for node in tree.body):
+            issues.append(f"Required function '{self.required_function}' not found")
+
+        visitor = _CostVisitor()
+        visitor.visit(tree)
+        cost = {"complexity": visitor.complexity, "findings": visitor.findings}
+
+        if (self.max_complexity is not None and
+                COMPLEXITY_LEVELS.index(visitor.complexity) > COMPLEXITY_LEVELS.index(self.max_complexity)):
+            issues.append(
+                f"Estimated cost {visitor.complexity} exceeds limit {self.max_complexity}: "
+                + "; ".join(f"line {f['line']}: {f['message']}" for f in visitor.findings
+                            if f['complexity'] == visitor.complexity)
+            )
+
+        return {
+            "is_valid": len(issues) == 0,
+            "issues": issues,
+            "code_length": len(code),
+            "cost": cost
+        }
+
+    def _defined_names(self, tree: ast.AST) -> Set[str]:
+        """Every name the script binds itself (so it may shadow a builtin)"""
+        names = set(NAMESPACE_NAMES)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Name) and isinstance(node.ctx, (ast.Store, ast.Del)):
+                names.add(node.id)
+            elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                names.add(node.name)
+            elif isinstance(node, ast.arg):
+                names.add(node.arg)
+            elif isinstance(node, ast.alias):
+                names.add((node.asname or node.name).split('.')[0])
+            elif isinstance(node, ast.ExceptHandler) and node.name:
+                names.add(node.name)
+        return names
+
+    def _is_log_open(self, node: ast.AST) -> bool:
+        """open('<name>.log', 'a' | 'w', ...) with a constant, relative path"""
+        if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Name)
+                and node.func.id == 'open' and node.args):
+            return False
+        path = node.args[0]
+        if not (isinstance(path, ast.Constant) and isinstance(path.value, str)):
+            return False
+        if (not path.value.endswith(LOG_FILE_SUFFIX) or '/' in path.value
+                or '\\' in path.value or path.value.startswith('.')):
+            return False
+        mode = node.args[1] if len(node.args) > 1 else next(
+            (kw.value for kw in node.keywords if kw.arg == 'mode'), None)
+        return isinstance(mode, ast.Constant) and mode.value in ('a', 'w')
+
+    def _check_safety(self, tree: ast.AST) -> List[str]:
+        """Collect safety issues (imports, builtins, attributes)"""
+        issues = []
+        defined = self._defined_names(tree)
+        builtin_names = set(dir(builtins))
+        log_opens = {id(node.func) for node in ast.walk(tree) if self._is_log_open(node)}
+        # Attributes the script sets itself (e.g. on its own objects)
+        own_attributes = {node.attr for node in ast.walk(tree)
+                          if isinstance(node, ast.Attribute) and isinstance(node.ctx, ast.Store)}
+
+        for node in ast.walk(tree):
+            line = getattr(node, 'lineno', '?')
+
+            if isinstance(node, ast.Import):
+                for alias in node.names:
+                    if alias.name.split('.')[0] not in ALLOWED_IMPORTS:
+                        issues.append(f"Line {line}: import of '{alias.name}' is not allowed")
+            elif isinstance(node, ast.ImportFrom):
+                module = (node.module or '').split('.')[0]
+                if node.level or module not in ALLOWED_IMPORTS:
+                    issues.append(f"Line {line}: import from '{node.module}' is not allowed")
+
+            elif isinstance(node, ast.Constant) and isinstance(node.value, str):
+                dunders = set(DUNDER_IN_STRING.findall(node.value)) - ALLOWED_DUNDER_ATTRIBUTES
+                if dunders:
+                    issues.append(f"Line {line}: string naming {sorted(dunders)} is not allowed")
+
+            elif isinstance(node, ast.Name):
+                if node.id.startswith('__'):
+                    issues.append(f"Line {line}: access to '{node.id}' is not allowed")
+                elif node.id == 'open' and 'open' not in defined:
+                    if id(node) not in log_opens:
+                        issues.append(f"Line {line}: open() is only allowed for a local "
+                                      f"'{LOG_FILE_SUFFIX}' file")
+                elif (node.id in builtin_names and node.id not in ALLOWED_BUILTINS
+                        and node.id not in defined):
+                    issues.append(f"Line {line}: builtin '{node.id}' is not allowed")
+
+            elif isinstance(node, ast.Attribute):
+                if node.attr in ALLOWED_DUNDER_ATTRIBUTES:
+                    continue
+                if node.attr.startswith('__') and node.attr.endswith('__'):
+                    issues.append(f"Line {line}: dunder attribute '{node.attr}' is not allowed")
+                elif node.attr.startswith('_') and node.attr not in ('_asdict', '_fields'):
+                    issues.append(f"Line {line}: private attribute '{node.attr}' is not allowed")
+                elif node.attr in IO_ATTRIBUTES or node.attr.startswith(IO_ATTRIBUTE_PREFIX):
+                    issues.append(f"Line {line}: file/database access '.{node.attr}' is not allowed")
+                elif node.attr in MODULE_ATTRIBUTES:
+                    issues.append(f"Line {line}: attribute '.{node.attr}' is not allowed")
+                elif node.attr not in self.allowed_attributes and node.attr not in own_attributes:
+                    issues.append(f"Line {line}: attribute '.{node.attr}' is not in the "
+                                  f"pandas/geopandas/numpy/shapely allowlist")
+
+            elif isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute):
+                if node.func.attr in PATH_WRITING_ATTRIBUTES and (
+                        node.args or any(kw.arg in ('path_or_buf', 'buf') for kw in node.keywords)):
+                    issues.append(f"Line {line}: writing output via '.{node.func.attr}(path)' is not allowed")
+
+        return issues
@@ -1,5 +1,11 @@
+import os
+import time
+import hashlib
+import threading
 import geopandas as gpd
 from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+from src import shared_dataset
 
 #######################################################
 #  Manage the loading and initial preparation of      #
@@ -10,9 +16,210 @@ from pathlib import Path
 gpdb_dir = Path('geoPandaDB')
 gpdb_file = gpdb_dir / "sf_film_May7_2025_data.gpkg"
 
+# Seconds between checks for a new dataset file (0 disables the watcher)
+DATASET_WATCH_INTERVAL = float(os.getenv('SF_FILM_DATASET_WATCH_INTERVAL', '30'))
+
+
+def compute_dataset_version(path: Path) -> str:
+    """Identify a dataset file by a short hash of its content"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+def _file_signature(path: Path) -> Tuple[str, int, int]:
+    """Cheap change detection: path, mtime and size"""
+    stat = path.stat()
+    return (str(path), stat.st_mtime_ns, stat.st_size)
+
+
+class Dataset:
+    """
+    One version of the film dataset; the frame is never modified after load.
+    Queries hold on to the instance they started with, so a swap never
+    pulls the frame out from under an in-flight query.
+    """
+
+    def __init__(self, gdf: gpd.GeoDataFrame, version: str, path: Path):
+        self.gdf = gdf
+        self.version = version
+        self.path = path
+        self.signature = _file_signature(path)
+        self.loaded_at = time.time()
+
+
+class DatasetStore:
+    """
+    Holds the active dataset version and hot-reloads it when a new file
+    appears in the dataset directory.
+
+    Caches of derived data register a prepare hook (run on the new version
+    in the background, before it becomes active) and an invalidate hook
+    (run with the old version once the swap is done).
+    """
+
+    def __init__(self, path: Path):
+        """
+        Load the initial dataset.
+
+        Args:
+            path: GeoPackage file to load
+        """
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._prepare_hooks: List[Callable[[Dataset], None]] = []
+        self._invalidate_hooks: List[Callable[[str], None]] = []
+        self._watcher: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._active = self._load(path)
+
+    def _load(self, path: Path) -> Dataset:
+        """Read a GeoPackage into a new Dataset"""
+        version = compute_dataset_version(path)
+        if shared_dataset.is_enabled():
+            # Map the copy shared by all processes on this box
+            gdf = shared_dataset.load_or_export(lambda: gpd.read_file(path), version)
+        else:
+            gdf = gpd.read_file(path)
+        return Dataset(gdf, version, path)
+
+    def current(self) -> Dataset:
+        """Get the active dataset version"""
+        with self._lock:
+            return self._active
+
+    def register_cache(
+        self,
+        prepare: Optional[Callable[[Dataset], None]] = None,
+        invalidate: Optional[Callable[[str], None]] = None
+    ) -> None:
+        """
+        Register a cache that derives data from the dataset.
+
+        Args:
+            prepare: Called with a freshly loaded Dataset before it is swapped in
+            invalidate: Called with the old version string after a swap
+        """
+        if prepare is not None:
+            self._prepare_hooks.append(prepare)
+        if invalidate is not None:
+            self._invalidate_hooks.append(invalidate)
+
+    def _latest_file(self) -> Path:
+        """Newest GeoPackage in the dataset directory (falls back to the active file)"""
+        active_path = self.current().path
+        candidates = list(active_path.parent.glob('*.gpkg'))
+        if not candidates:
+            return active_path
+        return max(candidates, key=lambda p: p.stat().st_mtime_ns)
+
+    def reload(self, path: Optional[Path] = None) -> bool:
+        """
+        Load a dataset file, prepare derived caches and atomically swap it in.
+
+        Args:
+            path: File to load (defaults to the newest file in the dataset directory)
+
+        Returns:
+            True if a new version became active, False if the content was
+            unchanged or a prepare hook failed (the old version stays active)
+        """
+        with self._reload_lock:
+            path = Path(path) if path is not None else self._latest_file()
+            old = self.current()
+
+            if compute_dataset_version(path) == old.version:
+                # Touched or re-copied but identical - just remember the new signature
+                old.signature = _file_signature(path)
+                old.path = path
+                return False
+
+            new = self._load(path)
+            for hook in self._prepare_hooks:
+                try:
+                    hook(new)
+                except Exception as e:
+                    # A half-prepared version must not go live; don't retry this file
+                    print(f"⚠️ Preparing version {new.version} failed, keeping {old.version}: {e}")
+                    old.signature = new.signature
+                    return False
+
+            with self._lock:
+                self._active = new
+            _publish(new)
+
+            for hook in self._invalidate_hooks:
+                try:
+                    hook(old.version)
+                except Exception as e:
+                    print(f"⚠️ Cache invalidation failed for version {old.version}: {e}")
+
+            print(f"✓ Dataset swapped: {old.version} -> {new.version} ({path})")
+            return True
+
+    def _has_changed(self) -> bool:
+        """Check whether the newest dataset file differs from the active one"""
+        try:
+            return _file_signature(self._latest_file()) != self.current().signature
+        except OSError:
+            return False
+
+    def _watch(self, interval: float) -> None:
+        """Watcher loop: poll the dataset directory and reload on change"""
+        while not self._stop_event.wait(interval):
+            if not self._has_changed():
+                continue
+            # Wait one more interval so a file that is still being copied settles
+            signature = _file_signature(self._latest_file())
+            if self._stop_event.wait(interval):
+                break
+            if _file_signature(self._latest_file()) != signature:
+                continue
+            try:
+                self.reload()
+            except Exception as e:
+                # Keep serving the old version if the new file can't be loaded
+                print(f"⚠️ Dataset reload failed, keeping {self.current().version}: {e}")
+                self.current().signature = signature
+
+    def start_watcher(self, interval: float = DATASET_WATCH_INTERVAL) -> None:
+        """
+        Start the background watcher thread (no-op if already running or disabled).
+
+        Args:
+            interval: Seconds between checks
+        """
+        with self._lock:
+            if interval <= 0 or (self._watcher is not None and self._watcher.is_alive()):
+                return
+            self._stop_event.clear()
+            self._watcher = threading.Thread(
+                target=self._watch, args=(interval,), name='dataset-watcher', daemon=True
+            )
+            self._watcher.start()
+
+    def stop_watcher(self) -> None:
+        """Stop the background watcher thread"""
+        self._stop_event.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+
+
+def _publish(dataset: Dataset) -> None:
+    """Keep the legacy module globals pointing at the active version"""
+    global database, dataset_version
+    database = dataset.gdf
+    dataset_version = dataset.version
+
+
 try:
-    database = gpd.read_file(gpdb_file)
+    store = DatasetStore(gpdb_file)
+    # Prefer store.current() - these only reflect the version at access time
+    database = store.current().gdf
+    dataset_version = store.current().version
 except Exception as e:
     raise RuntimeError(f"Failed to initialize GeoDataFrame: {str(e)}")
 
-
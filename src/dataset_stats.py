@@ -0,0 +1,306 @@
+"""
+Dataset Statistics Module
+Precomputes aggregate statistics over the SF film GeoDataFrame once per
+dataset version so the sidebar and count-style questions can be answered
+without rescanning the frame on every Streamlit rerun.
+"""
+
+import re
+import threading
+import pandas as pd
+import geopandas as gpd
+from typing import Dict, Any, Optional
+from src import data_loader, shared_dataset
+
+
+# Values the README treats as missing on top of real nulls
+_EMPTY_MARKERS = {'', 'None', 'nan', 'NaN', 'null'}
+
+PERSON_COLUMNS = {
+    'actor': ['Actor_1', 'Actor_2', 'Actor_3'],
+    'director': ['Director'],
+    'writer': ['Writer'],
+}
+
+
+def _clean_text(series: pd.Series) -> pd.Series:
+    """Drop nulls, whitespace-only entries and string representations of null."""
+    cleaned = series.dropna().astype(str).str.strip()
+    return cleaned[~cleaned.isin(_EMPTY_MARKERS)]
+
+
+class DatasetStats:
+    """
+    Aggregate statistics for one version of the film dataset.
+    Built once and treated as read-only afterwards.
+    """
+
+    def __init__(self, gdf: gpd.GeoDataFrame, version: str):
+        """
+        Compute all aggregates for the given dataset version.
+
+        Args:
+            gdf: The GeoPandas dataframe to summarize
+            version: Identifier of the dataset version the stats belong to
+        """
+        self.version = version
+
+        years = pd.to_numeric(gdf['Year'], errors='coerce')
+        # One row per filming location, so films are (Title, Year) pairs
+        films = pd.DataFrame({'Title': gdf['Title'], 'Year': years}).drop_duplicates()
+
+        self.total_locations = len(gdf)
+        self.total_films = len(films)
+        self.unique_location_names = _clean_text(gdf['Locations']).nunique()
+
+        film_years = films['Year'].dropna().astype(int)
+        self.year_min = int(film_years.min()) if len(film_years) else None
+        self.year_max = int(film_years.max()) if len(film_years) else None
+        self.films_by_year = film_years.value_counts().sort_index()
+        self.films_by_decade = (film_years // 10 * 10).value_counts().sort_index()
+        self.locations_by_year = years.dropna().astype(int).value_counts().sort_index()
+
+        # Person frequency: deduplicate per film first, then aggregate
+        self.people_counts: Dict[str, pd.Series] = {}
+        for role, columns in PERSON_COLUMNS.items():
+            per_film = pd.concat(
+                [pd.DataFrame({'Title': gdf['Title'], 'Year': years, 'Name': gdf[col]})
+                 for col in columns],
+                ignore_index=True
+            )
+            per_film = per_film.loc[_clean_text(per_film['Name']).index]
+            per_film['Name'] = per_film['Name'].astype(str).str.strip()
+            per_film = per_film.drop_duplicates(subset=['Title', 'Year', 'Name'])
+            self.people_counts[role] = per_film['Name'].value_counts()
+
+        self.unique_actors = len(self.people_counts['actor'])
+        self.unique_directors = len(self.people_counts['director'])
+        self.unique_writers = len(self.people_counts['writer'])
+
+        self.location_counts = _clean_text(gdf['Locations']).value_counts()
+
+    @classmethod
+    def from_tables(cls, tables: Dict[str, pd.DataFrame], version: str) -> 'DatasetStats':
+        """
+        Rebuild statistics exported with to_tables() without touching the frame.
+
+        Args:
+            tables: Table name -> DataFrame, as produced by to_tables()
+            version: Identifier of the dataset version the stats belong to
+
+        Returns:
+            DatasetStats instance
+        """
+        stats = cls.__new__(cls)
+        stats.version = version
+
+        totals = tables['totals'].iloc[0]
+        for key in _TOTAL_FIELDS:
+            value = totals[key]
+            setattr(stats, key, None if pd.isna(value) else int(value))
+
+        def series(name: str) -> pd.Series:
+            df = tables[name]
+            return pd.Series(df['count'].to_numpy(), index=df['key'].to_numpy(), name='count')
+
+        stats.films_by_year = series('films_by_year')
+        stats.films_by_decade = series('films_by_decade')
+        stats.locations_by_year = series('locations_by_year')
+        stats.location_counts = series('location_counts')
+        stats.people_counts = {role: series(f"people_{role}") for role in PERSON_COLUMNS}
+        return stats
+
+    def to_tables(self) -> Dict[str, pd.DataFrame]:
+        """
+        Export the statistics as flat tables (for the shared dataset mode).
+
+        Returns:
+            Table name -> DataFrame
+        """
+        def table(counts: pd.Series) -> pd.DataFrame:
+            return pd.DataFrame({'key': counts.index.to_numpy(), 'count': counts.to_numpy()})
+
+        tables = {
+            'films_by_year': table(self.films_by_year),
+            'films_by_decade': table(self.films_by_decade),
+            'locations_by_year': table(self.locations_by_year),
+            'location_counts': table(self.location_counts),
+        }
+        for role, counts in self.people_counts.items():
+            tables[f"people_{role}"] = table(counts)
+        # Written last: readers treat its presence as "export complete"
+        tables['totals'] = pd.DataFrame([{key: getattr(self, key) for key in _TOTAL_FIELDS}])
+        return tables
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Get the headline totals shown in the sidebar.
+
+        Returns:
+            Dictionary of totals and the year range
+        """
+        return {
+            'version': self.version,
+            'total_locations': self.total_locations,
+            'total_films': self.total_films,
+            'unique_actors': self.unique_actors,
+            'unique_directors': self.unique_directors,
+            'unique_writers': self.unique_writers,
+            'unique_location_names': self.unique_location_names,
+            'year_min': self.year_min,
+            'year_max': self.year_max,
+        }
+
+    def top_people(self, role: str, n: int = 10) -> Dict[str, int]:
+        """
+        Get the most frequent people for a role, counted by distinct film.
+
+        Args:
+            role: One of 'actor', 'director' or 'writer'
+            n: Number of entries to return
+
+        Returns:
+            Ordered dictionary of name -> film count
+        """
+        counts = self.people_counts[role].head(n)
+        return {name: int(count) for name, count in counts.items()}
+
+    def top_locations(self, n: int = 10) -> Dict[str, int]:
+        """
+        Get the most frequently used filming locations.
+
+        Args:
+            n: Number of entries to return
+
+        Returns:
+            Ordered dictionary of location -> number of appearances
+        """
+        return {name: int(count) for name, count in self.location_counts.head(n).items()}
+
+    def answer(self, user_query: str) -> Optional[Dict[str, Any]]:
+        """
+        Answer a count-style question directly from the precomputed aggregates.
+        Only a small set of unambiguous phrasings is recognised; anything else
+        returns None and goes through the normal generation pipeline.
+
+        Args:
+            user_query: The natural language query
+
+        Returns:
+            Result dict shaped like generated code output ('data', 'summary',
+            'metadata'), or None if the query is not a known template
+        """
+        query = user_query.lower().strip().rstrip('?. ')
+
+        for template, pattern in _TEMPLATES:
+            match = pattern.search(query)
+            if not match:
+                continue
+
+            if template == 'films_by_year':
+                data = {int(y): int(c) for y, c in self.films_by_year.items()}
+                summary = f"Number of films per year ({len(data)} years)"
+            elif template == 'films_by_decade':
+                data = {f"{int(d)}s": int(c) for d, c in self.films_by_decade.items()}
+                summary = f"Number of films per decade ({len(data)} decades)"
+            elif template == 'top_people':
+                n = int(match.group('n') or 10)
+                role = match.group('role').rstrip('s')
+                data = self.top_people(role, n)
+                summary = f"Top {len(data)} most frequent {role}s by number of films"
+            elif template == 'top_locations':
+                n = int(match.group('n') or 10)
+                data = self.top_locations(n)
+                summary = f"Top {len(data)} most filmed locations"
+            else:  # total_films
+                data = self.total_films
+                summary = f"There are {self.total_films} films in the database"
+
+            return {
+                'data': data,
+                'summary': summary,
+                'metadata': {
+                    'source': 'dataset_stats',
+                    'template': template,
+                    'dataset_version': self.version
+                }
+            }
+
+        return None
+
+
+_TOTAL_FIELDS = [
+    'total_locations', 'total_films', 'unique_location_names', 'unique_actors',
+    'unique_directors', 'unique_writers', 'year_min', 'year_max',
+]
+
+# Ordered: the first matching template wins
+_TEMPLATES = [
+    ('films_by_year', re.compile(
+        r'^how many (movies|films)( were)?( (made|released|shot))? (in |for )?(each|per|every|by) year$')),
+    ('films_by_decade', re.compile(
+        r'^how many (movies|films)( were)?( (made|released|shot))? (in |for )?(each|per|every|by) decade$')),
+    ('top_people', re.compile(
+        r'^(what are |who are |show me |list )?(the )?top (?P<n>\d{1,3} )?(most (frequent|common|popular) )?'
+        r'(?P<role>actors|directors|writers)$')),
+    ('top_locations', re.compile(
+        r'^(what are |show me |list )?(the )?top (?P<n>\d{1,3} )?(most (filmed|frequent|common|popular) )?'
+        r'(filming )?locations$')),
+    ('total_films', re.compile(
+        r'^how many (movies|films) are (there|in the (database|dataset))( in total)?$')),
+]
+
+
+_stats_cache: Dict[str, DatasetStats] = {}
+_stats_lock = threading.Lock()
+
+
+def get_dataset_stats(gdf: gpd.GeoDataFrame, version: str) -> DatasetStats:
+    """
+    Get the statistics for a dataset version, computing them on first use.
+
+    Args:
+        gdf: The GeoPandas dataframe for that version
+        version: Dataset version identifier used as the cache key
+
+    Returns:
+        Shared DatasetStats instance for the version
+    """
+    with _stats_lock:
+        stats = _stats_cache.get(version)
+        if stats is None:
+            stats = _load_or_compute(gdf, version)
+            _stats_cache[version] = stats
+        return stats
+
+
+def _load_or_compute(gdf: gpd.GeoDataFrame, version: str) -> DatasetStats:
+    """Reuse stats exported by another process in shared mode, else compute them"""
+    if not shared_dataset.is_enabled():
+        return DatasetStats(gdf, version)
+
+    tables = shared_dataset.read_index(version, 'stats')
+    if tables is not None and 'totals' in tables:
+        return DatasetStats.from_tables(tables, version)
+
+    stats = DatasetStats(gdf, version)
+    shared_dataset.write_index(version, 'stats', stats.to_tables())
+    return stats
+
+
+def invalidate_dataset_stats(version: str) -> None:
+    """
+    Drop the cached statistics of a dataset version that is no longer active.
+
+    Args:
+        version: Dataset version identifier
+    """
+    with _stats_lock:
+        _stats_cache.pop(version, None)
+
+
+# Compute stats for a hot-reloaded version before it goes live, drop the old ones after
+data_loader.store.register_cache(
+    prepare=lambda dataset: get_dataset_stats(dataset.gdf, dataset.version),
+    invalidate=invalidate_dataset_stats
+)
@@ -0,0 +1,276 @@
+"""
+Location Data Module
+Columnar container for mappable locations, produced by MapDataAnalyzer and
+consumed by MapGenerator. One entry per (location, film) appearance, stored
+as parallel arrays instead of a list of per-row dicts.
+
+It still behaves like the former List[Dict] format ('location_name',
+'geometry', 'metadata'): len(), iteration and indexing yield those dicts,
+and from_records() accepts them.
+"""
+
+import numpy as np
+import pandas as pd
+import shapely
+from typing import List, Dict, Any, Optional, Iterator, Tuple
+
+
+# Column value for "key absent in this entry" (records with heterogeneous keys)
+_MISSING = object()
+
+
+def _object_array(values: Any) -> np.ndarray:
+    """1-D object array (never lets numpy nest sequences into 2-D)"""
+    if isinstance(values, np.ndarray) and values.dtype == object and values.ndim == 1:
+        return values
+    if isinstance(values, (np.ndarray, pd.Series, pd.Index, pd.api.extensions.ExtensionArray)):
+        return np.asarray(values, dtype=object)
+    values = list(values)
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+
+def metadata_columns(records: List[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+    """
+    Turn a list of metadata dicts into aligned columns.
+
+    Args:
+        records: Metadata dicts (keys may differ between records)
+
+    Returns:
+        One object column per key seen in any record, in first-seen order
+    """
+    keys = list(dict.fromkeys(k for m in records for k in m))
+    columns = {}
+    for key in keys:
+        column = np.empty(len(records), dtype=object)
+        column[:] = [m.get(key, _MISSING) for m in records]
+        columns[key] = column
+    return columns
+
+
+def _present(values: np.ndarray) -> np.ndarray:
+    """Mask of entries that have a value (not _MISSING)"""
+    try:
+        # Elementwise identity fallback of object comparison, done in C
+        return np.asarray(values != _MISSING, dtype=bool).reshape(len(values))
+    except (ValueError, TypeError):
+        # Elements whose comparison is not a plain bool (e.g. arrays)
+        return np.fromiter((v is not _MISSING for v in values), dtype=bool, count=len(values))
+
+
+def _filled(length: int, value: Any) -> np.ndarray:
+    """Object array repeating one value (lists stay single elements)"""
+    array = np.empty(length, dtype=object)
+    array.fill(value)
+    return array
+
+
+class LocationData:
+    """
+    Mappable locations as parallel columns.
+    """
+
+    def __init__(
+        self,
+        names: np.ndarray,
+        geometry: np.ndarray,
+        columns: Optional[Dict[str, np.ndarray]] = None,
+        shared: Optional[Dict[str, Any]] = None
+    ):
+        """
+        Initialize from aligned arrays.
+
+        Args:
+            names: Location name per entry (object array)
+            geometry: Shapely geometry per entry (object array)
+            columns: Per-entry metadata columns, each aligned with names
+            shared: Metadata that applies to every entry (e.g. a category)
+        """
+        self.names = _object_array(names)
+        self.geometry = _object_array(geometry)
+        self.columns = {key: _object_array(values) for key, values in (columns or {}).items()}
+        self.shared = dict(shared or {})
+        # How the analyzer found these entries (field, match ratio)
+        self.source: Dict[str, Any] = {}
+
+    @classmethod
+    def from_records(cls, records: List[Dict[str, Any]]) -> 'LocationData':
+        """
+        Build from the list-of-dicts format.
+
+        Args:
+            records: Dicts with 'location_name', 'geometry' and 'metadata'
+
+        Returns:
+            LocationData with one metadata column per key seen in any record
+        """
+        names = [r['location_name'] for r in records]
+        geometry = [r['geometry'] for r in records]
+        metadata = [r.get('metadata') or {} for r in records]
+        return cls(_object_array(names), _object_array(geometry), metadata_columns(metadata))
+
+    @classmethod
+    def concat(cls, parts: List['LocationData']) -> 'LocationData':
+        """
+        Stack several LocationData (shared metadata becomes a column).
+
+        Args:
+            parts: Pieces to combine, in order
+
+        Returns:
+            Combined LocationData
+        """
+        parts = [p for p in parts if len(p)]
+        if len(parts) == 1:
+            return parts[0]
+        if not parts:
+            return cls(_object_array([]), _object_array([]))
+        keys = list(dict.fromkeys(k for p in parts for k in list(p.shared) + list(p.columns)))
+        columns = {}
+        for key in keys:
+            pieces = []
+            for p in parts:
+                if key in p.columns:
+                    pieces.append(p.columns[key])
+                else:
+                    filler = np.empty(len(p), dtype=object)
+                    filler[:] = [p.shared.get(key, _MISSING)] * len(p)
+                    pieces.append(filler)
+            columns[key] = np.concatenate(pieces)
+        return cls(
+            np.concatenate([p.names for p in parts]),
+            np.concatenate([p.geometry for p in parts]),
+            columns
+        )
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __bool__(self) -> bool:
+        return len(self) > 0
+
+    def metadata_at(self, i: int) -> Dict[str, Any]:
+        """
+        Get one entry's metadata as a dict.
+
+        Args:
+            i: Entry position
+
+        Returns:
+            Shared metadata merged with the entry's column values
+        """
+        metadata = dict(self.shared)
+        for key, values in self.columns.items():
+            value = values[i]
+            if value is not _MISSING:
+                metadata[key] = value
+        return metadata
+
+    def get_column(self, key: str, default: Any = None) -> np.ndarray:
+        """
+        Get one metadata field for all entries.
+
+        Args:
+            key: Metadata key (column or shared)
+            default: Value for entries that lack the key
+
+        Returns:
+            Object array aligned with the entries
+        """
+        if key in self.columns:
+            values = self.columns[key]
+            present = _present(values)
+            if not present.all():
+                values = np.where(present, values, _filled(len(values), default))
+            return values
+        return _filled(len(self), self.shared.get(key, default))
+
+    def metadata_fields(self) -> List[Tuple[Any, np.ndarray, np.ndarray]]:
+        """
+        Get every metadata key as a column, in metadata_at() key order.
+
+        Returns:
+            [(key, values, present), ...] where present is False for entries
+            that lack the key
+        """
+        fields = []
+        keys = list(self.shared) + [k for k in self.columns if k not in self.shared]
+        for key in keys:
+            if key in self.columns:
+                values = self.columns[key]
+                present = _present(values)
+                if key in self.shared and not present.all():
+                    values = np.where(present, values, _filled(len(values), self.shared[key]))
+                    present = np.ones(len(values), dtype=bool)
+            else:
+                values = _filled(len(self), self.shared[key])
+                present = np.ones(len(self), dtype=bool)
+            fields.append((key, values, present))
+        return fields
+
+    def __getitem__(self, i: int) -> Dict[str, Any]:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("LocationData index out of range")
+        return {
+            'location_name': self.names[i],
+            'geometry': self.geometry[i],
+            'metadata': self.metadata_at(i)
+        }
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def to_records(self) -> List[Dict[str, Any]]:
+        """Convert to the list-of-dicts format"""
+        return list(self)
+
+    def coordinates(self) -> np.ndarray:
+        """
+        Get point coordinates for all entries at once.
+
+        Returns:
+            (n, 2) float array of [lat, lon] rows (representative point for
+            non-point geometries)
+        """
+        geometry = self.geometry
+        not_point = shapely.get_type_id(geometry) != 0
+        if not_point.any():
+            geometry = geometry.copy()
+            geometry[not_point] = shapely.point_on_surface(geometry[not_point])
+        return np.column_stack([shapely.get_y(geometry), shapely.get_x(geometry)])
+
+    def groups(self) -> Dict[Any, np.ndarray]:
+        """
+        Group entries by location name.
+
+        Returns:
+            Location name -> entry positions, in first-appearance order
+        """
+        codes, uniques = pd.factorize(pd.Series(self.names, dtype=object), use_na_sentinel=False)
+        order = np.argsort(codes, kind='stable')
+        bounds = np.concatenate([[0], np.cumsum(np.bincount(codes, minlength=len(uniques)))])
+        return {name: order[bounds[i]:bounds[i + 1]] for i, name in enumerate(uniques)}
+
+    @property
+    def __geo_interface__(self) -> Dict[str, Any]:
+        """GeoJSON FeatureCollection (used for logging and export)"""
+        return {
+            'type': 'FeatureCollection',
+            'features': [
+                {
+                    'type': 'Feature',
+                    'geometry': entry['geometry'].__geo_interface__ if entry['geometry'] is not None else None,
+                    'properties': {'location_name': entry['location_name'], **entry['metadata']}
+                }
+                for entry in self
+            ]
+        }
+
+    def __repr__(self) -> str:
+        keys = list(self.shared) + list(self.columns)
+        return f"LocationData({len(self)} entries, {len(set(self.names.tolist()))} locations, metadata={keys})"
@@ -1,12 +1,18 @@
+import os
 import json
+import time
+import atexit
+import threading
+from collections import deque
 from pathlib import Path
-import jsonlines
 from datetime import datetime
 import numpy as np
 import pandas as pd
 import geopandas as gpd  # to handle GeoPandaDatafram booo
 from shapely.geometry import Point
 
+from src.location_data import LocationData
+
 def convert_shapely_to_serializable(obj):
     """
     Recursively convert Shapely objects and pandas DataFrames to serializable format.
@@ -30,8 +36,9 @@ def convert_shapely_to_serializable(obj):
         if obj.empty:
             return {"_type": "GeoDataFrame", "data": [], "columns": list(obj.columns)}
         
-        # Convert geometry column to serializable format
-        df_copy = obj.copy()
+        # Convert geometry column to serializable format (on a plain
+        # DataFrame: a GeoDataFrame warns when geometry becomes dicts)
+        df_copy = pd.DataFrame(obj)
         if 'geometry' in df_copy.columns:
             df_copy['geometry'] = df_copy['geometry'].apply(
                 lambda geom: convert_shapely_to_serializable(geom) if geom is not None else None
@@ -52,7 +59,7 @@ def convert_shapely_to_serializable(obj):
         # Convert to list of records (most common use case)
         return {
             "_type": "DataFrame",
-            "data": df_copy.to_dict('records'),  # ⚠️ Note: you may need to recursively convert this too
+            "data": convert_shapely_to_serializable(obj.to_dict('records')),
             "columns": list(obj.columns),
             "shape": obj.shape
         }
@@ -75,7 +82,7 @@ def convert_shapely_to_serializable(obj):
     
     # Handle other Shapely geometries (if needed)
     elif hasattr(obj, '__geo_interface__'):
-        return obj.__geo_interface__
+        return convert_shapely_to_serializable(obj.__geo_interface__)
     
     # Handle dictionaries recursively
     elif isinstance(obj, dict):
@@ -98,10 +105,292 @@ def convert_shapely_to_serializable(obj):
     else:
         return obj
 
+LOG_BATCH = int(os.getenv('SF_FILM_LOG_BATCH', '256'))
+LOG_FLUSH_SECONDS = float(os.getenv('SF_FILM_LOG_FLUSH_SECONDS', '1'))
+LOG_MAX_MB = float(os.getenv('SF_FILM_LOG_MAX_MB', '50'))
+LOG_ROTATE_HOURS = float(os.getenv('SF_FILM_LOG_ROTATE_HOURS', '24'))
+LOG_BACKUPS = int(os.getenv('SF_FILM_LOG_BACKUPS', '5'))
+LOG_RECORD_KB = int(os.getenv('SF_FILM_LOG_RECORD_KB', '64'))
+# Rows / items / characters kept per logged collection or string
+LOG_SAMPLE_ITEMS = int(os.getenv('SF_FILM_LOG_SAMPLE_ITEMS', '20'))
+LOG_SAMPLE_CHARS = 2000
+LOG_MAX_PENDING = 10000
+
+
+def sample_payload(obj, max_items=LOG_SAMPLE_ITEMS, max_chars=LOG_SAMPLE_CHARS, depth=0):
+    """
+    Shrink a payload before serialization: large frames, lists, dicts and
+    strings keep their first items, with a marker giving the full size.
+
+    Args:
+        obj: Any Python object (DataFrames, geometries, nested containers)
+        max_items: Rows or items kept per collection
+        max_chars: Characters kept per string
+        depth: Current nesting level (deeper levels are summarized)
+
+    Returns:
+        Object of the same kind, small enough to serialize quickly
+    """
+    if depth > 10:
+        return f"<{type(obj).__name__}>"
+    if isinstance(obj, str):
+        return obj if len(obj) <= max_chars else obj[:max_chars] + f"... [{len(obj)} chars]"
+    if isinstance(obj, (pd.DataFrame, pd.Series, np.ndarray, LocationData)):
+        if len(obj) <= max_items:
+            return obj
+        head = obj[:max_items] if isinstance(obj, np.ndarray) else (
+            obj.head(max_items) if not isinstance(obj, LocationData) else [obj[i] for i in range(max_items)])
+        return {"_truncated": f"first {max_items} of {len(obj)}", "head": head}
+    if isinstance(obj, dict):
+        items = list(obj.items())
+        sampled = {k: sample_payload(v, max_items, max_chars, depth + 1) for k, v in items[:max_items * 5]}
+        if len(items) > max_items * 5:
+            sampled["_truncated"] = f"first {max_items * 5} of {len(items)} keys"
+        return sampled
+    if isinstance(obj, (list, tuple)):
+        sampled = [sample_payload(v, max_items, max_chars, depth + 1) for v in obj[:max_items]]
+        if len(obj) > max_items:
+            sampled.append({"_truncated": f"first {max_items} of {len(obj)} items"})
+        return sampled
+    return obj
+
+
+class JsonlLogger:
+    """
+    Background log writer: callers only enqueue records; one thread
+    serializes them and appends them in batches, keeping files open and
+    rotating them by size and age.
+    """
+
+    def __init__(self, log_dir="log", batch_size=LOG_BATCH, flush_seconds=LOG_FLUSH_SECONDS,
+                 max_bytes=int(LOG_MAX_MB * 1024 * 1024), rotate_seconds=LOG_ROTATE_HOURS * 3600,
+                 backups=LOG_BACKUPS, max_record_bytes=LOG_RECORD_KB * 1024):
+        """
+        Initialize the logger and start its thread.
+
+        Args:
+            log_dir: Directory of the log files
+            batch_size: Records that trigger an immediate write
+            flush_seconds: Longest time a record waits before being written
+            max_bytes: Size at which a file is rotated (0 = never)
+            rotate_seconds: Age at which a file is rotated (0 = never)
+            backups: Rotated files kept per log file
+            max_record_bytes: Serialized payload size above which a record
+                is replaced by a truncated preview
+        """
+        self.log_dir = Path.cwd() / log_dir
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.max_bytes = max_bytes
+        self.rotate_seconds = rotate_seconds
+        self.backups = backups
+        self.max_record_bytes = max_record_bytes
+
+        self._pending = deque()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._idle = threading.Condition(self._lock)
+        self._writing = False
+        self._flushing = 0  # callers waiting in flush()
+        self._closed = False
+        self._files = {}  # filename -> (file object, opened at)
+        self._stats = {"records": 0, "written": 0, "dropped": 0, "truncated": 0, "failed": 0,
+                       "batches": 0, "rotations": 0}
+        self._thread = threading.Thread(target=self._run, name=f"jsonl-logger-{log_dir}", daemon=True)
+        self._thread.start()
+
+    def log(self, filename, message, query=None, jsonlines_flag=True):
+        """
+        Queue one record (returns immediately; serialization happens later).
+
+        The message is snapshotted here, since the caller may keep mutating
+        it: JSONLines payloads are sampled now (which copies their dicts and
+        lists), plain-text ones get a shallow copy. Leaf objects such as
+        frames and geometries are still shared and must not be changed in
+        place after logging.
+
+        Args:
+            filename: Log file name inside the log directory
+            message: The content to write
+            query: ID/query identifier for JSONLines
+            jsonlines_flag: JSONLines record, or the plain text format
+        """
+        if jsonlines_flag:
+            message = sample_payload(message)
+        elif isinstance(message, (dict, list)):
+            message = message.copy()
+        record = (filename, message, query, jsonlines_flag, datetime.now().isoformat())
+        with self._lock:
+            self._stats["records"] += 1
+            if len(self._pending) >= LOG_MAX_PENDING:
+                # Disk is not keeping up: drop the oldest record instead of growing
+                self._pending.popleft()
+                self._stats["dropped"] += 1
+            self._pending.append(record)
+            if len(self._pending) >= self.batch_size:
+                self._wakeup.notify()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                self._wakeup.wait_for(
+                    lambda: len(self._pending) >= self.batch_size or self._flushing or self._closed,
+                    timeout=self.flush_seconds)
+                batch = list(self._pending)
+                self._pending.clear()
+                self._writing = bool(batch)
+                closed = self._closed
+            if batch:
+                self._write_batch(batch)
+            with self._lock:
+                self._writing = False
+                if not self._pending:
+                    self._idle.notify_all()
+            if closed and not batch:
+                break
+        for f, _ in self._files.values():
+            f.close()
+        self._files.clear()
+
+    def _format(self, record):
+        """Serialize one record to its text line(s)"""
+        filename, message, query, jsonlines_flag, timestamp = record
+        if not jsonlines_flag:
+            return ' '*50 + '\n' + f"[{timestamp}]" + json.dumps(message, default=str) + ' '*50 + '\n'
+
+        payload = json.dumps(convert_shapely_to_serializable(message), default=str)
+        if len(payload) > self.max_record_bytes:
+            with self._lock:
+                self._stats["truncated"] += 1
+            payload = json.dumps({"_truncated": f"{len(payload)} bytes",
+                                  "preview": payload[:self.max_record_bytes]})
+        if query is None:
+            # Provide a default if query is not specified
+            query = "default_id"
+        return ('{"id": ' + json.dumps(query, default=str) + ', "timestamp": ' + json.dumps(timestamp)
+                + ', "code_execution_result": ' + payload + '}\n')
+
+    def _write_batch(self, batch):
+        """Serialize a batch and append it file by file"""
+        lines = {}
+        for record in batch:
+            try:
+                lines.setdefault(record[0], []).append(self._format(record))
+            except Exception as e:
+                print(f"⚠️⚠️⚠️ Error serializing record for {record[0]}: {e}")
+                with self._lock:
+                    self._stats["failed"] += 1
+        for filename, texts in lines.items():
+            try:
+                f = self._open(filename)
+                f.write(''.join(texts))
+                f.flush()
+                with self._lock:
+                    self._stats["written"] += len(texts)
+                    self._stats["batches"] += 1
+            except Exception as e:
+                print(f"⚠️⚠️⚠️ Error writing to {filename}: {e}")
+                with self._lock:
+                    self._stats["failed"] += len(texts)
+
+    def _open(self, filename):
+        """Open (or reuse) a log file, rotating it first if it is too big or too old"""
+        path = self.log_dir / filename
+        entry = self._files.get(filename)
+        if entry is not None:
+            f, opened = entry
+            too_big = self.max_bytes and f.tell() >= self.max_bytes
+            too_old = self.rotate_seconds and time.time() - opened >= self.rotate_seconds
+            if not (too_big or too_old):
+                return f
+            f.close()
+            del self._files[filename]
+            self._rotate(path)
+        elif path.exists() and self.max_bytes and path.stat().st_size >= self.max_bytes:
+            self._rotate(path)
+
+        # Create directory (with parents if needed)
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        f = open(path, 'a', encoding='utf-8')
+        self._files[filename] = (f, time.time())
+        return f
+
+    def _rotate(self, path):
+        """Rename path to a timestamped backup and delete backups beyond the limit"""
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+        path.rename(path.with_name(f"{path.stem}.{stamp}{path.suffix}"))
+        with self._lock:
+            self._stats["rotations"] += 1
+        backups = sorted(path.parent.glob(f"{path.stem}.*{path.suffix}"))
+        for old in backups[:max(0, len(backups) - self.backups)]:
+            old.unlink(missing_ok=True)
+
+    def flush(self, timeout=None):
+        """
+        Wait until every queued record has been written.
+
+        Args:
+            timeout: Seconds to wait at most (None waits indefinitely)
+
+        Returns:
+            True if everything was written, False on timeout
+        """
+        with self._lock:
+            self._flushing += 1  # write without waiting for a full batch
+            self._wakeup.notify()
+            try:
+                return self._idle.wait_for(lambda: not self._pending and not self._writing, timeout=timeout)
+            finally:
+                self._flushing -= 1
+
+    def close(self, timeout=10):
+        """Write pending records, close the files and stop the thread"""
+        self.flush(timeout)
+        with self._lock:
+            self._closed = True
+            self._wakeup.notify()
+        self._thread.join(timeout)
+
+    def get_stats(self):
+        """
+        Get logger counters.
+
+        Returns:
+            Dictionary of queued/written/dropped/truncated/failed records,
+            batches, rotations and the current queue length
+        """
+        with self._lock:
+            return {**self._stats, "pending": len(self._pending)}
+
+
+_loggers = {}
+_loggers_lock = threading.Lock()
+
+
+def get_logger(log_dir="log"):
+    """
+    Get the process-wide logger of a directory (flushed at interpreter exit).
+
+    Args:
+        log_dir: Directory of the log files
+
+    Returns:
+        Shared JsonlLogger
+    """
+    with _loggers_lock:
+        logger = _loggers.get(log_dir)
+        if logger is None:
+            logger = JsonlLogger(log_dir)
+            _loggers[log_dir] = logger
+            atexit.register(logger.close)
+        return logger
+
+
 def write_to_log_file(message, filename, query=None, jsonlines_flag=False, log_dir="log"):
     """
-    Write a message to a log file in the specified directory.
-    Creates the directory if it doesn't exist.
+    Queue a message for a log file in the specified directory. The record is
+    serialized and appended by a background thread (see JsonlLogger), so this
+    returns in microseconds; the directory is created on first write.
 
     Args:
         message: The content to write
@@ -111,38 +400,7 @@ def write_to_log_file(message, filename, query=None, jsonlines_flag=False, log_d
         log_dir: Directory to store log files
     """
     try:
-        # Simplify path creation - Path.cwd() / log_dir is cleaner
-        log_path = Path.cwd() / log_dir
-        log_file = log_path / filename
-
-        # Create directory (with parents if needed)
-        log_path.mkdir(parents=True, exist_ok=True)
-
-        timestamp = datetime.now().isoformat()
-
-        # Write to file
-        if jsonlines_flag:
-            # Pre-process your message before writing
-            processed_message = convert_shapely_to_serializable(message)
-
-            if query is None:
-                # Provide a default if query is not specified
-                query = "default_id"
-            with jsonlines.open(log_file, mode='a') as writer:
-                writer.write({
-                    'id': query,
-                    'timestamp': timestamp,
-                    'code_execution_result': processed_message
-                })
-        else:
-            with open(log_file, 'a', encoding='utf-8') as f:
-                f.write(' '*50 + '\n')
-                f.write(f"[{timestamp}]")
-                f.write(json.dumps(message))
-                f.write(' '*50 + '\n')
-
-        print(f"✅😸🐬🐶 Successfully wrote to {log_file}")
-
+        get_logger(log_dir).log(filename, message, query, jsonlines_flag)
     except Exception as e:
         print(f"⚠️⚠️⚠️ Error writing to {filename}: {e}")
 
@@ -159,3 +417,19 @@ if __name__ == "__main__":
         query="user_query_123",
         jsonlines_flag=True
     )
+
+    # Request-path cost of logging a full dataset result
+    from src import data_loader
+    gdf = data_loader.store.current().gdf
+    result = {"success": True, "data": {"data": gdf, "summary": "All locations"}}
+    calls = 1000
+    start = time.perf_counter()
+    for i in range(calls):
+        write_to_log_file(result, "benchmark.jsonl", query=f"q{i}", jsonlines_flag=True)
+    queued = time.perf_counter() - start
+    logger = get_logger()
+    logger.flush()
+    total = time.perf_counter() - start
+    print(f"📊 {1e6 * queued / calls:.1f} us per call on the request path; "
+          f"{calls} records written in {total:.2f} s: {logger.get_stats()}")
+    (logger.log_dir / "benchmark.jsonl").unlink(missing_ok=True)
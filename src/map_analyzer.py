@@ -1,7 +1,138 @@
 # src/map_analyzer.py
+import os
+import time
+import threading
+import numpy as np
 import pandas as pd
 import geopandas as gpd
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Union, Tuple
+from src import data_loader
+from src.location_data import LocationData, metadata_columns
+
+
+# Share of (non-null) values that must be known locations for a list, key set
+# or column to count as mappable; 0 means "at least one match"
+MIN_LOCATION_MATCH = float(os.getenv('SF_FILM_MIN_LOCATION_MATCH', '0'))
+
+# Columns/keys without a location-like name need at least this share to be
+# used, so a stray match in e.g. a title column doesn't produce a map
+UNNAMED_FIELD_MATCH = 0.5
+
+# Field names that suggest location values (preferred when match ratios tie)
+LOCATION_FIELDS = ['locations', 'location', 'place']
+
+# Budgets for searching nested results (containers + scanned items, nesting levels)
+WALK_MAX_NODES = int(os.getenv('SF_FILM_MAP_WALK_NODES', '5000'))
+WALK_MAX_DEPTH = int(os.getenv('SF_FILM_MAP_WALK_DEPTH', '6'))
+
+# Key names whose string value is taken as a location (named-field strategy)
+LOCATION_FIELD_NAMES = ['location', 'locations', 'place', 'places', 'spot', 'site']
+
+
+def normalize_location(name: str) -> str:
+    """Lookup key of a location name: whitespace collapsed, case-folded"""
+    return ' '.join(name.split()).casefold()
+
+
+def normalize_locations(names: pd.Series) -> pd.Series:
+    """Vectorized normalize_location"""
+    return names.astype(str).str.split().str.join(' ').str.casefold()
+
+
+def _object_values(values: Any) -> np.ndarray:
+    """1-D object array of values (nested lists stay single elements)"""
+    if isinstance(values, np.ndarray) and values.dtype == object and values.ndim == 1:
+        return values
+    if isinstance(values, (pd.Series, pd.Index)):
+        return values.to_numpy(dtype=object)
+    if isinstance(values, np.ndarray):
+        return values.astype(object)
+    return np.fromiter(values, dtype=object, count=len(values))
+
+
+def _is_location_field(key: Any) -> bool:
+    key_lower = str(key).lower()
+    return any(field in key_lower for field in LOCATION_FIELD_NAMES)
+
+
+class _StructureWalker:
+    """
+    Collects location candidates from a nested result within node/depth budgets.
+    Frames and lists of dicts are kept whole for their own extractors; every
+    loose name (list items, dict keys, Series index, named string fields) is
+    gathered so the analyzer can match them all in one lookup.
+    """
+
+    def __init__(self, max_nodes: int = WALK_MAX_NODES, max_depth: int = WALK_MAX_DEPTH):
+        self.max_nodes = max_nodes
+        self.max_depth = max_depth
+        self.nodes = 0
+        self.truncated = False
+        self.frames: List[Tuple[str, pd.DataFrame]] = []
+        self.records: List[Tuple[str, list]] = []
+        # (path, kind, names, values): kind is 'list', 'keys' or 'field'
+        self.names: List[Tuple[str, str, np.ndarray, Any]] = []
+
+    def _spend(self, count: int = 1) -> bool:
+        """Charge nodes to the budget; False once it is exhausted"""
+        if self.nodes + count > self.max_nodes:
+            self.truncated = True
+            return False
+        self.nodes += count
+        return True
+
+    def walk(self, obj: Any, path: str = 'result', depth: int = 0) -> None:
+        if not self._spend():
+            return
+
+        if isinstance(obj, pd.DataFrame):
+            self.frames.append((path, obj))
+        elif isinstance(obj, pd.Series):
+            values = obj.to_numpy(dtype=object)
+            self.names.append((path, 'list', values, None))
+            if not isinstance(obj.index, pd.RangeIndex):
+                # e.g. value_counts(): the index holds the names
+                self.names.append((path, 'keys', obj.index.to_numpy(dtype=object), values))
+        elif isinstance(obj, np.ndarray):
+            if obj.ndim == 1 and obj.dtype == object:
+                self.names.append((path, 'list', obj, None))
+        elif isinstance(obj, dict):
+            self._walk_dict(obj, path, depth)
+        elif isinstance(obj, (list, tuple)) and obj:
+            if isinstance(obj[0], str):
+                self.names.append((path, 'list', _object_values(obj), None))
+            if isinstance(obj[0], dict):
+                # Records are scanned key by key, so each one costs a node
+                remaining = max(0, self.max_nodes - self.nodes)
+                records = list(obj[:remaining])
+                self.truncated |= len(records) < len(obj)
+                self.nodes += len(records)
+                self.records.append((path, records))
+            if not isinstance(obj[0], str) and depth < self.max_depth:
+                # Also look inside the items (used if the records themselves don't match)
+                for i, item in enumerate(obj):
+                    if self.truncated:
+                        break
+                    self.walk(item, f"{path}[{i}]", depth + 1)
+
+    def _walk_dict(self, obj: dict, path: str, depth: int) -> None:
+        keys = list(obj.keys())
+        self.names.append((path, 'keys', _object_values(keys), obj))
+        for key, value in obj.items():
+            if self.truncated:
+                break
+            if isinstance(value, str):
+                if self._spend() and _is_location_field(key):
+                    siblings = {k: v for k, v in obj.items() if k != key and not _is_container(v)}
+                    self.names.append((f"{path}.{key}", 'field', np.array([value], dtype=object), siblings))
+            elif _is_container(value) and depth < self.max_depth:
+                self.walk(value, f"{path}.{key}", depth + 1)
+            else:
+                self._spend()
+
+
+def _is_container(value: Any) -> bool:
+    return isinstance(value, (dict, list, tuple, pd.DataFrame, pd.Series, np.ndarray))
 
 
 class MapDataAnalyzer:
@@ -16,16 +147,128 @@ class MapDataAnalyzer:
         self._create_location_lookup()
     
     def _create_location_lookup(self):
-        """Build location_name -> geometry dict"""
-        self.location_map = {}
-        for _, row in self.gdf.iterrows():
-            if pd.notna(row['Locations']) and pd.notna(row.geometry):
-                self.location_map[row['Locations']] = {
-                    'geometry': row.geometry,
-                    'title': row.get('Title'),
-                    'year': row.get('Year')
-                }
-    
+        """
+        Build the location index: every normalized location key maps to all
+        rows filmed there. Row ids live in one int32 array grouped by key
+        (key i owns _row_ids[_offsets[i]:_offsets[i + 1]]); geometry and the
+        display name are stored once per key.
+        """
+        gdf = self.gdf
+        valid = (gdf['Locations'].notna() & gdf.geometry.notna()).to_numpy()
+        positions = np.flatnonzero(valid)
+        normalized = normalize_locations(gdf['Locations'].iloc[positions])
+        nonblank = (normalized != '').to_numpy()
+        positions, normalized = positions[nonblank], normalized[nonblank]
+
+        codes, keys = pd.factorize(normalized)
+        order = np.argsort(codes, kind='stable')
+        self._row_ids = positions[order].astype(np.int32)
+        self._offsets = np.concatenate([[0], np.cumsum(np.bincount(codes, minlength=len(keys)))])
+        first_rows = self._row_ids[self._offsets[:-1]]
+
+        self._key_index = pd.Index(keys)  # batch lookups (get_indexer)
+        self._key_ids = dict(zip(keys, range(len(keys))))  # single lookups
+        self._key_names = gdf['Locations'].to_numpy(dtype=object)[first_rows]
+        self._key_geometry = gdf.geometry.to_numpy()[first_rows]
+
+        def column(name: str) -> np.ndarray:
+            if name in gdf.columns:
+                return gdf[name].to_numpy(dtype=object)
+            return np.full(len(gdf), None, dtype=object)
+
+        self._titles = column('Title')
+        self._years = column('Year')
+
+    def _key_id(self, value: Any) -> int:
+        """Index key id of a location name, or -1 if unknown"""
+        if not isinstance(value, str):
+            return -1
+        return self._key_ids.get(normalize_location(value), -1)
+
+    def location_rows(self, name: str) -> np.ndarray:
+        """
+        Get all dataset rows filmed at a location.
+
+        Args:
+            name: Location name (matched case- and whitespace-insensitively)
+
+        Returns:
+            int32 array of row positions in the dataset (empty if unknown)
+        """
+        key_id = self._key_id(name)
+        if key_id < 0:
+            return self._row_ids[:0]
+        return self._row_ids[self._offsets[key_id]:self._offsets[key_id + 1]]
+
+    def _match_keys(self, values: Any) -> np.ndarray:
+        """Key id per value (-1 for non-strings and unknown names)"""
+        values = _object_values(values)
+        ids = np.full(len(values), -1, dtype=np.int64)
+        is_str = np.fromiter((isinstance(v, str) for v in values), dtype=bool, count=len(values))
+        if is_str.any():
+            # Normalize each distinct name once (results repeat locations a lot)
+            codes, uniques = pd.factorize(values[is_str])
+            unique_ids = self._key_index.get_indexer(normalize_locations(pd.Series(uniques, dtype=object)))
+            ids[is_str] = unique_ids[codes]
+        return ids
+
+    def _match_ratio(self, values: Any) -> Tuple[np.ndarray, float]:
+        """
+        Match every value against the location index.
+
+        Args:
+            values: Candidate location names (list, array or Series)
+
+        Returns:
+            (key id per value, share of non-null values that are known locations)
+        """
+        key_ids = self._match_keys(values)
+        present = int(np.count_nonzero(pd.notna(_object_values(values))))
+        matched = int(np.count_nonzero(key_ids >= 0))
+        return key_ids, matched / present if present else 0.0
+
+    @staticmethod
+    def _is_match(key_ids: np.ndarray, ratio: float, named: bool = True) -> bool:
+        """Whether a matched set of values is enough to map"""
+        threshold = MIN_LOCATION_MATCH if named else max(MIN_LOCATION_MATCH, UNNAMED_FIELD_MATCH)
+        return bool((key_ids >= 0).any()) and ratio >= threshold
+
+    def _gather(self, names: List[Any], extra: Optional[Dict[str, Any]] = None,
+                key_ids: Optional[np.ndarray] = None) -> LocationData:
+        """
+        Expand location names to one entry per film row filmed there,
+        gathering title/year for all rows at once.
+
+        Args:
+            names: Location names (duplicates and unknown names are skipped)
+            extra: Metadata shared by every entry
+            key_ids: Precomputed _match_keys(names)
+
+        Returns:
+            Columnar location entries
+        """
+        if key_ids is None:
+            key_ids = self._match_keys(names)
+        keep = key_ids >= 0
+        # First occurrence of each known location, in input order
+        _, first = np.unique(key_ids[keep], return_index=True)
+        picked = np.flatnonzero(keep)[np.sort(first)]
+        key_ids = key_ids[picked]
+
+        starts = self._offsets[key_ids]
+        lengths = self._offsets[key_ids + 1] - starts
+        item_of_row = np.repeat(np.arange(len(key_ids)), lengths)
+        within = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        rows = self._row_ids[np.repeat(starts, lengths) + within]
+
+        names = _object_values(names)
+        return LocationData(
+            names[picked[item_of_row]],
+            self._key_geometry[key_ids[item_of_row]],
+            {'title': self._titles[rows], 'year': self._years[rows]},
+            shared=extra
+        )
+
     def analyze(self, execution_result: Dict[str, Any], 
                 user_query: str) -> Dict[str, Any]:
         """
@@ -35,8 +278,11 @@ class MapDataAnalyzer:
             {
                 'can_map': bool,
                 'reason': str,
-                'location_data': List[Dict] or None,
+                'location_data': LocationData or None,
+                'location_field': str or None,
+                'match_ratio': float or None,
                 'location_mentioned': bool,
+                'aggregate_query': bool,
                 'data_type': str
             }
         """
@@ -52,13 +298,20 @@ class MapDataAnalyzer:
         location_keywords = ['location', 'locations', 'place', 'places', 'where', 'map', 'filmed', 'shot']
         query_lower = user_query.lower()
         location_mentioned = any(kw in query_lower for kw in location_keywords)
+        # Density-style questions are better shown as counts per area than as pins
+        aggregate_keywords = ['most filmed', 'filmed most', 'density', 'dense', 'hotspot', 'hot spot',
+                              'concentrat', 'heatmap', 'heat map', 'busiest', 'which area', 'which neighborhood']
+        aggregate_query = any(kw in query_lower for kw in aggregate_keywords)
         
         # Initialize result
         result = {
             'can_map': False,
             'reason': '',
             'location_data': None,
+            'location_field': None,
+            'match_ratio': None,
             'location_mentioned': location_mentioned,
+            'aggregate_query': aggregate_query,
             'data_type': self._get_data_type(data)
         }
         
@@ -78,7 +331,12 @@ class MapDataAnalyzer:
         if extracted:
             result['can_map'] = True
             result['location_data'] = extracted
+            result['location_field'] = extracted.source.get('field')
+            result['match_ratio'] = extracted.source.get('match_ratio')
             result['reason'] = f"Found {len(extracted)} mappable locations"
+            if result['match_ratio'] is not None:
+                where = f" in '{result['location_field']}'" if result['location_field'] is not None else ""
+                result['reason'] += f" ({result['match_ratio']:.0%} of values{where} matched)"
         else:
             result['reason'] = "No location data found in result"
         
@@ -98,13 +356,23 @@ class MapDataAnalyzer:
             return "List"
         return type(data).__name__
     
-    def _extract_locations(self, data: Any) -> Optional[List[Dict]]:
+    def _extract_locations(self, data: Any) -> Optional[LocationData]:
         """
         Extract location information from various data structures.
         Uses probing to detect if values are location names.
         
-        Returns standardized list of location dicts or None.
+        Returns columnar LocationData or None.
         """
+        locations = self._extract_location_entries(data)
+        if isinstance(locations, list):
+            locations = LocationData.from_records(locations)
+        if not locations and _is_container(data):
+            # Nothing at the top level - search the nested structure
+            locations = self._walk_locations(data)
+        return locations if locations else None
+
+    def _extract_location_entries(self, data: Any) -> Optional[Union[LocationData, List[Dict]]]:
+        """Dispatch on the result type (paths return LocationData or a list of dicts)"""
         # Case 1: GeoDataFrame (has geometry already)
         if isinstance(data, gpd.GeoDataFrame):
             return self._from_geodataframe(data)
@@ -125,43 +393,31 @@ class MapDataAnalyzer:
     
     def _is_location_name(self, value: Any) -> bool:
         """Check if a value is a known location name"""
-        if not isinstance(value, str):
-            return False
-        return value in self.location_map
+        return self._key_id(value) >= 0
     
-    def _probe_list_for_locations(self, data: list, sample_size: int = 5) -> bool:
-        """
-        Probe first N items in list to see if they're location names.
-        Returns True if at least one item matches a known location.
-        """
-        if not data:
-            return False
-        
-        # Sample first few items
-        sample = data[:min(sample_size, len(data))]
-        
-        for item in sample:
-            if self._is_location_name(item):
-                return True
-        
-        return False
-    
-    def _from_geodataframe(self, gdf: gpd.GeoDataFrame) -> Optional[List[Dict]]:
+    def _from_geodataframe(self, gdf: gpd.GeoDataFrame) -> Optional[LocationData]:
         """Extract from GeoDataFrame - already has geometry"""
-        locations = []
-        for _, row in gdf.iterrows():
-            if pd.notna(row.geometry):
-                locations.append({
-                    'location_name': row.get('Locations', 'Unknown'),
-                    'geometry': row.geometry,
-                    'metadata': {
-                        'title': row.get('Title'),
-                        'year': row.get('Year')
-                    }
-                })
-        return locations if locations else None
+        if gdf._geometry_column_name not in gdf.columns:
+            return None
+        mask = gdf.geometry.notna().to_numpy()
+        if not mask.any():
+            return None
+
+        def column(name: str, default: Any = None) -> np.ndarray:
+            if name in gdf.columns:
+                return gdf[name].to_numpy(dtype=object)[mask]
+            return np.full(mask.sum(), default, dtype=object)
+
+        locations = LocationData(
+            column('Locations', 'Unknown'),
+            gdf.geometry.to_numpy()[mask],
+            {'title': column('Title'), 'year': column('Year')}
+        )
+        locations.source = {'strategy': 'geometry', 'field': str(gdf._geometry_column_name),
+                            'match_ratio': float(mask.mean())}
+        return locations
     
-    def _from_list(self, data: list) -> Optional[List[Dict]]:
+    def _from_list(self, data: list) -> Optional[LocationData]:
         """
         Extract from list - could be:
         1. List of location name strings ['Union Square', 'Golden Gate Bridge']
@@ -170,60 +426,73 @@ class MapDataAnalyzer:
         if not data:
             return None
         
-        # Check first item type
-        first_item = data[0]
-        
-        # Case 1: List of strings - probe if they're locations
-        if isinstance(first_item, str):
-            if self._probe_list_for_locations(data):
-                locations = []
-                for loc_name in data:
-                    if loc_name in self.location_map:
-                        locations.append({
-                            'location_name': loc_name,
-                            'geometry': self.location_map[loc_name]['geometry'],
-                            'metadata': {
-                                'title': self.location_map[loc_name].get('title'),
-                                'year': self.location_map[loc_name].get('year')
-                            }
-                        })
-                return locations if locations else None
-            return None
-        
         # Case 2: List of dicts
-        if isinstance(first_item, dict):
+        if isinstance(data[0], dict):
             return self._from_list_of_dicts(data)
         
-        return None
+        # Case 1: Location names - every item is checked, not just the first few
+        key_ids, ratio = self._match_ratio(data)
+        if not self._is_match(key_ids, ratio):
+            return None
+        locations = self._gather(data, key_ids=key_ids)
+        locations.source = {'strategy': 'list', 'field': None, 'match_ratio': ratio}
+        return locations
     
-    def _from_list_of_dicts(self, data: list) -> Optional[List[Dict]]:
-        """Extract from list of dicts with location fields"""
-        locations = []
-        for item in data:
-            # Look for location field (case-insensitive)
-            loc_value = None
-            for key in item.keys():
-                if key.lower() in ['locations', 'location', 'place']:
-                    loc_value = item[key]
-                    break
-            
-            # Handle both single location (string) and multiple locations (list)
-            if loc_value:
-                # Convert to list if it's a string
-                loc_names = loc_value if isinstance(loc_value, list) else [loc_value]
-                
-                # Process each location name
-                for loc_name in loc_names:
-                    if isinstance(loc_name, str) and loc_name in self.location_map:
-                        locations.append({
-                            'location_name': loc_name,
-                            'geometry': self.location_map[loc_name]['geometry'],
-                            'metadata': item
-                        })
+    def _from_list_of_dicts(self, data: list) -> Optional[LocationData]:
+        """
+        Extract from list of dicts: the key whose values best match known
+        locations is used (a value may be one name or a list of names).
+        """
+        records = [item if isinstance(item, dict) else {} for item in data]
+        best = None
+        for key, names, items in self._record_fields(records):
+            named = str(key).lower() in LOCATION_FIELDS
+            key_ids, ratio = self._match_ratio(names)
+            if not self._is_match(key_ids, ratio, named):
+                continue
+            if best is None or (ratio, named) > best[0]:
+                best = ((ratio, named), key, names, items, key_ids)
+        
+        if best is None:
+            return None
+        (ratio, _), key, names, items, key_ids = best
+        return self._records_to_locations(records, key, names, items, key_ids, ratio)
+    
+    @staticmethod
+    def _record_fields(records: List[dict]) -> List[Tuple[Any, np.ndarray, np.ndarray]]:
+        """
+        Flatten each key's values across records (list values contribute
+        every element), remembering which record each value came from.
         
-        return locations if locations else None
+        Returns:
+            [(key, names, record position per name), ...]
+        """
+        fields = []
+        for key in dict.fromkeys(k for item in records for k in item):
+            names, items = [], []
+            for i, item in enumerate(records):
+                value = item.get(key)
+                if isinstance(value, list):
+                    names.extend(value)
+                    items.extend([i] * len(value))
+                elif value is not None:
+                    names.append(value)
+                    items.append(i)
+            fields.append((key, _object_values(names), np.asarray(items, dtype=np.int64)))
+        return fields
     
-    def _from_dict(self, data: dict) -> Optional[List[Dict]]:
+    def _records_to_locations(self, records: List[dict], key: Any, names: np.ndarray,
+                              items: np.ndarray, key_ids: np.ndarray, ratio: float) -> LocationData:
+        """Build entries for the matched values of one record key"""
+        mask = key_ids >= 0
+        rows = items[mask]
+        # Each entry carries its whole record as metadata
+        columns = {k: v[rows] for k, v in metadata_columns(records).items()}
+        locations = LocationData(names[mask], self._key_geometry[key_ids[mask]], columns)
+        locations.source = {'strategy': 'list_of_dicts', 'field': str(key), 'match_ratio': ratio}
+        return locations
+    
+    def _from_dict(self, data: dict) -> Optional[LocationData]:
         """
         Extract from dictionary by systematically checking all keys and values.
         """
@@ -245,97 +514,315 @@ class MapDataAnalyzer:
         
         return None
     
-    def _try_extract_from_location_list_values(self, data: dict) -> Optional[List[Dict]]:
+    def _try_extract_from_location_list_values(self, data: dict) -> Optional[LocationData]:
         """
         Check if any values are lists containing location names.
         Example: {'Least popular locations': ['Union Square', 'Pier 39']}
         """
-        locations = []
+        parts = []
+        ratios = {}
         
         for key, value in data.items():
             if isinstance(value, list) and value:
-                # Probe if this list contains locations
-                if self._probe_list_for_locations(value):
-                    for item in value:
-                        if isinstance(item, str) and item in self.location_map:
-                            locations.append({
-                                'location_name': item,
-                                'geometry': self.location_map[item]['geometry'],
-                                'metadata': {
-                                    'category': key,  # e.g., "Least popular locations"
-                                    'title': self.location_map[item].get('title'),
-                                    'year': self.location_map[item].get('year')
-                                }
-                            })
-        
-        return locations if locations else None
+                key_ids, ratio = self._match_ratio(value)
+                if self._is_match(key_ids, ratio):
+                    # e.g. category "Least popular locations"
+                    ratios[str(key)] = ratio
+                    parts.append(self._gather(value, extra={'category': key}, key_ids=key_ids))
+        
+        locations = LocationData.concat(parts)
+        if not locations:
+            return None
+        best = max(ratios, key=ratios.get)
+        locations.source = {'strategy': 'list_values', 'field': best, 'match_ratio': ratios[best],
+                            'fields': ratios}
+        return locations
     
-    def _try_extract_from_location_keys(self, data: dict) -> Optional[List[Dict]]:
+    def _try_extract_from_location_keys(self, data: dict) -> Optional[LocationData]:
         """
         Check if keys themselves are location names.
         Example: {'Union Square': 25, 'Golden Gate Bridge': 18}
         """
-        location_keys = [k for k in data.keys() 
-                         if isinstance(k, str) and self._is_location_name(k)]
+        keys = list(data.keys())
+        key_ids, ratio = self._match_ratio(keys)
         
-        if not location_keys:
+        if not self._is_match(key_ids, ratio):
             return None
         
-        locations = []
-        for loc_name in location_keys:
-            locations.append({
-                'location_name': loc_name,
-                'geometry': self.location_map[loc_name]['geometry'],
-                'metadata': {'value': data[loc_name]}
-            })
-        
-        return locations if locations else None
+        mask = key_ids >= 0
+        names = _object_values(keys)[mask]
+        locations = LocationData(
+            names,
+            self._key_geometry[key_ids[mask]],
+            {'value': [data[name] for name in names]}
+        )
+        locations.source = {'strategy': 'keys', 'field': None, 'match_ratio': ratio}
+        return locations
     
-    def _try_extract_from_named_location_fields(self, data: dict) -> Optional[List[Dict]]:
+    def _try_extract_from_named_location_fields(self, data: dict) -> Optional[LocationData]:
         """
         Check if any keys are named 'location', 'locations', 'place', etc.
+        The field whose value best matches known locations is used.
         Example: {'location': 'Union Square', 'count': 5}
         """
-        location_field_names = ['location', 'locations', 'place', 'places', 'spot', 'site']
-        
+        best = None
         for key, value in data.items():
-            key_lower = str(key).lower()
-            
             # Check if key name suggests it contains location data
-            if any(field in key_lower for field in location_field_names):
+            if _is_location_field(key):
                 # Value could be a string or list
-                if isinstance(value, str) and value in self.location_map:
-                    metadata = {k: v for k, v in data.items() if k != key}
-                    return [{
-                        'location_name': value,
-                        'geometry': self.location_map[value]['geometry'],
-                        'metadata': metadata
-                    }]
-                elif isinstance(value, list):
-                    return self._from_list(value)
-        
-        return None
-    
-    def _from_dataframe(self, df: pd.DataFrame) -> Optional[List[Dict]]:
-        """Extract from DataFrame with location column"""
-        # Look for location column (case-insensitive)
-        loc_col = None
-        for col in df.columns:
-            if col.lower() in ['locations', 'location', 'place']:
-                loc_col = col
-                break
+                if isinstance(value, str) or (isinstance(value, list) and value):
+                    key_ids, ratio = self._match_ratio(value if isinstance(value, list) else [value])
+                    if self._is_match(key_ids, ratio) and (best is None or ratio > best[0]):
+                        best = (ratio, key, value)
         
-        if not loc_col:
+        if best is None:
             return None
+        ratio, key, value = best
         
-        locations = []
-        for _, row in df.iterrows():
-            loc_name = row.get(loc_col)
-            if loc_name and loc_name in self.location_map:
-                locations.append({
-                    'location_name': loc_name,
-                    'geometry': self.location_map[loc_name]['geometry'],
-                    'metadata': row.to_dict()
-                })
-        
-        return locations if locations else None
\ No newline at end of file
+        if isinstance(value, list):
+            locations = self._from_list(value)
+            if not locations:
+                return None
+        else:
+            metadata = {k: v for k, v in data.items() if k != key}
+            locations = LocationData(
+                [value],
+                [self._key_geometry[self._key_id(value)]],
+                metadata_columns([metadata])
+            )
+        locations.source = {'strategy': 'named_field', 'field': str(key), 'match_ratio': ratio}
+        return locations
+    
+    def _from_dataframe(self, df: pd.DataFrame) -> Optional[LocationData]:
+        """
+        Extract from DataFrame: the text column whose values best match known
+        locations is used (location-named columns are checked first and win ties).
+        """
+        candidates = []
+        for i, col in enumerate(df.columns):
+            dtype = df.dtypes.iloc[i]
+            if (pd.api.types.is_object_dtype(dtype) or pd.api.types.is_string_dtype(dtype)
+                    or isinstance(dtype, pd.CategoricalDtype)):
+                candidates.append((str(col).lower() not in LOCATION_FIELDS, i))
+        candidates.sort()
+        
+        best = None
+        for not_named, i in candidates:
+            names = df.iloc[:, i].to_numpy(dtype=object)
+            key_ids, ratio = self._match_ratio(names)
+            if self._is_match(key_ids, ratio, not not_named) and (best is None or ratio > best[0]):
+                best = (ratio, i, names, key_ids)
+                if ratio == 1.0:
+                    break  # cannot be beaten
+        
+        if best is None:
+            return None
+        ratio, i, names, key_ids = best
+        
+        mask = key_ids >= 0
+        # Every column of the matching rows becomes metadata
+        columns = {str(col): df.iloc[:, j].to_numpy(dtype=object)[mask]
+                   for j, col in enumerate(df.columns)}
+        locations = LocationData(names[mask], self._key_geometry[key_ids[mask]], columns)
+        locations.source = {'strategy': 'column', 'field': str(df.columns[i]), 'match_ratio': ratio}
+        return locations
+    
+    def _walk_locations(self, data: Any) -> Optional[LocationData]:
+        """
+        Find locations anywhere in a nested result (dicts of lists of dicts,
+        tuples of DataFrames, ...) within the node and depth budgets. Loose
+        names and record fields are matched against the index in one lookup.
+        """
+        walker = _StructureWalker()
+        walker.walk(data)
+        
+        # One group of candidate names per list / key set / field / record key
+        groups = [(path, kind, values, extra) for path, kind, values, extra in walker.names]
+        for path, records in walker.records:
+            records = [item if isinstance(item, dict) else {} for item in records]
+            for key, names, items in self._record_fields(records):
+                groups.append((path, 'records', names, (records, key, items)))
+        groups = [group for group in groups if len(group[2])]
+        
+        matches = []
+        if groups:
+            names = np.concatenate([group[2] for group in groups])
+            key_ids = self._match_keys(names)
+            starts = np.cumsum([0] + [len(group[2]) for group in groups[:-1]])
+            hits = np.add.reduceat((key_ids >= 0).astype(np.int64), starts)
+            present = np.add.reduceat(pd.notna(names).astype(np.int64), starts)
+            for group, start, matched, total in zip(groups, starts, hits, present):
+                ids = key_ids[start:start + len(group[2])]
+                ratio = float(matched / total) if total else 0.0
+                named = group[1] != 'records' or str(group[3][1]).lower() in LOCATION_FIELDS
+                if self._is_match(ids, ratio, named):
+                    matches.append((group, ids, ratio, named))
+        
+        parts = []
+        ratios = {}
+        
+        # Record lists first: best key per list, as in _from_list_of_dicts
+        best_records = {}
+        for group, ids, ratio, named in matches:
+            path = group[0]
+            if group[1] == 'records' and (path not in best_records or (ratio, named) > best_records[path][0]):
+                best_records[path] = ((ratio, named), group, ids)
+        for path, ((ratio, _), (_, _, names, (records, key, items)), ids) in best_records.items():
+            part = self._records_to_locations(records, key, names, items, ids, ratio)
+            part.shared['category'] = path
+            parts.append(part)
+            ratios[path] = ratio
+        # Items of matched record lists are already covered
+        covered = tuple(f"{path}[" for path in best_records)
+        
+        for (path, kind, values, extra), ids, ratio, _ in matches:
+            if kind == 'records' or (covered and path.startswith(covered)):
+                continue
+            if kind == 'list':
+                part = self._gather(values, extra={'category': path}, key_ids=ids)
+            else:
+                mask = ids >= 0
+                if kind == 'keys':
+                    extra_values = extra.values() if isinstance(extra, dict) else extra
+                    columns = {'value': _object_values(list(extra_values))[mask]}
+                else:
+                    columns = metadata_columns([extra])
+                part = LocationData(values[mask], self._key_geometry[ids[mask]], columns,
+                                    shared={'category': path})
+            parts.append(part)
+            ratios[path] = max(ratio, ratios.get(path, 0.0))
+        
+        for path, frame in walker.frames:
+            if covered and path.startswith(covered):
+                continue
+            part = (self._from_geodataframe(frame) if isinstance(frame, gpd.GeoDataFrame)
+                    else self._from_dataframe(frame))
+            if part:
+                ratios[path] = part.source['match_ratio']
+                part.shared['category'] = path
+                parts.append(part)
+        
+        locations = LocationData.concat(parts)
+        if not locations:
+            return None
+        best = max(ratios, key=ratios.get)
+        locations.source = {'strategy': 'walk', 'field': best, 'match_ratio': ratios[best],
+                            'fields': ratios, 'nodes': walker.nodes, 'truncated': walker.truncated}
+        return locations
+
+_analyzer_cache: Dict[str, MapDataAnalyzer] = {}
+_analyzer_lock = threading.Lock()
+
+
+def get_map_analyzer(gdf: gpd.GeoDataFrame, version: str) -> MapDataAnalyzer:
+    """
+    Get the analyzer for a dataset version, building its lookup on first use.
+    Shared by all queries and sessions (analyze() only reads the lookup).
+
+    Args:
+        gdf: The GeoPandas dataframe for that version
+        version: Dataset version identifier used as the cache key
+
+    Returns:
+        Shared MapDataAnalyzer instance for the version
+    """
+    with _analyzer_lock:
+        analyzer = _analyzer_cache.get(version)
+        if analyzer is None:
+            analyzer = MapDataAnalyzer(gdf)
+            _analyzer_cache[version] = analyzer
+        return analyzer
+
+
+def invalidate_map_analyzer(version: str) -> None:
+    """
+    Drop the analyzer of a dataset version that is no longer active.
+
+    Args:
+        version: Dataset version identifier
+    """
+    with _analyzer_lock:
+        _analyzer_cache.pop(version, None)
+
+
+# Build the lookup for a hot-reloaded version before it goes live, drop the old one after
+data_loader.store.register_cache(
+    prepare=lambda dataset: get_map_analyzer(dataset.gdf, dataset.version),
+    invalidate=invalidate_map_analyzer
+)
+
+
+def _legacy_location_lookup(gdf: gpd.GeoDataFrame) -> Dict[str, Dict[str, Any]]:
+    """The former per-row iterrows build, kept for the benchmark below"""
+    location_map = {}
+    for _, row in gdf.iterrows():
+        if pd.notna(row['Locations']) and pd.notna(row.geometry):
+            location_map[row['Locations']] = {
+                'geometry': row.geometry,
+                'title': row.get('Title'),
+                'year': row.get('Year')
+            }
+    return location_map
+
+
+if __name__ == "__main__":
+    # Benchmark: lookup build time and per-query cost, old vs new
+    dataset = data_loader.store.current()
+    gdf = dataset.gdf
+
+    start = time.perf_counter()
+    legacy = _legacy_location_lookup(gdf)
+    legacy_build = time.perf_counter() - start
+
+    start = time.perf_counter()
+    analyzer = MapDataAnalyzer(gdf)
+    build = time.perf_counter() - start
+
+    # Every film the old dict kept must be among the rows the index returns
+    for name, entry in legacy.items():
+        titles = set(analyzer._titles[analyzer.location_rows(name)])
+        assert entry['title'] in titles, f"index misses {entry['title']!r} at {name!r}"
+    rows_indexed = len(analyzer._row_ids)
+    multi = int((np.diff(analyzer._offsets) > 1).sum())
+
+    # The first call builds the shared index; time it apart from the lookups
+    start = time.perf_counter()
+    get_map_analyzer(gdf, dataset.version)
+    shared_build = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(100):
+        get_map_analyzer(gdf, dataset.version)
+    shared = (time.perf_counter() - start) / 100
+
+    names = gdf['Locations'].dropna().unique().tolist()
+    start = time.perf_counter()
+    result = analyzer.analyze({'data': names}, "where were these filmed")
+    lookup = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for name in names[:1000]:
+        analyzer.location_rows(name)
+    single = (time.perf_counter() - start) / 1000
+
+    # GeoDataFrame results: per-row dicts (old) vs columnar LocationData
+    start = time.perf_counter()
+    legacy_rows = [
+        {'location_name': row.get('Locations', 'Unknown'), 'geometry': row.geometry,
+         'metadata': {'title': row.get('Title'), 'year': row.get('Year')}}
+        for _, row in gdf.iterrows() if row.geometry is not None
+    ]
+    legacy_gdf = time.perf_counter() - start
+    start = time.perf_counter()
+    columnar = analyzer._from_geodataframe(gdf)
+    columnar_gdf = time.perf_counter() - start
+    assert len(columnar) == len(legacy_rows)
+
+    print(f"📊 Rows: {len(gdf)}, indexed rows: {rows_indexed}, location keys: {len(analyzer._key_index)}")
+    print(f"   locations with several films: {multi} (old dict kept one film each: {len(legacy)} entries)")
+    print(f"   iterrows dict build:  {legacy_build * 1000:8.2f} ms")
+    print(f"   index build:          {build * 1000:8.2f} ms ({legacy_build / build:.1f}x faster)")
+    print(f"   shared first get:     {shared_build * 1000:8.2f} ms (builds the index)")
+    print(f"   shared per-query get: {shared * 1e6:8.2f} µs (warm)")
+    print(f"   location_rows():      {single * 1e6:8.2f} µs per name")
+    print(f"   GeoDataFrame rows:    {legacy_gdf * 1000:8.2f} ms iterrows, {columnar_gdf * 1000:.2f} ms columnar")
+    print(f"   analyze {len(names)} names:  {lookup * 1000:8.2f} ms ({result['reason']})")
@@ -0,0 +1,223 @@
+"""
+Map Cache Module
+Caches rendered map documents so repeated map queries skip folium object
+construction and HTML templating. Keys are a stable hash of what the map shows
+(location names, positions, metadata) and how it is drawn (title, mode, render
+options), so they stay valid across processes and restarts.
+
+Entries live in a byte-budgeted in-memory LRU (SF_FILM_MAP_CACHE_MB, 0
+disables) with an optional on-disk tier (SF_FILM_MAP_CACHE_DIR, bounded by
+SF_FILM_MAP_CACHE_DISK_MB) shared by all server processes.
+"""
+
+import os
+import json
+import hashlib
+import threading
+from pathlib import Path
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+from src.location_data import LocationData
+
+
+MAP_CACHE_MB = int(os.getenv('SF_FILM_MAP_CACHE_MB', '64'))
+MAP_CACHE_DIR = os.getenv('SF_FILM_MAP_CACHE_DIR', '')
+MAP_CACHE_DISK_MB = int(os.getenv('SF_FILM_MAP_CACHE_DISK_MB', '512'))
+
+
+def map_cache_key(location_data: LocationData, **options: Any) -> str:
+    """
+    Hash a map's content and rendering options.
+
+    Args:
+        location_data: Entries drawn on the map
+        **options: Everything else that changes the output (title, mode, ...)
+
+    Returns:
+        Hex digest
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps(options, sort_keys=True, default=str).encode('utf-8'))
+    digest.update(location_data.coordinates().tobytes())
+    digest.update(_values_bytes(location_data.names))
+    for key in sorted(location_data.columns, key=str):
+        digest.update(b'\x1e' + str(key).encode('utf-8') + b'\x1e')
+        digest.update(_values_bytes(location_data.get_column(key)))
+    digest.update(repr(sorted(location_data.shared.items(), key=lambda item: str(item[0]))).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _values_bytes(values) -> bytes:
+    # repr keeps types apart (1 vs '1') and works for lists and dicts
+    return '\x1f'.join(map(repr, values)).encode('utf-8', 'surrogatepass')
+
+
+class MapCache:
+    """
+    Byte-budgeted LRU of rendered map HTML with an optional disk tier.
+    """
+
+    def __init__(self, max_bytes: int = MAP_CACHE_MB * 1024 * 1024,
+                 disk_dir: Optional[str] = MAP_CACHE_DIR or None,
+                 max_disk_bytes: int = MAP_CACHE_DISK_MB * 1024 * 1024):
+        """
+        Initialize the cache.
+
+        Args:
+            max_bytes: Memory budget before LRU eviction
+            disk_dir: Directory for the disk tier (None disables it)
+            max_disk_bytes: Disk budget; oldest files are removed beyond it
+        """
+        self.max_bytes = max_bytes
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.max_disk_bytes = max_disk_bytes
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._stats = {"hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+        if self.disk_dir is not None:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+            self._disk_bytes = sum(f.stat().st_size for f in self.disk_dir.glob('*.html'))
+
+    def _path(self, key: str) -> Path:
+        return self.disk_dir / f"{key}.html"
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Look up a rendered map.
+
+        Args:
+            key: Key from map_cache_key()
+
+        Returns:
+            HTML document, or None on a miss
+        """
+        with self._lock:
+            html = self._entries.get(key)
+            if html is not None:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return html
+
+        if self.disk_dir is not None:
+            path = self._path(key)
+            try:
+                html = path.read_text(encoding='utf-8')
+                os.utime(path)  # keep recently used files out of pruning
+            except OSError:
+                html = None
+            if html is not None:
+                with self._lock:
+                    self._stats["disk_hits"] += 1
+                self._remember(key, html)
+                return html
+
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+
+    def put(self, key: str, html: str) -> None:
+        """
+        Store a rendered map in memory and, if enabled, on disk.
+
+        Args:
+            key: Key from map_cache_key()
+            html: HTML document
+        """
+        self._remember(key, html)
+        with self._lock:
+            self._stats["stores"] += 1
+        if self.disk_dir is not None:
+            self._write_disk(key, html)
+
+    def _remember(self, key: str, html: str) -> None:
+        size = len(html)
+        with self._lock:
+            if size > self.max_bytes:
+                return
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._entries[key] = html
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self._stats["evictions"] += 1
+
+    def _write_disk(self, key: str, html: str) -> None:
+        path = self._path(key)
+        tmp = path.with_suffix(f'.{os.getpid()}.{threading.get_ident()}.tmp')
+        try:
+            data = html.encode('utf-8')
+            tmp.write_bytes(data)
+            os.replace(tmp, path)  # readers never see a partial file
+        except OSError as e:
+            print(f"⚠️ Map cache write failed: {e}")
+            tmp.unlink(missing_ok=True)
+            return
+        with self._lock:
+            self._disk_bytes += len(data)
+            over = self._disk_bytes > self.max_disk_bytes
+        if over:
+            self._prune_disk()
+
+    def _prune_disk(self) -> None:
+        """Delete least recently used files until the disk tier is at 90% of its budget"""
+        files = []
+        for f in self.disk_dir.glob('*.html'):
+            try:
+                stat = f.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, f))
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        for _, size, f in files:
+            if total <= self.max_disk_bytes * 0.9:
+                break
+            f.unlink(missing_ok=True)
+            total -= size
+        with self._lock:
+            self._disk_bytes = total
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get cache counters.
+
+        Returns:
+            Dictionary of hits, disk hits, misses, stores, evictions and bytes used
+        """
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["disk_hits"] + self._stats["misses"]
+            hits = self._stats["hits"] + self._stats["disk_hits"]
+            return {
+                **self._stats,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "disk_bytes": self._disk_bytes if self.disk_dir is not None else 0,
+                "hit_rate": hits / lookups if lookups else 0.0
+            }
+
+
+_shared_cache: Optional[MapCache] = None
+_shared_lock = threading.Lock()
+
+
+def get_map_cache() -> Optional[MapCache]:
+    """
+    Get the process-wide map cache shared by all sessions.
+
+    Returns:
+        Shared MapCache, or None if disabled (SF_FILM_MAP_CACHE_MB=0)
+    """
+    global _shared_cache
+    if MAP_CACHE_MB <= 0:
+        return None
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = MapCache()
+        return _shared_cache
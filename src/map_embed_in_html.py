@@ -10,7 +10,7 @@ a single HTML file that can be opened in any web browser.
 Key Features:
 - Embeds Folium map HTML representations into custom-styled pages
 - Includes query metadata and detailed results in formatted JSON
-- Automatically generates timestamped HTML files
+- Stores reports by content hash, gzip-compressed (see src/report_store.py)
 - Handles file creation with proper error handling
 
 Example:
@@ -20,19 +20,19 @@ Example:
     ...     'summary': 'Found 25 film locations',
     ...     'data': {'locations': [...]}
     ... }
-    >>> map_html = folium_map._repr_html_()
+    >>> map_html = embed_html(MapGenerator().render_map(location_data))
     >>> embed_in_custom_html(user_query, execution_result, map_html)
-    # Creates 'maps/results_with_map_1700000000.html'
+    # Creates 'maps/report_<content hash>.html.gz'
 
 Note:
     Requires the 'maps' directory to be writable. The function will create the
     directory if it doesn't exist.
 """
 
+import html
 import json
 from pathlib import Path
-import time
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Tuple
 from src.logger import convert_shapely_to_serializable
 
 
@@ -88,57 +88,42 @@ style_string = """
     """
 
 
-def embed_in_custom_html(user_query: str, execution_result: Dict[str, Any], map_html: str) -> None:
+def serialize_report_data(execution_result: Dict[str, Any]) -> Tuple[Any, str]:
     """
-    Embed query results and Folium map into a custom HTML document.
-    
-    Creates a self-contained HTML file that displays:
-    - The original user query
-    - A summary of the execution results  
-    - An interactive Folium map visualization
-    - Detailed results in formatted JSON
+    Serialize the parts of a result the report shows.
     
     Args:
-        user_query (str): The original search query from the user
-        execution_result (Dict[str, Any]): Dictionary containing query results with 
-            expected keys:
-            - 'summary': Brief description of results (optional)
-            - 'data': Detailed results data for JSON display (optional)
-        map_html (str): HTML string representation of a Folium map object,
-            typically generated using map_obj._repr_html_()
+        execution_result (Dict[str, Any]): Query results ('summary' and 'data' are shown)
     
     Returns:
-        None: The function saves an HTML file to disk but returns nothing
+        Tuple[Any, str]: Summary and the JSON text of 'data'
+    """
+    summary = convert_shapely_to_serializable(execution_result.get('summary'))
+    data = convert_shapely_to_serializable(execution_result.get('data'))
+    # default=str keeps one odd value (timestamp, decimal) from losing the whole report
+    return summary, json.dumps(data, indent=2, default=str)
+
+
+def build_report_html(user_query: str, summary: Any, map_html: str, data_json: str,
+                      data_note: Optional[str] = None) -> str:
+    """
+    Build the report document (query, summary, map and detailed results).
     
-    Side Effects:
-        - Creates a timestamped HTML file in the 'maps/' directory
-        - Creates the 'maps/' directory if it doesn't exist
-        - Prints error messages to stdout if file operations fail
+    The map is embedded as already rendered, never re-rendered here.
     
-    Raises:
-        OSError: If the file cannot be written due to filesystem issues
-        Exception: For any other unexpected errors during file operations
+    Args:
+        user_query (str): The original search query from the user
+        summary (Any): Result summary
+        map_html (str): Embeddable map HTML (embed_html() of the rendered map)
+        data_json (str): Detailed results as JSON text (possibly a preview)
+        data_note (Optional[str]): Shown above the results (e.g. where the
+            full data is when data_json is truncated)
     
-    Example:
-        >>> result = {
-        ...     'summary': 'Found 15 locations',
-        ...     'data': {'locations': [{'name': 'Golden Gate Bridge', ...}]}
-        ... }
-        >>> embed_in_custom_html(
-        ...     "movie filming locations",
-        ...     result,
-        ...     map._repr_html_()
-        ... )
+    Returns:
+        str: Complete HTML document
     """
-
-    # Use your existing converter to handle both Shapely objects AND DataFrames
-    
-    # Convert any non-serializable objects in execution_result
-    serializable_result = convert_shapely_to_serializable(execution_result)
-
-
-
-    full_html = f"""
+    note = f"<p><em>{html.escape(data_note)}</em></p>" if data_note else ""
+    return f"""
     <!DOCTYPE html>
     <html>
     <head>
@@ -151,8 +136,8 @@ def embed_in_custom_html(user_query: str, execution_result: Dict[str, Any], map_
     <body>
         <h1>Query Results</h1>
         <div id="query-info">
-            <p><strong>Query:</strong> {user_query}</p>
-            <p><strong>Summary:</strong> {serializable_result.get('summary')}</p>
+            <p><strong>Query:</strong> {html.escape(str(user_query))}</p>
+            <p><strong>Summary:</strong> {html.escape(str(summary))}</p>
         </div>
         
         <div id="map-container">
@@ -161,26 +146,66 @@ def embed_in_custom_html(user_query: str, execution_result: Dict[str, Any], map_
         
         <div id="results">
             <h2>Detailed Results</h2>
-            <pre>{json.dumps(serializable_result.get('data'), indent=2)}</pre>
+            {note}
+            <pre>{html.escape(data_json, quote=False)}</pre>
         </div>
     </body>
     </html>
     """
 
-    # Save it
+
+def embed_in_custom_html(user_query: str, execution_result: Dict[str, Any], map_html: str,
+                         output_dir: str = 'maps') -> Optional[Path]:
+    """
+    Embed query results and Folium map into a custom HTML document.
+    
+    Creates a self-contained HTML file that displays:
+    - The original user query
+    - A summary of the execution results  
+    - An interactive Folium map visualization
+    - Detailed results in formatted JSON
+    
+    The file is stored by the report store of output_dir: named by content
+    hash (repeats are written once), gzip-compressed unless
+    SF_FILM_REPORT_GZIP=0, with large data moved to a separate file.
+    
+    Args:
+        user_query (str): The original search query from the user
+        execution_result (Dict[str, Any]): Dictionary containing query results with 
+            expected keys:
+            - 'summary': Brief description of results (optional)
+            - 'data': Detailed results data for JSON display (optional)
+        map_html (str): Embeddable HTML of the already rendered map, typically
+            embed_html(MapGenerator().render_map(...)) - the same string the
+            chat UI shows
+        output_dir (str): Directory the report is written to
+    
+    Returns:
+        Optional[Path]: Path of the saved report, or None if writing failed
+    
+    Side Effects:
+        - Creates a content-addressed report file in output_dir
+        - Creates output_dir if it doesn't exist
+        - Prints error messages to stdout if file operations fail
+    
+    Example:
+        >>> result = {
+        ...     'summary': 'Found 15 locations',
+        ...     'data': {'locations': [{'name': 'Golden Gate Bridge', ...}]}
+        ... }
+        >>> embed_in_custom_html(
+        ...     "movie filming locations",
+        ...     result,
+        ...     embed_html(map_document)
+        ... )
+    """
+    # Imported here: the store builds its documents with this module
+    from src.report_store import get_report_store
+
     try:
-        # Create directory and file path
-        maps_dir = Path('maps')
-        maps_dir.mkdir(exist_ok=True)  # Create directory if it doesn't exist
-        
-        map_filename = f'results_with_map{int(time.time())}.html'
-        map_file_path = maps_dir / map_filename  # Full path to the HTML file
-        
-        with open(map_file_path, 'w', encoding='utf-8') as f:
-            f.write(full_html)
-        
+        map_file_path = get_report_store(output_dir).save_report(user_query, execution_result, map_html)
         print(f"✓ Map saved to: {map_file_path}")
+        return map_file_path
     except Exception as e:
         print(f'Error in map_embed_in_html module: {e}')
-
-    return None
\ No newline at end of file
+        return None
@@ -1,8 +1,317 @@
 # src/map_generator.py
+import os
+import html
+import time
+import functools
 import folium
+from folium.plugins import FastMarkerCluster
+import branca.colormap
+import numpy as np
 import pandas as pd
-from typing import List, Dict, Any
-from collections import defaultdict
+from pyproj import Transformer
+from typing import List, Dict, Any, Union, Tuple, Optional
+from src.location_data import LocationData
+from src.map_cache import get_map_cache, map_cache_key
+
+
+# Above this many unique locations, 'auto' mode renders one clustered layer
+# instead of a server-built marker + popup per location
+MARKER_LIMIT = int(os.getenv('SF_FILM_MAP_MARKER_LIMIT', '100'))
+RENDER_MODES = ('auto', 'markers', 'cluster', 'grid')
+
+# Aggregated ('grid') mode: points are binned in a metric CRS (UTM 10N covers SF)
+GRID_CRS = 'EPSG:26910'
+GRID_CELL_METERS = float(os.getenv('SF_FILM_MAP_GRID_METERS', '500'))
+GRID_SHAPES = ('hex', 'square')
+GRID_TOP_TITLES = 3
+
+# Bump when the map markup changes, so disk-cached renders are not reused
+RENDER_VERSION = 4
+
+# Popup fields: tried in order, as-is then case-insensitively
+TITLE_KEYS = ('Title', 'title', 'Film', 'film')
+YEAR_KEYS = ('Year', 'year')
+# Metadata not repeated as popup details (case-insensitive)
+POPUP_EXCLUDED_KEYS = {'title', 'film', 'year', 'locations'}
+
+# Builds each clustered marker in the browser from its data row
+# [lat, lon, name, appearances, films] (see PopupTemplate.films); popups are
+# created on first open
+CLUSTER_CALLBACK = """function (row) {
+    var name = row[2], count = row[3], films = row[4];
+    var marker = L.marker(new L.LatLng(row[0], row[1]));
+    marker.setIcon(L.AwesomeMarkers.icon(
+        {icon: 'film', prefix: 'fa', markerColor: count > 1 ? 'blue' : 'red'}));
+    marker.bindTooltip(name + ' (' + count + ' film' + (count > 1 ? 's' : '') + ')');
+    marker.bindPopup(function () {
+        var html = '<b>' + name + '</b><br><br>';
+        if (count > 1) {
+            html += '<b>🎬 Featured in ' + count + ' films:</b><br><br>';
+        }
+        for (var j = 0; j < films.length; j++) {
+            var film = films[j];
+            html += '<b>' + (count > 1 ? 'Film ' + film[0] : 'Film') + ':</b> ' + film[1];
+            html += (film[2] ? ' (' + film[2] + ')' : '') + '<br>' + film[3];
+            if (film[0] < count) {
+                html += '<br>';
+            }
+        }
+        return html;
+    }, {maxWidth: 350});
+    return marker;
+}"""
+
+
+@functools.lru_cache(maxsize=1)
+def _grid_transformers() -> Tuple[Transformer, Transformer]:
+    """(WGS84 -> GRID_CRS, GRID_CRS -> WGS84), built once"""
+    return (Transformer.from_crs('EPSG:4326', GRID_CRS, always_xy=True),
+            Transformer.from_crs(GRID_CRS, 'EPSG:4326', always_xy=True))
+
+
+def aggregate_grid(lat: np.ndarray, lon: np.ndarray, cell_size: float = GRID_CELL_METERS,
+                   shape: str = 'hex') -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Bin points into a hexagonal or square grid in GRID_CRS.
+    
+    Args:
+        lat: Point latitudes
+        lon: Point longitudes
+        cell_size: Cell width in meters (flat-to-flat for hexagons)
+        shape: 'hex' or 'square'
+        
+    Returns:
+        (cell index per point, cell outlines as an (n_cells, corners, 2) array
+        of [lon, lat])
+    """
+    if shape not in GRID_SHAPES:
+        raise ValueError(f"Unknown grid shape '{shape}' (expected one of {GRID_SHAPES})")
+    to_grid, from_grid = _grid_transformers()
+    x, y = to_grid.transform(np.asarray(lon, dtype=float), np.asarray(lat, dtype=float))
+    
+    if shape == 'square':
+        cells = np.column_stack([np.floor(x / cell_size), np.floor(y / cell_size)]).astype(np.int64)
+        unique, inverse = np.unique(cells, axis=0, return_inverse=True)
+        corners = np.array([[0, 0], [1, 0], [1, 1], [0, 1]], dtype=float)
+        outlines = (unique[:, None, :] + corners[None, :, :]) * cell_size
+    else:
+        # Pointy-top hexagons in axial coordinates, cube-rounded to the nearest cell
+        radius = cell_size / np.sqrt(3)
+        q = (np.sqrt(3) / 3 * x - y / 3) / radius
+        r = (2 / 3 * y) / radius
+        s = -q - r
+        rq, rr, rs = np.round(q), np.round(r), np.round(s)
+        dq, dr, ds = np.abs(rq - q), np.abs(rr - r), np.abs(rs - s)
+        fix_q = (dq > dr) & (dq > ds)
+        fix_r = ~fix_q & (dr > ds)
+        rq = np.where(fix_q, -rr - rs, rq)
+        rr = np.where(fix_r, -rq - rs, rr)
+        cells = np.column_stack([rq, rr]).astype(np.int64)
+        unique, inverse = np.unique(cells, axis=0, return_inverse=True)
+        centers = np.column_stack([
+            radius * np.sqrt(3) * (unique[:, 0] + unique[:, 1] / 2),
+            radius * 1.5 * unique[:, 1]
+        ])
+        angles = np.radians(60 * np.arange(6) - 30)
+        corners = radius * np.column_stack([np.cos(angles), np.sin(angles)])
+        outlines = centers[:, None, :] + corners[None, :, :]
+    
+    lon_out, lat_out = from_grid.transform(outlines[..., 0].ravel(), outlines[..., 1].ravel())
+    outlines = np.stack([lon_out, lat_out], axis=-1).reshape(outlines.shape)
+    return inverse.ravel(), outlines
+
+
+def embed_html(document: str) -> str:
+    """
+    Wrap a rendered map document in a responsive iframe, like folium's
+    _repr_html_ (what the chat UI and reports embed).
+
+    Args:
+        document: Standalone HTML from MapGenerator.render_map()
+
+    Returns:
+        HTML snippet
+    """
+    return (
+        '<div style="width:100%;">'
+        '<div style="position:relative;width:100%;height:0;padding-bottom:60%;">'
+        '<span style="color:#565656">Make this Notebook Trusted to load map: File -> Trust Notebook</span>'
+        '<iframe srcdoc="{html}" style="position:absolute;width:100%;height:100%;left:0;top:0;'
+        'border:none !important;" '
+        "allowfullscreen webkitallowfullscreen mozallowfullscreen>"
+        "</iframe>"
+        "</div></div>"
+    ).format(html=html.escape(document))
+
+
+def _resolve_field(fields: List[Tuple[Any, np.ndarray, np.ndarray]], length: int,
+                   *keys: str) -> np.ndarray:
+    """
+    Per-entry value of the first matching key: each key is tried as-is, then
+    case-insensitively in metadata order (None where nothing matches).
+    """
+    lowered = [str(key).lower() for key, _, _ in fields]
+    result = np.empty(length, dtype=object)  # None-filled
+    filled = np.zeros(length, dtype=bool)
+    for wanted in keys:
+        candidates = ([j for j, (key, _, _) in enumerate(fields) if key == wanted]
+                      + [j for j, key in enumerate(lowered) if key == wanted.lower()])
+        for j in candidates:
+            _, values, present = fields[j]
+            take = present & ~filled
+            result[take] = values[take]
+            filled |= take
+    return result
+
+
+def _escape_batch(strings: List[str]) -> List[str]:
+    """HTML-escape many strings with one escape call"""
+    if not strings:
+        return []
+    escaped = html.escape('\x00'.join(strings), quote=False).split('\x00')
+    if len(escaped) != len(strings):  # a value contained the separator
+        escaped = [html.escape(text, quote=False) for text in strings]
+    return escaped
+
+
+class PopupTemplate:
+    """
+    Popup content for every entry of a result, prepared once per result:
+    title/year keys are resolved and the detail lines of all entries are
+    formatted and escaped column by column, so building a popup is only
+    lookups and one join.
+    """
+    
+    def __init__(self, location_data: LocationData):
+        """
+        Prepare popup fields.
+        
+        Args:
+            location_data: All entries of the map
+        """
+        length = len(location_data)
+        fields = location_data.metadata_fields()
+        
+        titles = _resolve_field(fields, length, *TITLE_KEYS)
+        years = _resolve_field(fields, length, *YEAR_KEYS)
+        # Entries without a title are left out of the popup
+        self.has_title = np.fromiter((bool(t) for t in titles), dtype=bool, count=length)
+        self.titles = self._escape_column([str(t) if ok else None for t, ok in zip(titles, self.has_title)])
+        self.years = self._escape_column([str(y) if y else None for y in years])
+        
+        # "<b>Label:</b> value<br>" for every shown field, concatenated per entry
+        self.details = np.full(length, '', dtype=object)
+        for key, values, present in fields:
+            if str(key).lower() in POPUP_EXCLUDED_KEYS:
+                continue
+            label = _escape_batch([str(key).replace('_', ' ').title()])[0]
+            self.details += self._detail_lines(label, values, present)
+    
+    @staticmethod
+    def _detail_lines(label: str, values: np.ndarray, present: np.ndarray) -> np.ndarray:
+        """
+        Format one field as "<b>Label:</b> value<br>" for every entry.
+        
+        Args:
+            label: Escaped field label
+            values: Field value per entry
+            present: False for entries that lack the field
+            
+        Returns:
+            Object array of lines ('' for missing, null or empty values)
+        """
+        lines = np.full(len(values), '', dtype=object)
+        shown = present & ~pd.isna(values)
+        # Type per entry: lists are joined, everything else goes through str()
+        types = np.fromiter(map(type, values), dtype=object, count=len(values))
+        value_types = set(types[shown].tolist())
+        is_list = np.zeros(len(values), dtype=bool)
+        for value_type in value_types:
+            if issubclass(value_type, list):
+                is_list |= types == value_type
+        
+        scalars = shown & ~is_list
+        scalar_values = values[scalars]
+        if len(value_types) == 1 and not is_list.any():
+            # One type (the usual column): format each distinct value once
+            codes, scalar_values = pd.factorize(scalar_values)
+        else:
+            codes = np.arange(len(scalar_values))
+        texts = np.fromiter(map(str, scalar_values), dtype=object, count=len(scalar_values))
+        formatted = np.array([f"<b>{label}:</b> {text}<br>" for text in _escape_batch(texts.tolist())],
+                             dtype=object)
+        # '' and 'None' count as empty
+        formatted[(texts == '') | (texts == 'None')] = ''
+        lines[scalars] = formatted[codes]
+        
+        for i in np.flatnonzero(shown & is_list):
+            # Convert list to comma-separated string for display
+            if values[i]:
+                text = _escape_batch([', '.join(str(v) for v in values[i])])[0]
+                lines[i] = f"<b>{label}:</b> {text}<br>"
+        return lines
+    
+    @staticmethod
+    def _escape_column(texts: List[Optional[str]]) -> List[Optional[str]]:
+        positions = [i for i, text in enumerate(texts) if text is not None]
+        escaped = _escape_batch([texts[i] for i in positions])
+        texts = list(texts)
+        for i, text in zip(positions, escaped):
+            texts[i] = text
+        return texts
+    
+    def films(self, positions: List[int]) -> List[list]:
+        """
+        Popup content of one location as plain (escaped) values, shared by the
+        server-side (markers) and browser-side (cluster) popups.
+        
+        Args:
+            positions: Entries at this location
+            
+        Returns:
+            [[film number, title, year or None, details HTML], ...]
+            (entries without a title are skipped but keep their number)
+        """
+        return [[i, self.titles[p], self.years[p], self.details[p]]
+                for i, p in enumerate(positions, 1) if self.has_title[p]]
+    
+    @staticmethod
+    def html(name: str, count: int, films: List[list]) -> str:
+        """Build the popup of one location (CLUSTER_CALLBACK mirrors this in JS)"""
+        parts = [f"<b>{name}</b><br><br>"]
+        if count > 1:
+            parts.append(f"<b>🎬 Featured in {count} films:</b><br><br>")
+        
+        for i, title_text, year, details in films:
+            # Format as "Film #: Title (Year)" or just "Title (Year)" for single film
+            label = f"Film {i}" if count > 1 else "Film"
+            parts.append(f"<b>{label}:</b> {title_text} ({year})<br>" if year
+                         else f"<b>{label}:</b> {title_text}<br>")
+            parts.append(details)
+            # Add spacing between films (but not after the last one)
+            if i < count:
+                parts.append("<br>")
+        
+        return ''.join(parts)
+
+
+def _top_per_group(groups: np.ndarray, labels: np.ndarray, n_groups: int,
+                   top: int) -> List[List[Tuple[Any, int]]]:
+    """Most frequent labels per group: [[(label, count), ...], ...]"""
+    codes, uniques = pd.factorize(pd.Series(labels, dtype=object))
+    valid = codes >= 0
+    if not valid.any():
+        return [[] for _ in range(n_groups)]
+    keys, counts = np.unique(groups[valid] * len(uniques) + codes[valid], return_counts=True)
+    key_groups, key_labels = keys // len(uniques), keys % len(uniques)
+    order = np.lexsort((key_labels, -counts, key_groups))
+    key_groups, key_labels, counts = key_groups[order], key_labels[order], counts[order]
+    starts = np.searchsorted(key_groups, np.arange(n_groups))
+    rank = np.arange(len(key_groups)) - starts[key_groups]
+    result = [[] for _ in range(n_groups)]
+    for group, label, count in zip(key_groups[rank < top], key_labels[rank < top], counts[rank < top]):
+        result[group].append((uniques[label], int(count)))
+    return result
 
 
 class MapGenerator:
@@ -14,133 +323,108 @@ class MapGenerator:
     def __init__(self):
         self.default_center = [37.7749, -122.4194]  # SF coordinates
     
-    def _get_case_insensitive(self, metadata: dict, *keys) -> Any:
+    def render_map(self, location_data: Union[LocationData, List[Dict]],
+                   title: str = "SF Film Locations", mode: str = 'auto',
+                   use_cache: bool = True) -> str:
         """
-        Get value from metadata dict with case-insensitive key matching.
-        Tries each provided key in order, checking both as-is and lowercase.
+        Render a map to a standalone HTML document. Identical maps (same
+        entries, title and options) come from the map cache without building
+        any folium objects.
         
         Args:
-            metadata: Dictionary to search
-            *keys: Key names to try (in order of preference)
+            location_data: LocationData, or list of dicts with 'location_name',
+                'geometry', 'metadata'
+            title: Map title
+            mode: See create_point_map()
+            use_cache: Look up / store the render in the shared map cache
             
         Returns:
-            First matching value found, or None
+            HTML document (wrap with embed_html() for inline display)
         """
-        for key in keys:
-            # Try exact match first
-            if key in metadata:
-                return metadata[key]
-            # Try lowercase match
-            for meta_key, meta_val in metadata.items():
-                if meta_key.lower() == key.lower():
-                    return meta_val
-        return None
+        if location_data and not isinstance(location_data, LocationData):
+            location_data = LocationData.from_records(location_data)
+        
+        cache = get_map_cache() if use_cache and location_data else None
+        key = None
+        if cache is not None:
+            key = map_cache_key(
+                location_data, title=title, mode=mode, marker_limit=MARKER_LIMIT,
+                grid_cell_meters=GRID_CELL_METERS, render_version=RENDER_VERSION,
+                folium_version=folium.__version__
+            )
+            document = cache.get(key)
+            if document is not None:
+                return document
+        
+        document = self.create_point_map(location_data, title=title, mode=mode).get_root().render()
+        if cache is not None:
+            cache.put(key, document)
+        return document
     
-    def create_point_map(self, location_data: List[Dict], 
-                         title: str = "SF Film Locations") -> folium.Map:
+    def create_point_map(self, location_data: Union[LocationData, List[Dict]], 
+                         title: str = "SF Film Locations",
+                         mode: str = 'auto') -> folium.Map:
         """
         Create a point map from standardized location data.
         Automatically groups duplicate locations and shows all films.
         
         Args:
-            location_data: List of dicts with 'location_name', 'geometry', 'metadata'
+            location_data: LocationData, or list of dicts with 'location_name',
+                'geometry', 'metadata'
             title: Map title
+            mode: 'markers' (one server-rendered marker per location),
+                'cluster' (one clustered layer, popups built in the browser),
+                'grid' (hexagon counts, see create_grid_map) or 'auto'
+                (cluster above MARKER_LIMIT locations)
             
         Returns:
             folium.Map object
         """
+        if mode not in RENDER_MODES:
+            raise ValueError(f"Unknown map mode '{mode}' (expected one of {RENDER_MODES})")
         if not location_data:
             return self._create_empty_map(title)
+        if not isinstance(location_data, LocationData):
+            location_data = LocationData.from_records(location_data)
+        if mode == 'grid':
+            return self.create_grid_map(location_data, title)
         
         # Force SF center
         sf_center = [37.7749, -122.4194]
         m = folium.Map(location=sf_center, zoom_start=13)
         
         # 🔧 GROUP by location name to handle duplicates
-        grouped_locations = defaultdict(list)
+        grouped_locations = location_data.groups()
+        coordinates = location_data.coordinates()
         
-        for loc_data in location_data:
-            loc_name = loc_data['location_name']
-            grouped_locations[loc_name].append(loc_data)
+        if mode == 'auto':
+            mode = 'cluster' if len(grouped_locations) > MARKER_LIMIT else 'markers'
         
-        # Add markers (one per unique location)
-        for loc_name, loc_list in grouped_locations.items():
-            # Use first entry's geometry (they should all be the same)
-            geom = loc_list[0]['geometry']
-            
-            # Build popup with ALL films at this location
-            popup_html = f"<b>{loc_name}</b><br><br>"
-            
-            if len(loc_list) > 1:
-                popup_html += f"<b>🎬 Featured in {len(loc_list)} films:</b><br><br>"
-            
-            for i, loc_data in enumerate(loc_list, 1):
-                metadata = loc_data.get('metadata', {})
-                
-                # 🔧 ROBUST: Get title using case-insensitive search
-                title_text = self._get_case_insensitive(metadata, 'Title', 'title', 'Film', 'film')
-                
-                # 🔧 ROBUST: Get year using case-insensitive search
-                year = self._get_case_insensitive(metadata, 'Year', 'year')
-                
-                # Skip this entry if no title found
-                if not title_text:
-                    # Fallback: if still no title, skip this entry
-                    continue
-                
-                # Format as "Film #: Title (Year)" or just "Title (Year)" for single film
-                if len(loc_list) > 1:
-                    if year:
-                        popup_html += f"<b>Film {i}:</b> {title_text} ({year})<br>"
-                    else:
-                        popup_html += f"<b>Film {i}:</b> {title_text}<br>"
+        # One row per unique location: [lat, lon, name (escaped), appearances, films]
+        popups = PopupTemplate(location_data)
+        names = _escape_batch([str(name) for name in grouped_locations])
+        rows = []
+        for name, (loc_name, loc_list) in zip(names, grouped_locations.items()):
+            # Use first entry's position (they should all be the same)
+            lat, lon = coordinates[loc_list[0]]
+            rows.append([float(lat), float(lon), name, len(loc_list), popups.films(loc_list)])
+        
+        if mode == 'cluster':
+            FastMarkerCluster(rows, callback=CLUSTER_CALLBACK, name='Film locations').add_to(m)
+        else:
+            for lat, lon, name, count, films in rows:
+                # Choose icon color based on number of films
+                if count > 1:
+                    icon_color = 'blue'  # Multiple films = blue
                 else:
-                    # Single film - show title directly
-                    if year:
-                        popup_html += f"<b>Film:</b> {title_text} ({year})<br>"
-                    else:
-                        popup_html += f"<b>Film:</b> {title_text}<br>"
-                
-                # Add other metadata (EXCLUDE title/year/film/locations - case insensitive)
-                # Build set of keys to exclude by checking case-insensitively
-                exclude_patterns = ['title', 'film', 'year', 'locations']
-                
-                for key, val in metadata.items():
-                    # Skip if key matches any exclude pattern (case-insensitive)
-                    if key.lower() in exclude_patterns:
-                        continue
-                        
-                    if val is None or (not isinstance(val, list) and pd.isna(val)):
-                        continue
-                        
-                    # Handle lists (like multiple locations)
-                    if isinstance(val, list):
-                        # Convert list to comma-separated string for display
-                        if val:  # Only if list is not empty
-                            display_val = ', '.join(str(v) for v in val)
-                            display_key = key.replace('_', ' ').title()
-                            popup_html += f"<b>{display_key}:</b> {display_val}<br>"
-                    # Handle scalar values
-                    elif val != '' and val != 'None':
-                        display_key = key.replace('_', ' ').title()
-                        popup_html += f"<b>{display_key}:</b> {val}<br>"
+                    icon_color = 'red'   # Single film = red
                 
-                # Add spacing between films (but not after the last one)
-                if i < len(loc_list):
-                    popup_html += "<br>"
-            
-            # Choose icon color based on number of films
-            if len(loc_list) > 1:
-                icon_color = 'blue'  # Multiple films = blue
-            else:
-                icon_color = 'red'   # Single film = red
-            
-            folium.Marker(
-                location=[geom.y, geom.x],
-                popup=folium.Popup(popup_html, max_width=350),
-                tooltip=f"{loc_name} ({len(loc_list)} film{'s' if len(loc_list) > 1 else ''})",
-                icon=folium.Icon(color=icon_color, icon='film', prefix='fa')
-            ).add_to(m)
+                folium.Marker(
+                    location=[lat, lon],
+                    popup=folium.Popup(popups.html(name, count, films), max_width=350),
+                    tooltip=f"{name} ({count} film{'s' if count > 1 else ''})",
+                    icon=folium.Icon(color=icon_color, icon='film', prefix='fa')
+                ).add_to(m)
         
         # Update title to show unique locations vs total appearances
         title_html = f'''
@@ -152,7 +436,7 @@ class MapGenerator:
                     border-radius: 5px;
                     padding: 10px;
                     text-align: center;">
-            <h3 style="margin:0;">{title}</h3>
+            <h3 style="margin:0;">{html.escape(title)}</h3>
             <p style="margin:5px 0 0 0; font-size:14px; color:#666;">
                 {len(grouped_locations)} unique location{'' if len(grouped_locations) == 1 else 's'} • 
                 {len(location_data)} total appearance{'' if len(location_data) == 1 else 's'}
@@ -163,6 +447,98 @@ class MapGenerator:
         
         return m
     
+    def create_grid_map(self, location_data: Union[LocationData, List[Dict]],
+                        title: str = "SF Film Locations",
+                        cell_size: float = GRID_CELL_METERS,
+                        shape: str = 'hex') -> folium.Map:
+        """
+        Create an aggregated map: appearances are binned into grid cells and
+        only non-empty cells are drawn, shaded by count. The output grows with
+        the number of cells, not the number of points.
+        
+        Args:
+            location_data: LocationData, or list of dicts with 'location_name',
+                'geometry', 'metadata'
+            title: Map title
+            cell_size: Cell width in meters
+            shape: 'hex' or 'square'
+            
+        Returns:
+            folium.Map object
+        """
+        if not location_data:
+            return self._create_empty_map(title)
+        if not isinstance(location_data, LocationData):
+            location_data = LocationData.from_records(location_data)
+        
+        coordinates = location_data.coordinates()
+        cell_of, outlines = aggregate_grid(coordinates[:, 0], coordinates[:, 1], cell_size, shape)
+        n_cells = len(outlines)
+        
+        appearances = np.bincount(cell_of, minlength=n_cells)
+        name_codes, names = pd.factorize(pd.Series(location_data.names, dtype=object))
+        locations = np.bincount(np.unique(cell_of * len(names) + name_codes) // len(names),
+                                minlength=n_cells)
+        top_titles = _top_per_group(cell_of, self._title_column(location_data), n_cells, GRID_TOP_TITLES)
+        
+        features = []
+        for i in range(n_cells):
+            ring = outlines[i].tolist()
+            features.append({
+                'type': 'Feature',
+                'geometry': {'type': 'Polygon', 'coordinates': [ring + ring[:1]]},
+                'properties': {
+                    'appearances': int(appearances[i]),
+                    'locations': int(locations[i]),
+                    'top_titles': ', '.join(f"{html.escape(str(t), quote=False)} ({c})"
+                                            for t, c in top_titles[i]) or '-'
+                }
+            })
+        
+        colormap = branca.colormap.linear.YlOrRd_09.scale(1, max(2, int(appearances.max())))
+        colormap.caption = 'Film appearances per cell'
+        
+        m = folium.Map(location=self.default_center, zoom_start=13)
+        folium.GeoJson(
+            {'type': 'FeatureCollection', 'features': features},
+            name='Filming density',
+            style_function=lambda feature: {
+                'fillColor': colormap(feature['properties']['appearances']),
+                'color': '#555555',
+                'weight': 0.5,
+                'fillOpacity': 0.65
+            },
+            tooltip=folium.GeoJsonTooltip(
+                fields=['appearances', 'locations', 'top_titles'],
+                aliases=['Appearances', 'Locations', 'Top films']
+            )
+        ).add_to(m)
+        colormap.add_to(m)
+        
+        title_html = f'''
+        <div style="position: fixed; 
+                    top: 10px; left: 50px; right: 50px; 
+                    z-index:9999; 
+                    background-color:white;
+                    border:2px solid grey;
+                    border-radius: 5px;
+                    padding: 10px;
+                    text-align: center;">
+            <h3 style="margin:0;">{html.escape(title)}</h3>
+            <p style="margin:5px 0 0 0; font-size:14px; color:#666;">
+                {len(location_data)} appearance{'' if len(location_data) == 1 else 's'} in 
+                {n_cells} area{'' if n_cells == 1 else 's'} of {cell_size:.0f} m
+            </p>
+        </div>
+        '''
+        m.get_root().html.add_child(folium.Element(title_html))
+        
+        return m
+    
+    def _title_column(self, location_data: LocationData) -> np.ndarray:
+        """Film title per entry (case-insensitive 'title'/'film' metadata)"""
+        return _resolve_field(location_data.metadata_fields(), len(location_data), *TITLE_KEYS)
+    
     def _create_empty_map(self, title: str) -> folium.Map:
         """Create fallback map when no locations found"""
         m = folium.Map(location=self.default_center, zoom_start=12)
@@ -176,10 +552,90 @@ class MapGenerator:
                     border-radius: 5px;
                     padding: 10px;
                     text-align: center;">
-            <h3 style="margin:0; color:#856404;">{title}</h3>
+            <h3 style="margin:0; color:#856404;">{html.escape(title)}</h3>
             <p style="margin:5px 0 0 0; color:#856404;">No locations found to display</p>
         </div>
         '''
         m.get_root().html.add_child(folium.Element(title_html))
         
-        return m
\ No newline at end of file
+        return m
+
+if __name__ == "__main__":
+    # Benchmark: HTML size and build/render time of both modes by point count
+    from src import data_loader
+    from src.map_analyzer import MapDataAnalyzer
+
+    gdf = data_loader.store.current().gdf
+    everything = MapDataAnalyzer(gdf)._extract_locations(gdf)
+    generator = MapGenerator()
+
+    for count in (50, 200, len(everything)):
+        subset = LocationData(everything.names[:count], everything.geometry[:count],
+                              {k: v[:count] for k, v in everything.columns.items()})
+        print(f"📊 {count} appearances, {len(subset.groups())} locations")
+        for mode in ('markers', 'cluster', 'grid'):
+            start = time.perf_counter()
+            m = generator.create_point_map(subset, mode=mode)
+            build = time.perf_counter() - start
+            start = time.perf_counter()
+            document = m.get_root().render()
+            render = time.perf_counter() - start
+            print(f"   {mode:8s} build {build * 1000:8.1f} ms, render {render * 1000:8.1f} ms, "
+                  f"HTML {len(document) / 1024:8.1f} KiB")
+
+    # Popup building: per-entry dict scans + string concatenation (old) vs PopupTemplate
+    def legacy_popups(location_data: LocationData) -> List[str]:
+        def get_case_insensitive(metadata, *keys):
+            for key in keys:
+                if key in metadata:
+                    return metadata[key]
+                for meta_key, meta_val in metadata.items():
+                    if meta_key.lower() == key.lower():
+                        return meta_val
+            return None
+
+        popups = []
+        for loc_name, loc_list in location_data.groups().items():
+            popup_html = f"<b>{loc_name}</b><br><br>"
+            if len(loc_list) > 1:
+                popup_html += f"<b>🎬 Featured in {len(loc_list)} films:</b><br><br>"
+            for i, position in enumerate(loc_list, 1):
+                metadata = location_data.metadata_at(position)
+                title_text = get_case_insensitive(metadata, 'Title', 'title', 'Film', 'film')
+                year = get_case_insensitive(metadata, 'Year', 'year')
+                if not title_text:
+                    continue
+                label = f"Film {i}" if len(loc_list) > 1 else "Film"
+                popup_html += f"<b>{label}:</b> {title_text} ({year})<br>" if year else f"<b>{label}:</b> {title_text}<br>"
+                for key, val in metadata.items():
+                    if key.lower() in ['title', 'film', 'year', 'locations']:
+                        continue
+                    if val is None or (not isinstance(val, list) and pd.isna(val)):
+                        continue
+                    if isinstance(val, list):
+                        if val:
+                            popup_html += f"<b>{key.replace('_', ' ').title()}:</b> {', '.join(str(v) for v in val)}<br>"
+                    elif val != '' and val != 'None':
+                        popup_html += f"<b>{key.replace('_', ' ').title()}:</b> {val}<br>"
+                if i < len(loc_list):
+                    popup_html += "<br>"
+            popups.append(popup_html)
+        return popups
+
+    def template_popups(location_data: LocationData) -> List[str]:
+        template = PopupTemplate(location_data)
+        groups = location_data.groups()
+        names = _escape_batch([str(name) for name in groups])
+        return [template.html(name, len(positions), template.films(positions))
+                for name, positions in zip(names, groups.values())]
+
+    # Every dataset column as metadata, repeated to get a large result
+    frame = MapDataAnalyzer(gdf)._extract_locations(gdf.drop(columns='geometry'))
+    large = LocationData.concat([frame] * 5)
+    fields = sum(len(large) for _ in large.columns)
+    print(f"📊 Popups for {len(large)} entries x {len(large.columns)} fields ({fields} values)")
+    for name, build_popups in (('legacy', legacy_popups), ('template', template_popups)):
+        start = time.perf_counter()
+        built = build_popups(large)
+        elapsed = time.perf_counter() - start
+        print(f"   {name:8s} {elapsed * 1000:8.1f} ms ({elapsed / fields * 1e9:6.0f} ns per field)")
@@ -4,27 +4,48 @@ A class-based implementation to process natural language queries about
 San Francisco film locations using GeoPandas and generative AI.
 """
 
+import os
 import re
 import time
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import pandas as pd
 import numpy as np
 import geopandas as gpd
 from shapely.geometry import Point
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 
 
 #  import API keys/Model setting/Databse file
 from src.map_embed_in_html import embed_in_custom_html
+from src.report_store import get_report_store
 from src.code_executor import CodeExecutor
 from src import data_loader
+from src.dataset_stats import get_dataset_stats
+from src.map_analyzer import get_map_analyzer
 from src.ai_service import GenerativeAIService
 from src.system_instructions import SystemInstructions
 from src.logger import write_to_log_file
+from src.artifact_writer import get_artifact_writer
 
 from pathlib import Path
 
 
+# Number of code candidates generated per query (1 = single-shot, as before)
+CODE_CANDIDATES = int(os.getenv('SF_FILM_CODE_CANDIDATES', '1'))
+# Sampling temperatures cycled through by the candidates
+CANDIDATE_TEMPERATURES = [
+    float(t) for t in os.getenv('SF_FILM_CANDIDATE_TEMPERATURES', '0,0.4,0.8').split(',') if t.strip()
+]
+# Map files written per query: 'map' (standalone map), 'report' (query,
+# map and results); empty or 'none' writes nothing (production)
+MAP_ARTIFACTS = {
+    a.strip().lower() for a in os.getenv('SF_FILM_MAP_ARTIFACTS', 'map,report').split(',')
+} & {'map', 'report'}
+MAP_ARTIFACT_DIR = os.getenv('SF_FILM_MAP_DIR', 'maps')
+
+
 class QueryProcessor:
     """
     A class to process natural language queries about San Francisco film locations
@@ -44,27 +65,39 @@ class QueryProcessor:
             model_name: Name of the generative AI model to use
         """
         self.ai_service = GenerativeAIService()
-        self.gdf = data_loader.database  # Holds the GeoPandas dataframe
         self.user_query = None  # Will be updated for each query
-        self.code_executor = CodeExecutor(self.gdf)
+        # Maps and reports are written in the background
+        self.artifact_writer = get_artifact_writer()
+        self.dataset_version = None
+        # Binds self.gdf, self.code_executor and self.stats to the active dataset
+        self._refresh_dataset()
 
         # System instructions for each step
         self.system_instructions = SystemInstructions()
         self._preprocessing_instructions = self.system_instructions.get_preprocessing_instructions()
         self._nlp_plan_instructions = self.system_instructions.get_nlp_plan_instructions()
 
-        # Create location-to-geometry lookup
-        self._create_location_lookup()
         # Map flag
         # Let it be True for testing! REMOVE later. Will be updated after preprocessing step
         self.need_map = True
 
-    def _create_location_lookup(self):
-        """Create a lookup dictionary: location_name -> Point geometry"""
-        unique_locations = self.gdf.drop_duplicates(subset=['Locations'])
-        self.location_geometry_map = dict(
-            zip(unique_locations['Locations'], unique_locations['geometry'])
-        )
+    def _refresh_dataset(self) -> None:
+        """
+        Rebind to the active dataset version if it was hot-reloaded.
+        Called between queries only, so an in-flight query keeps the
+        frame and executor it started with.
+        """
+        dataset = data_loader.store.current()
+        if dataset.version == self.dataset_version:
+            return
+
+        self.dataset_version = dataset.version
+        self.gdf = dataset.gdf  # Holds the GeoPandas dataframe
+        self.code_executor = CodeExecutor(self.gdf, dataset_version=dataset.version)
+        # Aggregates shared by the sidebar and the template query path
+        self.stats = get_dataset_stats(self.gdf, dataset.version)
+        # Location lookup for map analysis, built once per version
+        self.map_analyzer = get_map_analyzer(self.gdf, dataset.version)
 
     def _should_generate_map(self, preprocessing_result: Dict[str, Any]) -> bool:
         """
@@ -87,6 +120,33 @@ class QueryProcessor:
 
         return False
 
+    def _answer_from_stats(self, user_query: str) -> Optional[Dict[str, Any]]:
+        """
+        Template query path: answer count-style questions from the
+        precomputed dataset statistics instead of generating code.
+
+        Args:
+            user_query: The natural language query about SF film locations
+
+        Returns:
+            Execution result dict, or None if no template matched
+        """
+        answer = self.stats.answer(user_query)
+        if answer is None:
+            return None
+
+        return {
+            "success": True,
+            "data": answer,
+            "summary": answer["summary"],
+            "metadata": {
+                "result_type": "dictionary",
+                "execution_status": "completed",
+                "keys": list(answer.keys()),
+                **answer["metadata"]
+            }
+        }
+
     def execute_generated_code(self, code: str):
         """
         Execute the generated GeoPandas code and return both the result and its code representation.
@@ -226,7 +286,8 @@ class QueryProcessor:
         self,
         user_query: str,
         preprocessing_result: Dict[str, Any],
-        nlp_plan: Dict[str, str]
+        nlp_plan: Dict[str, str],
+        temperature: float = 0
     ) -> Dict[str, str]:
         """
         Step 3: Generate executable GeoPandas code.
@@ -235,6 +296,7 @@ class QueryProcessor:
             user_query: The original user query
             preprocessing_result: The result from the preprocessing step
             nlp_plan: The NLP action plan
+            temperature: Sampling temperature for the model
 
         Returns:
             Dict containing the generated code and explanation
@@ -245,7 +307,7 @@ class QueryProcessor:
             )
 
             response = self.ai_service.generate_content(
-                code_gen_instructions, user_query
+                code_gen_instructions, user_query, temperature=temperature
             )
 
             # Parse the response
@@ -264,38 +326,42 @@ class QueryProcessor:
         except Exception as e:
             raise ValueError(f"Error in code generation step: {str(e)}")
 
-    def process_query(self, user_query: str, wait_time: int = 5) -> Dict[str, Any]:
+    def _run_generation_stages(
+        self,
+        user_query: str,
+        results: Dict[str, Any],
+        wait_time: int
+    ) -> Dict[str, Any]:
         """
-        Process a natural language query through the complete pipeline.
+        Run preprocessing, planning, code generation and execution for a query.
 
         Args:
             user_query: The natural language query about SF film locations
+            results: Pipeline results dict, filled in with each stage's output
             wait_time: Time to wait between API calls to avoid rate limiting
 
         Returns:
-            Dict containing results from each step and the final code
+            The execution result of the generated code
         """
-
-        print(f"\n🔥🔥🔥 QUERYPROCESSOR.process_query() CALLED! Query: '{user_query}' 🔥🔥🔥")
-
-        results = {}
-
-        try:
-            self.user_query = user_query
-            # Step 1: Preprocessing
-            preprocessing_result = self.preprocess_query(user_query)
-            # update need_map class variable This line and the following need attention
-            # self.need_map = self._should_generate_map(preprocessing_result)
-
-            results["preprocessing"] = preprocessing_result
-            self.check_preprocessing_error(preprocessing_result)
-            time.sleep(wait_time)  # Avoid rate limiting
-
-            # Step 2: NLP Action Planning
-            nlp_plan = self.generate_nlp_plan(preprocessing_result)
-            results["nlp_plan"] = nlp_plan
-            time.sleep(wait_time)  # Avoid rate limiting
-
+        # Step 1: Preprocessing
+        preprocessing_result = self.preprocess_query(user_query)
+        # update need_map class variable This line and the following need attention
+        # self.need_map = self._should_generate_map(preprocessing_result)
+
+        results["preprocessing"] = preprocessing_result
+        self.check_preprocessing_error(preprocessing_result)
+        time.sleep(wait_time)  # Avoid rate limiting
+
+        # Step 2: NLP Action Planning
+        nlp_plan = self.generate_nlp_plan(preprocessing_result)
+        results["nlp_plan"] = nlp_plan
+        time.sleep(wait_time)  # Avoid rate limiting
+
+        if self._candidate_count() > 1:
+            # Steps 3+4 with several candidates racing each other
+            execution_result = self._run_code_candidates(
+                user_query, preprocessing_result, nlp_plan, results)
+        else:
             # Step 3: Code Generation
             code_result = self.generate_geopandas_code(
                 user_query, preprocessing_result, nlp_plan
@@ -307,31 +373,241 @@ class QueryProcessor:
             # write_to_log_file(results, 'log.json', self.user_query)
 
             # Step 4: Execute Code
-            if "code" in results:
+            # Execution ...
+            execution_result = self.execute_generated_code(
+                results["code"]["code"])
+
+        # 🔧🔧🔧 ADD execution result to the result object to make life easier in chatbot!🔧🔧🔧
+        results["execution_result"] = execution_result
+
+        print("\nExecution Result:")
+        print("⚠️no printint out for now! modify it if you want to!")
+        # print(execution_result)
+        write_to_log_file(
+            execution_result,
+            'code_exec_results.jsonl',
+            self.user_query,
+            jsonlines_flag=True
+        )
+
+        return execution_result
+
+    @staticmethod
+    def _candidate_status(execution_result: Dict[str, Any]) -> str:
+        """
+        Classify a candidate's execution result.
+
+        Returns:
+            'accepted' for a non-empty standardized result, 'empty' for a
+            clean run without data, otherwise the failure kind
+        """
+        metadata = execution_result.get("metadata", {})
+        if not execution_result.get("success"):
+            return metadata.get("execution_status", "failed")
+
+        data = execution_result.get("data")
+        if not isinstance(data, dict) or "data" not in data:
+            return "wrong_type"
+        # Generated scripts catch their own exceptions and report them here
+        if isinstance(data.get("metadata"), dict) and "error" in data["metadata"]:
+            return "script_error"
+
+        payload = data["data"]
+        if payload is None:
+            return "empty"
+        if isinstance(payload, (pd.DataFrame, pd.Series)):
+            return "empty" if payload.empty else "accepted"
+        if hasattr(payload, '__len__') and not isinstance(payload, str) and len(payload) == 0:
+            return "empty"
+        return "accepted"
+
+    def _candidate_count(self) -> int:
+        """
+        Number of code candidates to race for a query. Cancellation can only
+        stop a running candidate in a sandbox worker, so without the sandbox
+        pool a single candidate runs (losers would keep executing generated
+        code in server threads).
+        """
+        sandbox = self.code_executor.sandbox
+        if CODE_CANDIDATES > 1 and (sandbox is None or sandbox.closed):
+            return 1
+        return CODE_CANDIDATES
+
+    def _run_candidate(
+        self,
+        index: int,
+        temperature: float,
+        user_query: str,
+        preprocessing_result: Dict[str, Any],
+        nlp_plan: Dict[str, str],
+        cancel_event: threading.Event
+    ) -> Dict[str, Any]:
+        """Generate and execute one candidate; stops early once another candidate won"""
+        start = time.perf_counter()
+        candidate = {"index": index, "temperature": temperature}
+        try:
+            candidate["code_result"] = self.generate_geopandas_code(
+                user_query, preprocessing_result, nlp_plan, temperature=temperature)
+        except ValueError as e:
+            candidate.update(status="generation_failed", error=str(e),
+                             elapsed=time.perf_counter() - start)
+            return candidate
+
+        if cancel_event.is_set():
+            candidate.update(status="cancelled", elapsed=time.perf_counter() - start)
+            return candidate
+
+        execution_result = self.code_executor.execute_with_validation(
+            candidate["code_result"].get("code", ""), cancel_event=cancel_event)
+        candidate.update(
+            execution_result=execution_result,
+            status=self._candidate_status(execution_result),
+            elapsed=time.perf_counter() - start
+        )
+        return candidate
+
+    def _run_code_candidates(
+        self,
+        user_query: str,
+        preprocessing_result: Dict[str, Any],
+        nlp_plan: Dict[str, str],
+        results: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """
+        Steps 3+4 in multi-candidate mode: generate _candidate_count() scripts
+        concurrently (cycling through CANDIDATE_TEMPERATURES), execute each as
+        soon as it arrives, and keep the first one that produces a non-empty
+        standardized result. The others are cancelled.
+
+        Args:
+            user_query: The natural language query about SF film locations
+            preprocessing_result: The result from the preprocessing step
+            nlp_plan: The NLP action plan
+            results: Pipeline results dict; receives 'code' and 'candidates'
+
+        Returns:
+            The execution result of the selected candidate
+        """
+        temperatures = CANDIDATE_TEMPERATURES or [0]
+        count = self._candidate_count()
+        cancel_event = threading.Event()
+        start = time.perf_counter()
+        pool = ThreadPoolExecutor(max_workers=count, thread_name_prefix='code-candidate')
+        futures = {
+            pool.submit(self._run_candidate, i, temperatures[i % len(temperatures)],
+                        user_query, preprocessing_result, nlp_plan, cancel_event): i
+            for i in range(count)
+        }
+
+        finished: List[Dict[str, Any]] = []
+        winner = None
+        try:
+            for future in as_completed(futures):
+                try:
+                    candidate = future.result()
+                except Exception as e:
+                    # e.g. an API or network error: this candidate is out,
+                    # the others keep going
+                    i = futures[future]
+                    candidate = {"index": i, "temperature": temperatures[i % len(temperatures)],
+                                 "status": "error", "error": f"{type(e).__name__}: {e}",
+                                 "elapsed": time.perf_counter() - start}
+                finished.append(candidate)
+                print(f"🏁 Candidate {candidate['index']} (T={candidate['temperature']}): "
+                      f"{candidate['status']} in {candidate['elapsed']:.2f}s")
+                if candidate["status"] == "accepted":
+                    winner = candidate
+                    break
+        finally:
+            # Losers still generating skip execution; sandboxed runs are killed
+            cancel_event.set()
+            pool.shutdown(wait=False, cancel_futures=True)
+
+        if winner is None:
+            # Nothing produced data: prefer a clean empty answer, then any executed candidate
+            ranked = sorted(finished, key=lambda c: (
+                c["status"] != "empty", "execution_result" not in c, c["index"]))
+            winner = ranked[0]
+
+        results["candidates"] = [
+            {key: c[key] for key in ("index", "temperature", "status", "elapsed")}
+            for c in sorted(finished, key=lambda c: c["index"])
+        ]
+        if "code_result" not in winner:
+            raise ValueError(f"Error in code generation step: {winner.get('error')}")
+        results["code"] = winner["code_result"]
+
+        execution_result = winner["execution_result"]
+        execution_result["metadata"]["candidate"] = {
+            "index": winner["index"],
+            "temperature": winner["temperature"],
+            "status": winner["status"],
+            "candidates": count
+        }
+        return execution_result
+
+    def _save_map_artifacts(
+        self,
+        map_document: str,
+        map_html: str,
+        execution_result: Dict[str, Any]
+    ) -> None:
+        """
+        Queue the enabled map artifacts (SF_FILM_MAP_ARTIFACTS) for a query
+        on the background writer.
+
+        Args:
+            map_document: Rendered standalone map document
+            map_html: The same map embedded for display (reused by the report)
+            execution_result: Execution result shown in the report
+        """
+        if 'map' in MAP_ARTIFACTS:
+            self.artifact_writer.submit(
+                'map', get_report_store(MAP_ARTIFACT_DIR).save_map, map_document)
+        if 'report' in MAP_ARTIFACTS:
+            self.artifact_writer.submit(
+                'report', embed_in_custom_html, self.user_query, execution_result, map_html,
+                output_dir=MAP_ARTIFACT_DIR)
 
-                # Execution ...
-                execution_result = self.execute_generated_code(
-                    results["code"]["code"])
-                
-                # 🔧🔧🔧 ADD execution result to the result object to make life easier in chatbot!🔧🔧🔧
+    def process_query(self, user_query: str, wait_time: int = 5) -> Dict[str, Any]:
+        """
+        Process a natural language query through the complete pipeline.
+
+        Args:
+            user_query: The natural language query about SF film locations
+            wait_time: Time to wait between API calls to avoid rate limiting
+
+        Returns:
+            Dict containing results from each step and the final code
+        """
+
+        print(f"\n🔥🔥🔥 QUERYPROCESSOR.process_query() CALLED! Query: '{user_query}' 🔥🔥🔥")
+
+        results = {}
+
+        try:
+            self.user_query = user_query
+            self._refresh_dataset()
+
+            # Step 0: Template path - skip the LLM stages entirely for
+            # count-style questions the statistics store already answers
+            template_result = self._answer_from_stats(user_query)
+            if template_result is not None:
+                results["code"] = {
+                    "code": "",
+                    "explanation": f"Answered from precomputed dataset statistics "
+                                   f"({template_result['metadata']['template']})"
+                }
+                execution_result = template_result
                 results["execution_result"] = execution_result
-    
-                print("\nExecution Result:")
-                print("⚠️no printint out for now! modify it if you want to!")
-                # print(execution_result)
-                write_to_log_file(
-                    execution_result,
-                    'code_exec_results.jsonl',
-                    self.user_query,
-                    jsonlines_flag=True
-                )
+                print(f"✓ Answered from dataset statistics: {template_result['metadata']['template']}")
+            else:
+                execution_result = self._run_generation_stages(
+                    user_query, results, wait_time)
 
             # Step 5: Pre-Mapping Analysis (NEW)
             if self.need_map:  # Only if query had spatial intent
-                from src.map_analyzer import MapDataAnalyzer
-
-                analyzer = MapDataAnalyzer(self.gdf)
-                analysis = analyzer.analyze(
+                analysis = self.map_analyzer.analyze(
                     execution_result.get('data'), user_query)
                 results["map_analysis"] = analysis
                 # print(results)
@@ -354,24 +630,19 @@ class QueryProcessor:
 
                 # Step 6: Generate Map (only if can_map is True)
                 if analysis['can_map']:
-                    from src.map_generator import MapGenerator
+                    from src.map_generator import MapGenerator, embed_html
                     
                     map_gen = MapGenerator()
-                    map_obj = map_gen.create_point_map(
+                    # Rendered once (or taken from the map cache) and reused below
+                    map_document = map_gen.render_map(
                         analysis['location_data'],
-                        title=execution_result["data"].get('summary', 'SF Film Locations')
+                        title=execution_result["data"].get('summary', 'SF Film Locations'),
+                        mode='grid' if analysis['aggregate_query'] else 'auto'
                     )
-                    results["map"] = map_obj
-                    results["map_html"] = map_obj._repr_html_()
+                    results["map_html"] = embed_html(map_document)
                     print(f"✓ Map created: {analysis['reason']}")
-                    # Quick TEST --> After creating the map
-                    # Save to a file
-                    map_filename = f"maps/map_{int(time.time())}.html"
-                    Path('maps').mkdir(exist_ok=True)  # Create Path object first
-                    map_obj.save(map_filename)
-                    
-                    # let's try the custom HTML option too
-                    embed_in_custom_html(self.user_query,execution_result, results["map_html"])
+                    # The saved files reuse the same render
+                    self._save_map_artifacts(map_document, results["map_html"], execution_result)
 
             print(f"\n🔍 QUERYPROCESSOR: About to return results")
             print(f"🔍 QUERYPROCESSOR: Final results keys: {results.keys()}")
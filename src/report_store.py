@@ -0,0 +1,224 @@
+"""
+Report Store Module
+Content-addressed storage for the HTML artifacts of map queries (reports
+from embed_in_custom_html and standalone map files) in the maps directory.
+
+- Files are named by a hash of their content, so a repeated query is written
+  once and two queries in the same second never overwrite each other.
+- Files are gzip-compressed (SF_FILM_REPORT_GZIP=0 writes plain HTML).
+- Reports embed at most SF_FILM_REPORT_EMBED_KB of result JSON; larger
+  results get a preview plus a separate data file the report points to.
+- The directory is kept under SF_FILM_REPORT_DIR_MB, and files unused for
+  SF_FILM_REPORT_MAX_AGE_DAYS are deleted (0 disables either limit).
+"""
+
+import os
+import gzip
+import time
+import hashlib
+import threading
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+from src.map_embed_in_html import serialize_report_data, build_report_html
+
+
+REPORT_GZIP = os.getenv('SF_FILM_REPORT_GZIP', '1') != '0'
+REPORT_EMBED_KB = int(os.getenv('SF_FILM_REPORT_EMBED_KB', '256'))
+REPORT_DIR_MB = int(os.getenv('SF_FILM_REPORT_DIR_MB', '256'))
+REPORT_MAX_AGE_DAYS = float(os.getenv('SF_FILM_REPORT_MAX_AGE_DAYS', '30'))
+
+# Seconds between age-based scans of the directory
+RETENTION_SCAN_INTERVAL = 600
+# Artifact prefixes managed by the store (other files are never touched)
+ARTIFACT_PREFIXES = ('report_', 'map_', 'data_', 'results_with_map')
+
+
+class ReportStore:
+    """
+    Content-addressed, compressed artifact files in one directory.
+    """
+
+    def __init__(self, directory: str, compress: bool = REPORT_GZIP,
+                 max_embedded_bytes: int = REPORT_EMBED_KB * 1024,
+                 max_bytes: int = REPORT_DIR_MB * 1024 * 1024,
+                 max_age_days: float = REPORT_MAX_AGE_DAYS):
+        """
+        Initialize the store.
+
+        Args:
+            directory: Directory holding the artifacts
+            compress: Write gzip files (.gz suffix)
+            max_embedded_bytes: Result JSON embedded in a report before it
+                moves to a data file
+            max_bytes: Directory budget; least recently used files go first
+                (0 = unbounded)
+            max_age_days: Files unused this long are deleted (0 = keep)
+        """
+        self.directory = Path(directory)
+        self.compress = compress
+        self.max_embedded_bytes = max_embedded_bytes
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        self._lock = threading.Lock()
+        self._bytes: Optional[int] = None  # counted on first write
+        self._last_scan = 0.0
+        self._stats = {"written": 0, "deduplicated": 0, "data_files": 0, "pruned": 0}
+
+    def _path(self, prefix: str, digest: str, suffix: str) -> Path:
+        return self.directory / f"{prefix}{digest[:32]}{suffix}{'.gz' if self.compress else ''}"
+
+    def save_report(self, user_query: str, execution_result: Dict[str, Any], map_html: str) -> Path:
+        """
+        Store the report of a query.
+
+        Args:
+            user_query: The original search query from the user
+            execution_result: Query results ('summary' and 'data' are shown)
+            map_html: Embeddable map HTML
+
+        Returns:
+            Path of the report file
+        """
+        summary, data_json = serialize_report_data(execution_result)
+        data_note = None
+        if len(data_json) > self.max_embedded_bytes:
+            data_path = self.save('data_', data_json, '.json')
+            with self._lock:
+                self._stats["data_files"] += 1
+            # Cut at a line boundary so the preview stays readable
+            preview = data_json[:self.max_embedded_bytes].rsplit('\n', 1)[0]
+            data_note = (f"Showing the first {len(preview) // 1024} KiB of "
+                         f"{len(data_json) // 1024} KiB; full results in {data_path.name}")
+            data_json = preview + '\n...'
+        document = build_report_html(user_query, summary, map_html, data_json, data_note)
+        return self.save('report_', document, '.html')
+
+    def save_map(self, map_document: str) -> Path:
+        """
+        Store a standalone map document.
+
+        Args:
+            map_document: Rendered map HTML
+
+        Returns:
+            Path of the map file
+        """
+        return self.save('map_', map_document, '.html')
+
+    def save(self, prefix: str, text: str, suffix: str) -> Path:
+        """
+        Write text under its content hash (skipped if that file exists).
+
+        Args:
+            prefix: File name prefix ('report_', 'map_', 'data_')
+            text: File content
+            suffix: Extension before the optional '.gz'
+
+        Returns:
+            Path of the file
+        """
+        data = text.encode('utf-8')
+        path = self._path(prefix, hashlib.sha256(data).hexdigest(), suffix)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if path.exists():
+            os.utime(path)  # refresh for retention
+            with self._lock:
+                self._stats["deduplicated"] += 1
+            return path
+
+        if self.compress:
+            # mtime=0: identical content gives identical bytes
+            data = gzip.compress(data, compresslevel=6, mtime=0)
+        tmp = path.with_suffix(f'.{os.getpid()}.{threading.get_ident()}.tmp')
+        try:
+            tmp.write_bytes(data)
+            os.replace(tmp, path)  # readers never see a partial file
+        except OSError:
+            tmp.unlink(missing_ok=True)
+            raise
+
+        with self._lock:
+            self._stats["written"] += 1
+            if self._bytes is not None:
+                self._bytes += len(data)
+            scan = (self._bytes is None
+                    or (self.max_bytes and self._bytes > self.max_bytes)
+                    or time.time() - self._last_scan > RETENTION_SCAN_INTERVAL)
+        if scan:
+            self.apply_retention()
+        return path
+
+    def _artifacts(self):
+        """(mtime, size, path) of every managed file, oldest first"""
+        files = []
+        for f in self.directory.iterdir():
+            if not f.name.startswith(ARTIFACT_PREFIXES) or f.suffix == '.tmp':
+                continue
+            try:
+                stat = f.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, f))
+        files.sort()
+        return files
+
+    def apply_retention(self) -> int:
+        """
+        Delete expired files, then least recently used ones until the
+        directory is at 90% of its budget.
+
+        Returns:
+            Number of files deleted
+        """
+        files = self._artifacts() if self.directory.exists() else []
+        now = time.time()
+        total = sum(size for _, size, _ in files)
+        removed = 0
+        for mtime, size, f in files:
+            expired = self.max_age_days and now - mtime > self.max_age_days * 86400
+            over = self.max_bytes and total > self.max_bytes * 0.9
+            if not (expired or over):
+                break  # oldest first: the rest are newer and fit
+            f.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+        with self._lock:
+            self._bytes = total
+            self._last_scan = now
+            self._stats["pruned"] += removed
+        return removed
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get store counters.
+
+        Returns:
+            Dictionary of files written, deduplicated writes, data files,
+            pruned files and bytes on disk (None before the first scan)
+        """
+        with self._lock:
+            return {**self._stats, "bytes": self._bytes, "max_bytes": self.max_bytes}
+
+
+_stores: Dict[str, ReportStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_report_store(directory: str = 'maps') -> ReportStore:
+    """
+    Get the process-wide store of a directory.
+
+    Args:
+        directory: Artifact directory
+
+    Returns:
+        Shared ReportStore
+    """
+    key = os.path.abspath(directory)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = ReportStore(directory)
+            _stores[key] = store
+        return store
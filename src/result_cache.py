@@ -0,0 +1,367 @@
+"""
+Result Cache Module
+Memoizes execution results of generated code. Validated code run against
+the same dataset version with the same extra namespace is deterministic, so
+a repeated query can skip re-running its pandas pipeline.
+
+Entries are keyed by (normalized code hash, dataset version, namespace hash,
+entry function, optimizer flag) and evicted LRU under a byte budget (SF_FILM_RESULT_CACHE_MB, 0 disables).
+DataFrames are stored column by column (object string columns packed into
+Arrow buffers); hits rebuild them around the stored columns without copying,
+and Copy-on-Write keeps callers from mutating the cached buffers.
+"""
+
+import os
+import ast
+import sys
+import copy
+import pickle
+import hashlib
+import threading
+import functools
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+from typing import Dict, Any, List, Optional
+
+try:
+    import pyarrow as pa
+except ImportError:  # optional - object string columns are then stored as-is
+    pa = None
+
+
+RESULT_CACHE_MB = int(os.getenv('SF_FILM_RESULT_CACHE_MB', '256'))
+
+# Calls whose result changes between runs - code using them is never cached,
+# whether called as an attribute (np.random.rand()) or imported by name
+# (from random import random; random())
+NONDETERMINISTIC_ATTRIBUTES = {
+    'now', 'today', 'utcnow', 'time', 'random', 'rand', 'randn', 'randint',
+    'sample', 'shuffle', 'permutation', 'choice', 'default_rng', 'uniform',
+    'normal', 'uuid4', 'urandom', 'perf_counter', 'monotonic',
+}
+
+# Object columns wrap numpy arrays in this type (renamed in pandas 2.1)
+_NUMPY_ARRAY = getattr(pd.arrays, 'NumpyExtensionArray', None) or pd.arrays.PandasArray
+
+# Leaf values handed out without copying
+_IMMUTABLE_TYPES = (str, bytes, int, float, complex, bool, type(None), np.generic,
+                    pd.Timestamp, pd.Timedelta, frozenset)
+
+
+@functools.lru_cache(maxsize=256)
+def normalized_code_hash(code: str) -> Optional[str]:
+    """
+    Hash code by its syntax tree, so comments and formatting don't matter.
+
+    Args:
+        code: Python source
+
+    Returns:
+        Hex digest, or None if the code should not be cached (syntax error
+        or calls to time/random functions)
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return None
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Attribute) and node.attr in NONDETERMINISTIC_ATTRIBUTES:
+            return None
+        if (isinstance(node, ast.Call) and isinstance(node.func, ast.Name)
+                and node.func.id in NONDETERMINISTIC_ATTRIBUTES):
+            return None
+        # from random import choice as pick; pick(...)
+        if isinstance(node, ast.ImportFrom) and any(
+                alias.name in NONDETERMINISTIC_ATTRIBUTES for alias in node.names):
+            return None
+    return hashlib.sha256(ast.dump(tree).encode('utf-8')).hexdigest()
+
+
+def namespace_hash(namespace: Optional[Dict[str, Any]]) -> Optional[str]:
+    """
+    Hash the extra variables passed to generated code.
+
+    Args:
+        namespace: custom_namespace given to execute_code
+
+    Returns:
+        Hex digest ('' for no namespace), or None if it cannot be pickled
+    """
+    if not namespace:
+        return ''
+    try:
+        payload = pickle.dumps(sorted(namespace.items()), protocol=5)
+    except Exception:
+        return None
+    return hashlib.sha256(payload).hexdigest()
+
+
+class _FrozenFrame:
+    """Column-wise snapshot of a DataFrame or GeoDataFrame"""
+
+    def __init__(self, df: pd.DataFrame):
+        self.columns = df.columns
+        self.index = df.index
+        self.attrs = dict(df.attrs)
+        geometry = getattr(df, '_geometry_column_name', None)
+        self.geometry = geometry if isinstance(df, gpd.GeoDataFrame) and geometry in df.columns else None
+        self.crs = df.crs if self.geometry else None
+        # Each column is either an Arrow string array or a shallow Series copy;
+        # the copies are tracked by Copy-on-Write, so neither the producer nor
+        # later readers can write through to the cached buffers
+        self.parts: List[Any] = []
+        self.nbytes = int(df.index.memory_usage(deep=True))
+
+        for i in range(df.shape[1]):
+            column = df.iloc[:, i]
+            encoded = _encode_strings(column.array)
+            if encoded is not None:
+                self.parts.append(encoded)
+                self.nbytes += encoded.nbytes
+            else:
+                self.parts.append(column.copy(deep=False))
+                self.nbytes += int(column.memory_usage(deep=True, index=False))
+
+    def thaw(self) -> pd.DataFrame:
+        data = {}
+        for i, part in enumerate(self.parts):
+            if isinstance(part, pd.Series):
+                data[i] = part.copy(deep=False)
+            else:
+                data[i] = pd.Series(_decode_strings(part), index=self.index, copy=False)
+        df = pd.DataFrame(data, index=self.index, copy=False)
+        if len(self.columns):
+            df.columns = self.columns
+        if self.geometry is not None:
+            df = gpd.GeoDataFrame(df, geometry=self.geometry, crs=self.crs)
+        df.attrs.update(self.attrs)
+        return df
+
+
+class _FrozenSeries:
+    """Snapshot of a Series (a Copy-on-Write tracked shallow copy)"""
+
+    def __init__(self, series: pd.Series):
+        self.series = series.copy(deep=False)
+        self.nbytes = int(series.memory_usage(deep=True))
+
+    def thaw(self) -> pd.Series:
+        return self.series.copy(deep=False)
+
+
+def _encode_strings(array: Any) -> Optional['pa.Array']:
+    """Pack an object array of Python strings into one Arrow buffer"""
+    if pa is None or not isinstance(array, _NUMPY_ARRAY) or array.dtype != object:
+        return None
+    try:
+        return pa.array(np.asarray(array), type=pa.string(), from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return None  # mixed types - keep the original objects
+
+
+def _decode_strings(array: 'pa.Array') -> np.ndarray:
+    values = array.to_numpy(zero_copy_only=False)
+    if array.null_count:
+        values[pd.isna(values)] = np.nan  # object columns use NaN, not None
+    return values
+
+
+def _freeze(value: Any) -> Any:
+    """Convert a result into its stored form"""
+    if isinstance(value, pd.DataFrame):
+        return _FrozenFrame(value)
+    if isinstance(value, pd.Series):
+        return _FrozenSeries(value)
+    if isinstance(value, dict):
+        return {k: _freeze(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_freeze(v) for v in value]
+    if isinstance(value, tuple) and type(value) is tuple:
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, np.ndarray):
+        frozen = value.copy()
+        frozen.flags.writeable = False
+        return frozen
+    if isinstance(value, _IMMUTABLE_TYPES) or _is_geometry(value):
+        return value
+    return copy.deepcopy(value)
+
+
+def _thaw(value: Any) -> Any:
+    """Rebuild a stored result; containers are fresh, large buffers are shared"""
+    if isinstance(value, (_FrozenFrame, _FrozenSeries)):
+        return value.thaw()
+    if isinstance(value, dict):
+        return {k: _thaw(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_thaw(v) for v in value]
+    if isinstance(value, tuple):
+        return tuple(_thaw(v) for v in value)
+    if isinstance(value, np.ndarray):
+        return value.copy()
+    if isinstance(value, _IMMUTABLE_TYPES) or _is_geometry(value):
+        return value
+    return copy.deepcopy(value)
+
+
+def _is_geometry(value: Any) -> bool:
+    return type(value).__module__.startswith('shapely')
+
+
+def _sizeof(value: Any) -> int:
+    """Approximate memory held by a stored result"""
+    if isinstance(value, (_FrozenFrame, _FrozenSeries)):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(_sizeof(k) + _sizeof(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(_sizeof(v) for v in value)
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    return sys.getsizeof(value)
+
+
+class ResultCache:
+    """
+    Byte-budgeted LRU cache of execution results.
+    """
+
+    def __init__(self, max_bytes: int = RESULT_CACHE_MB * 1024 * 1024):
+        """
+        Initialize the cache.
+
+        Args:
+            max_bytes: Total size of stored results before LRU eviction
+        """
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()  # key -> (entry, size)
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "rejected": 0}
+
+    @staticmethod
+    def make_key(code: str, dataset_version: str,
+                 custom_namespace: Optional[Dict[str, Any]] = None,
+                 function_name: str = "process_sf_film_query",
+                 optimize: bool = True) -> Optional[tuple]:
+        """
+        Build the cache key for one execution.
+
+        Args:
+            code: The generated code
+            dataset_version: Version of the dataset the code runs against
+            custom_namespace: Extra variables passed to the code
+            function_name: Function the code is called through
+            optimize: Whether the CodeOptimizer rewrites are applied
+
+        Returns:
+            Key tuple, or None if this execution must not be cached
+        """
+        code_hash = normalized_code_hash(code)
+        ns_hash = namespace_hash(custom_namespace)
+        if code_hash is None or ns_hash is None:
+            return None
+        return (code_hash, dataset_version, ns_hash, function_name, bool(optimize))
+
+    def get(self, key: tuple) -> Optional[Dict[str, Any]]:
+        """
+        Look up a result.
+
+        Args:
+            key: Key from make_key()
+
+        Returns:
+            A fresh copy of the stored result dict, or None on a miss
+        """
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+        return _thaw(item[0])
+
+    def put(self, key: tuple, result: Dict[str, Any]) -> None:
+        """
+        Store a successful result.
+
+        Args:
+            key: Key from make_key()
+            result: Result dict produced by CodeExecutor.execute_code
+        """
+        try:
+            entry = _freeze(result)
+        except Exception as e:
+            print(f"⚠️ Result not cacheable: {e}")
+            return
+        size = _sizeof(entry)
+
+        with self._lock:
+            if size > self.max_bytes:
+                self._stats["rejected"] += 1
+                return
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (entry, size)
+            self._bytes += size
+            self._stats["stores"] += 1
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self._stats["evictions"] += 1
+
+    def invalidate_version(self, dataset_version: str) -> None:
+        """
+        Drop all results computed against a dataset version.
+
+        Args:
+            dataset_version: Dataset version identifier
+        """
+        with self._lock:
+            for key in [k for k in self._entries if k[1] == dataset_version]:
+                self._bytes -= self._entries.pop(key)[1]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get cache counters.
+
+        Returns:
+            Dictionary of hits, misses, stores, evictions, entries and bytes used
+        """
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hit_rate": self._stats["hits"] / lookups if lookups else 0.0
+            }
+
+
+_shared_cache: Optional[ResultCache] = None
+_shared_lock = threading.Lock()
+
+
+def get_result_cache() -> Optional[ResultCache]:
+    """
+    Get the process-wide result cache shared by all sessions.
+
+    Returns:
+        Shared ResultCache, or None if disabled (SF_FILM_RESULT_CACHE_MB=0)
+    """
+    global _shared_cache
+    if RESULT_CACHE_MB <= 0:
+        return None
+    with _shared_lock:
+        if _shared_cache is None:
+            # Imported here so the module stays usable without the data layer
+            from src import data_loader
+            _shared_cache = ResultCache()
+            data_loader.store.register_cache(invalidate=_shared_cache.invalidate_version)
+        return _shared_cache
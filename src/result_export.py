@@ -0,0 +1,333 @@
+"""
+Result Export Module
+Downloadable exports of query results as CSV, GeoJSON and GeoParquet. Files
+are generated only when the user asks for one, a chunk of rows at a time
+(SF_FILM_EXPORT_CHUNK_ROWS), so geometry conversion and text encoding never
+run over a whole large result at once.
+
+The produced bytes are cached per (result id, format) in a byte-budgeted LRU
+(SF_FILM_EXPORT_CACHE_MB, 0 disables), so a download that is clicked again
+after a Streamlit rerun is not regenerated.
+"""
+
+import io
+import os
+import json
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+from typing import Dict, Any, Iterator, Optional, Tuple
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional - GeoParquet export is then unavailable
+    pa = None
+
+
+EXPORT_CHUNK_ROWS = int(os.getenv('SF_FILM_EXPORT_CHUNK_ROWS', '5000'))
+EXPORT_CACHE_MB = int(os.getenv('SF_FILM_EXPORT_CACHE_MB', '64'))
+
+# Format -> (label, file extension, MIME type)
+EXPORT_FORMATS = {
+    'csv': ('CSV', '.csv', 'text/csv'),
+    'geojson': ('GeoJSON', '.geojson', 'application/geo+json'),
+    'parquet': ('GeoParquet', '.parquet', 'application/vnd.apache.parquet'),
+}
+
+
+def _as_frame(data: Any) -> pd.DataFrame:
+    """DataFrame view of a displayed result"""
+    if isinstance(data, pd.DataFrame):
+        return data
+    if isinstance(data, pd.Series):
+        return data.to_frame()
+    return pd.DataFrame(data)
+
+
+def _geometry_columns(df: pd.DataFrame) -> list:
+    """GeometryDtype columns, and object columns holding only shapely geometries (or nulls)"""
+    columns = []
+    for c in df.columns:
+        series = df[c]
+        if isinstance(series.dtype, gpd.array.GeometryDtype):
+            columns.append(c)
+        elif series.dtype == object:
+            values = series.to_numpy()
+            is_geometry = shapely.is_geometry(values)
+            if is_geometry.any() and (is_geometry | pd.isna(values)).all():
+                columns.append(c)
+    return columns
+
+
+def _primary_geometry(df: pd.DataFrame, geometry_columns: list) -> Optional[str]:
+    """The active geometry of a GeoDataFrame, else a 'geometry' column, else the first one"""
+    if isinstance(df, gpd.GeoDataFrame) and df._geometry_column_name in geometry_columns:
+        return df._geometry_column_name
+    if 'geometry' in geometry_columns:
+        return 'geometry'
+    return geometry_columns[0] if geometry_columns else None
+
+
+def _chunks(df: pd.DataFrame, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    for start in range(0, len(df), max(1, chunk_rows)):
+        yield df.iloc[start:start + chunk_rows]
+
+
+def iter_csv(data: Any, chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[bytes]:
+    """
+    Encode a result as CSV, one chunk of rows at a time.
+
+    Args:
+        data: DataFrame or GeoDataFrame (geometry is written as WKT)
+        chunk_rows: Rows encoded per chunk
+
+    Yields:
+        UTF-8 CSV bytes (the header comes with the first chunk)
+    """
+    df = _as_frame(data)
+    geometry_columns = _geometry_columns(df)
+    if df.empty:
+        yield df.to_csv(index=False).encode('utf-8')
+        return
+    for i, chunk in enumerate(_chunks(df, chunk_rows)):
+        if geometry_columns:
+            chunk = pd.DataFrame(chunk)
+            for column in geometry_columns:
+                # rounding_precision=-1 gives the same text as geom.wkt
+                chunk[column] = shapely.to_wkt(np.asarray(chunk[column].values), rounding_precision=-1)
+        yield chunk.to_csv(index=False, header=i == 0).encode('utf-8')
+
+
+def iter_geojson(data: Any, chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[bytes]:
+    """
+    Encode a result as a GeoJSON FeatureCollection, one chunk of features at
+    a time.
+
+    Args:
+        data: GeoDataFrame (reprojected to WGS84) or DataFrame (a column of
+            shapely geometries is used if present, else null geometries)
+        chunk_rows: Features encoded per chunk
+
+    Yields:
+        UTF-8 GeoJSON bytes
+    """
+    df = _as_frame(data)
+    geometry_columns = _geometry_columns(df)
+    geometry_name = _primary_geometry(df, geometry_columns)
+    # Other geometry columns become WKT properties
+    extra_geometry = [c for c in geometry_columns if c != geometry_name]
+
+    yield b'{"type": "FeatureCollection", "features": ['
+    first = True
+    for chunk in _chunks(df, chunk_rows):
+        if geometry_name is not None:
+            geometry = gpd.GeoSeries(chunk[geometry_name])
+            if geometry.crs is not None and not geometry.crs.equals('EPSG:4326'):
+                geometry = geometry.to_crs('EPSG:4326')
+            geometry_json = shapely.to_geojson(np.asarray(geometry.values))
+            properties = pd.DataFrame(chunk.drop(columns=geometry_name))
+        else:
+            geometry_json = np.full(len(chunk), None, dtype=object)
+            properties = chunk
+        for column in extra_geometry:
+            properties[column] = shapely.to_wkt(np.asarray(properties[column].values))
+        # NaN is not valid JSON
+        records = properties.astype(object).where(properties.notna(), None).to_dict('records')
+
+        features = [
+            f'{{"type": "Feature", "properties": {json.dumps(props, default=str)}, '
+            f'"geometry": {geom if geom is not None else "null"}}}'
+            for props, geom in zip(records, geometry_json)
+        ]
+        if features:
+            yield (('' if first else ', ') + ', '.join(features)).encode('utf-8')
+            first = False
+    yield b']}'
+
+
+def _text_columns(df: pd.DataFrame) -> list:
+    """Object columns Arrow cannot type (e.g. Year holding 1999 and 'unknown'); exported as text"""
+    columns = []
+    for c in df.columns:
+        if df[c].dtype == object:
+            try:
+                pa.array(df[c], from_pandas=True)
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                columns.append(c)
+    return columns
+
+
+def _as_text(df: pd.DataFrame, columns: list) -> pd.DataFrame:
+    """df with the given columns converted to strings (nulls stay null)"""
+    if not columns:
+        return df
+    df = pd.DataFrame(df)
+    for column in columns:
+        series = df[column]
+        df[column] = series.astype(str).where(series.notna(), None)
+    return df
+
+
+def _geo_metadata(df: pd.DataFrame, geometry_columns: list) -> Dict[str, Any]:
+    """GeoParquet 1.0 'geo' metadata, computed over the whole frame (no encoding needed)"""
+    columns = {}
+    for column in geometry_columns:
+        series = gpd.GeoSeries(df[column])
+        types = sorted(t for t in series.geom_type.dropna().unique())
+        column_meta = {"encoding": "WKB", "geometry_types": types}
+        if series.crs is not None:
+            column_meta["crs"] = series.crs.to_json_dict()
+        if series.notna().any():
+            column_meta["bbox"] = [float(v) for v in series.total_bounds]
+        columns[column] = column_meta
+    return {"version": "1.0.0", "primary_column": _primary_geometry(df, geometry_columns),
+            "columns": columns}
+
+
+def iter_parquet(data: Any, chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[bytes]:
+    """
+    Encode a result as GeoParquet (plain Parquet if it has no geometry),
+    one row group per chunk.
+
+    Args:
+        data: GeoDataFrame or DataFrame
+        chunk_rows: Rows per row group
+
+    Yields:
+        Parquet file bytes
+    """
+    if pa is None:
+        raise RuntimeError("GeoParquet export requires pyarrow")
+    df = _as_frame(data)
+    geometry_columns = _geometry_columns(df)
+    properties = pd.DataFrame(df.drop(columns=geometry_columns))
+    text_columns = _text_columns(properties)
+
+    # One schema for all row groups (a chunk alone may be all-null in a column)
+    typed = pa.Schema.from_pandas(properties.drop(columns=text_columns), preserve_index=False)
+    property_schema = pa.schema([pa.field(c, pa.string()) if c in text_columns else typed.field(c)
+                                 for c in properties.columns])
+    metadata = {}
+    if geometry_columns:
+        metadata[b'geo'] = json.dumps(_geo_metadata(df, geometry_columns)).encode('utf-8')
+    schema = pa.schema(list(property_schema) + [pa.field(c, pa.binary()) for c in geometry_columns],
+                       metadata=metadata or None)
+
+    buffer = io.BytesIO()
+    with pq.ParquetWriter(buffer, schema) as writer:
+        for chunk in _chunks(df, chunk_rows):
+            table = pa.Table.from_pandas(_as_text(chunk.drop(columns=geometry_columns), text_columns),
+                                         schema=property_schema, preserve_index=False)
+            for column in geometry_columns:
+                table = table.append_column(
+                    column, pa.array(shapely.to_wkb(np.asarray(chunk[column].values)), type=pa.binary()))
+            writer.write_table(table.replace_schema_metadata(schema.metadata))
+            # Hand out what the row group produced and start over
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()  # footer
+
+
+_ENCODERS = {'csv': iter_csv, 'geojson': iter_geojson, 'parquet': iter_parquet}
+
+
+def iter_export(data: Any, fmt: str, chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[bytes]:
+    """
+    Encode a result in an export format, chunk by chunk.
+
+    Args:
+        data: DataFrame or GeoDataFrame
+        fmt: 'csv', 'geojson' or 'parquet'
+        chunk_rows: Rows per chunk
+
+    Yields:
+        Consecutive pieces of the file
+    """
+    if fmt not in _ENCODERS:
+        raise ValueError(f"Unknown export format '{fmt}' (expected one of {list(_ENCODERS)})")
+    return _ENCODERS[fmt](data, chunk_rows)
+
+
+class ResultExporter:
+    """
+    Generates exports on request and keeps the bytes per (result id, format).
+    """
+
+    def __init__(self, max_bytes: int = EXPORT_CACHE_MB * 1024 * 1024):
+        """
+        Initialize the exporter.
+
+        Args:
+            max_bytes: Cache budget before LRU eviction
+        """
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple[str, str], bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def export(self, data: Any, result_id: str, fmt: str) -> bytes:
+        """
+        Get a result as a downloadable file, generating it on first request.
+
+        Args:
+            data: DataFrame or GeoDataFrame of the result
+            result_id: Stable id of the result (e.g. stored with its chat message)
+            fmt: 'csv', 'geojson' or 'parquet'
+
+        Returns:
+            File content
+        """
+        key = (result_id, fmt)
+        with self._lock:
+            content = self._entries.get(key)
+            if content is not None:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return content
+            self._stats["misses"] += 1
+
+        content = b''.join(iter_export(data, fmt))
+        with self._lock:
+            if len(content) <= self.max_bytes:
+                self._entries[key] = content
+                self._bytes += len(content)
+                while self._bytes > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._bytes -= len(evicted)
+                    self._stats["evictions"] += 1
+        return content
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get cache counters.
+
+        Returns:
+            Dictionary of hits, misses, evictions, entries and bytes used
+        """
+        with self._lock:
+            return {**self._stats, "entries": len(self._entries),
+                    "bytes": self._bytes, "max_bytes": self.max_bytes}
+
+
+_shared_exporter: Optional[ResultExporter] = None
+_shared_lock = threading.Lock()
+
+
+def get_result_exporter() -> ResultExporter:
+    """
+    Get the process-wide exporter shared by all sessions.
+
+    Returns:
+        Shared ResultExporter (its cache is disabled with SF_FILM_EXPORT_CACHE_MB=0)
+    """
+    global _shared_exporter
+    with _shared_lock:
+        if _shared_exporter is None:
+            _shared_exporter = ResultExporter(max(0, EXPORT_CACHE_MB) * 1024 * 1024)
+        return _shared_exporter
@@ -0,0 +1,401 @@
+"""
+Sandbox Pool Module
+Runs generated code in pre-started worker processes instead of the server
+thread. Workers come from a multiprocessing forkserver: a single-threaded
+process that has pandas/geopandas preloaded, so a worker never inherits a
+lock held by one of the server's threads (logger, artifact writer, caches)
+the way a plain fork from a request thread could. Each worker receives the
+dataset once at start - pickled, or mapped from the shared Arrow copy when
+SF_FILM_SHARED_DATASET_DIR is set. Each job gets a wall-clock timeout; each
+worker an address-space limit. A worker that times out or dies is killed
+and replaced.
+
+Enabled with SF_FILM_SANDBOX_WORKERS > 0 (POSIX only - relies on forkserver).
+"""
+
+import os
+import time
+import atexit
+import pickle
+import signal
+import threading
+import queue
+import multiprocessing
+import geopandas as gpd
+from typing import Dict, Any, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+SANDBOX_WORKERS = int(os.getenv('SF_FILM_SANDBOX_WORKERS', '0'))
+SANDBOX_TIMEOUT = float(os.getenv('SF_FILM_SANDBOX_TIMEOUT', '30'))
+SANDBOX_MEMORY_MB = int(os.getenv('SF_FILM_SANDBOX_MEMORY_MB', '2048'))
+
+# How often a running job checks its cancel event (seconds)
+CANCEL_POLL_INTERVAL = 0.05
+# How often a job queued for a worker checks whether the pool was closed (seconds)
+ACQUIRE_POLL_INTERVAL = 0.1
+
+# execution_status of a job that could not run because its pool was closed;
+# the caller should retry it elsewhere (CodeExecutor runs it in-process)
+POOL_CLOSED_STATUS = "pool_closed"
+
+
+def _current_address_space() -> int:
+    """Virtual memory already mapped by this process (inherited from the parent)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[0]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return 0
+
+
+def _send_result(conn, result: Dict[str, Any]) -> None:
+    """
+    Send a result with pickle protocol 5: large array buffers travel
+    out-of-band as raw bytes instead of being copied into the pickle stream.
+    """
+    buffers: List[pickle.PickleBuffer] = []
+    payload = pickle.dumps(result, protocol=5, buffer_callback=buffers.append)
+    conn.send_bytes(len(buffers).to_bytes(4, 'little'))
+    conn.send_bytes(payload)
+    for buffer in buffers:
+        conn.send_bytes(buffer.raw())
+
+
+def _recv_result(conn) -> Dict[str, Any]:
+    """Receive a result sent by _send_result"""
+    count = int.from_bytes(conn.recv_bytes(), 'little')
+    payload = conn.recv_bytes()
+    buffers = [conn.recv_bytes() for _ in range(count)]
+    return pickle.loads(payload, buffers=buffers)
+
+
+def _failure_result(error_type: str, message: str, status: str) -> Dict[str, Any]:
+    """Error result in the same shape CodeExecutor produces"""
+    return {
+        "success": False,
+        "data": None,
+        "summary": f"Error executing generated code: {message}",
+        "metadata": {
+            "error": message,
+            "error_type": error_type,
+            "traceback": "",
+            "execution_status": status
+        }
+    }
+
+
+def _worker_main(conn, gdf: Optional[gpd.GeoDataFrame], version: Optional[str],
+                 memory_limit_mb: int) -> None:
+    """Worker loop: execute jobs in-process until the pipe closes"""
+    # Let the parent handle Ctrl+C; it tears the pool down
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    if gdf is None:
+        from src import shared_dataset
+        gdf = shared_dataset.open_dataset(version)
+        if gdf is None:
+            return  # not exported (any more); jobs report a crashed worker
+
+    if resource is not None and memory_limit_mb > 0:
+        # Budget on top of what the interpreter and the dataset already mapped
+        limit = _current_address_space() + memory_limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+    from src.code_executor import CodeExecutor
+    executor = CodeExecutor(gdf, sandbox_workers=0, cache_results=False)
+
+    while True:
+        try:
+            code, function_name, custom_namespace, optimize, profile = conn.recv()
+        except (EOFError, OSError):
+            break
+
+        # The parent handles result caching and profile logging
+        result = executor._execute_uncached(code, function_name, custom_namespace, optimize, profile)
+        try:
+            _send_result(conn, result)
+        except Exception as e:
+            # Result not picklable (or too large for the memory limit)
+            _send_result(conn, _failure_result(
+                type(e).__name__, f"Result could not be returned from sandbox: {e}", "failed"))
+
+
+class _Worker:
+    """One worker process and the parent's end of its pipe"""
+
+    def __init__(self, ctx, gdf: Optional[gpd.GeoDataFrame], version: Optional[str],
+                 memory_limit_mb: int):
+        self.conn, child_conn = ctx.Pipe(duplex=True)
+        self.process = ctx.Process(
+            target=_worker_main, args=(child_conn, gdf, version, memory_limit_mb),
+            name='sandbox-worker', daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+
+    def kill(self) -> None:
+        """Stop the worker immediately"""
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=5)
+        self.conn.close()
+
+
+class SandboxPool:
+    """
+    Pool of pre-started worker processes that execute generated code.
+    """
+
+    def __init__(
+        self,
+        gdf: gpd.GeoDataFrame,
+        num_workers: int = SANDBOX_WORKERS,
+        timeout: float = SANDBOX_TIMEOUT,
+        memory_limit_mb: int = SANDBOX_MEMORY_MB,
+        version: Optional[str] = None
+    ):
+        """
+        Start the workers.
+
+        Args:
+            gdf: The GeoPandas dataframe workers operate on
+            num_workers: Number of worker processes
+            timeout: Default per-job wall-clock limit in seconds
+            memory_limit_mb: Address space each worker may add on top of its dataset
+            version: Dataset version of gdf; with SF_FILM_SHARED_DATASET_DIR set,
+                workers map that version's shared copy instead of receiving gdf
+        """
+        self.gdf = gdf
+        self.num_workers = max(1, num_workers)
+        self.timeout = timeout
+        self.memory_limit_mb = memory_limit_mb
+        self._ctx = multiprocessing.get_context('forkserver')
+        # Imported once by the forkserver, so each worker starts without re-importing
+        self._ctx.set_forkserver_preload(['src.code_executor'])
+        from src import shared_dataset
+        self._version = version if version is not None and shared_dataset.is_enabled() else None
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._stats = {"jobs": 0, "timeouts": 0, "cancelled": 0, "crashes": 0, "respawns": 0}
+
+        for _ in range(self.num_workers):
+            self._idle.put(self._spawn())
+
+    def _spawn(self) -> _Worker:
+        if self._version is not None:
+            return _Worker(self._ctx, None, self._version, self.memory_limit_mb)
+        return _Worker(self._ctx, self.gdf, None, self.memory_limit_mb)
+
+    def _release(self, worker: _Worker) -> None:
+        """Return a worker to the pool (or stop it if the pool was closed meanwhile)"""
+        # Under the lock, so close() cannot drain the queue between the check and the put
+        with self._lock:
+            if not self._closed:
+                self._idle.put(worker)
+                return
+        worker.kill()
+
+    def _replace(self, worker: _Worker) -> None:
+        """Kill a stuck or dead worker and start a fresh one in its place"""
+        worker.kill()
+        with self._lock:
+            self._stats["respawns"] += 1
+            if self._closed:
+                return
+        self._release(self._spawn())
+
+    def execute(
+        self,
+        code: str,
+        function_name: str = "process_sf_film_query",
+        custom_namespace: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None,
+        optimize: bool = True,
+        profile: str = '',
+        cancel_event: Optional[threading.Event] = None
+    ) -> Dict[str, Any]:
+        """
+        Run code on an idle worker.
+
+        Args:
+            code: The Python code to execute
+            function_name: Name of the main function to call
+            custom_namespace: Additional (picklable) variables for the namespace
+            timeout: Wall-clock limit for this job (defaults to the pool's)
+            optimize: Let the worker apply the CodeOptimizer rewrites
+            profile: Profiling mode for the run ('', 'basic' or 'lines')
+            cancel_event: When set while the job runs, the worker is killed
+                and replaced and a 'cancelled' result is returned; when set
+                before the job reaches a worker, the job is skipped
+
+        Returns:
+            The same result dict CodeExecutor.execute_code produces, with
+            metadata['sandbox'] describing the run. If the pool is closed
+            before a worker was free, a failed result with execution_status
+            POOL_CLOSED_STATUS (the job did not run)
+        """
+        timeout = self.timeout if timeout is None else timeout
+        start = time.perf_counter()
+        worker = self._acquire(cancel_event)
+        if cancel_event is not None and cancel_event.is_set():
+            # Cancelled while queued: the worker never saw the job, so it
+            # goes back to the pool instead of being killed and replaced
+            if worker is not None:
+                self._release(worker)
+            with self._lock:
+                self._stats["cancelled"] += 1
+            return _failure_result("CancelledError", "Execution was cancelled", "cancelled")
+        if worker is None:
+            return _failure_result("PoolClosed", "Sandbox pool was closed before the job started",
+                                   POOL_CLOSED_STATUS)
+        with self._lock:
+            self._stats["jobs"] += 1
+
+        try:
+            worker.conn.send((code, function_name, custom_namespace, optimize, profile))
+            status = self._wait(worker, start + timeout, cancel_event)
+            if status == "timeout":
+                with self._lock:
+                    self._stats["timeouts"] += 1
+                self._replace(worker)
+                result = _failure_result(
+                    "TimeoutError", f"Execution exceeded {timeout:g}s time limit", "timeout")
+            elif status == "cancelled":
+                with self._lock:
+                    self._stats["cancelled"] += 1
+                self._replace(worker)
+                result = _failure_result("CancelledError", "Execution was cancelled", "cancelled")
+            else:
+                result = _recv_result(worker.conn)
+                self._release(worker)
+        except (EOFError, OSError, pickle.UnpicklingError) as e:
+            # Worker died mid-job (e.g. killed by the memory limit or a segfault)
+            with self._lock:
+                self._stats["crashes"] += 1
+            worker.process.join(timeout=1)
+            exitcode = worker.process.exitcode
+            self._replace(worker)
+            result = _failure_result(
+                "WorkerCrashed", f"Sandbox worker died (exit code {exitcode}): {e}", "crashed")
+
+        result["metadata"]["sandbox"] = {
+            "worker_pid": worker.process.pid,
+            "elapsed": time.perf_counter() - start
+        }
+        return result
+
+    def _acquire(self, cancel_event: Optional[threading.Event] = None) -> Optional[_Worker]:
+        """Wait for an idle worker; None once the pool is closed or the job cancelled"""
+        while not self._closed and not (cancel_event is not None and cancel_event.is_set()):
+            try:
+                worker = self._idle.get(timeout=ACQUIRE_POLL_INTERVAL)
+            except queue.Empty:
+                continue
+            if self._closed:
+                worker.kill()
+                break
+            return worker
+        return None
+
+    @staticmethod
+    def _wait(worker: _Worker, deadline: float, cancel_event: Optional[threading.Event]) -> str:
+        """Wait for a worker's reply; returns 'ready', 'timeout' or 'cancelled'"""
+        if cancel_event is None:
+            return "ready" if worker.conn.poll(max(0.0, deadline - time.perf_counter())) else "timeout"
+        while not cancel_event.is_set():
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                return "timeout"
+            if worker.conn.poll(min(remaining, CANCEL_POLL_INTERVAL)):
+                return "ready"
+        return "cancelled"
+
+    @property
+    def closed(self) -> bool:
+        """True once the pool's dataset version was retired"""
+        return self._closed
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get pool counters.
+
+        Returns:
+            Dictionary of jobs, timeouts, cancellations, crashes, respawns and worker count
+        """
+        with self._lock:
+            return {**self._stats, "workers": self.num_workers, "idle": self._idle.qsize()}
+
+    def close(self) -> None:
+        """Stop idle workers now; busy workers stop when their job finishes"""
+        with self._lock:
+            self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().kill()
+            except queue.Empty:
+                break
+
+
+_pools: Dict[str, SandboxPool] = {}
+_pools_lock = threading.Lock()
+_registered = False
+
+
+def get_sandbox_pool(
+    gdf: gpd.GeoDataFrame,
+    version: str,
+    num_workers: int = SANDBOX_WORKERS
+) -> SandboxPool:
+    """
+    Get the pool for a dataset version, starting it on first use.
+    Pools are shared by all sessions of the process.
+
+    Args:
+        gdf: The GeoPandas dataframe for that version
+        version: Dataset version identifier used as the key
+        num_workers: Number of worker processes if the pool is created
+
+    Returns:
+        Shared SandboxPool
+    """
+    global _registered
+    with _pools_lock:
+        if not _registered:
+            # Imported here so the module stays usable without the data layer
+            from src import data_loader
+            data_loader.store.register_cache(invalidate=close_sandbox_pool)
+            atexit.register(close_all_sandbox_pools)
+            _registered = True
+
+        pool = _pools.get(version)
+        if pool is None:
+            pool = SandboxPool(gdf, num_workers=num_workers, version=version)
+            _pools[version] = pool
+        return pool
+
+
+def close_sandbox_pool(version: str) -> None:
+    """
+    Close the pool of a dataset version that is no longer active.
+
+    Args:
+        version: Dataset version identifier
+    """
+    with _pools_lock:
+        pool = _pools.pop(version, None)
+    if pool is not None:
+        pool.close()
+
+
+def close_all_sandbox_pools() -> None:
+    """Close every pool (at interpreter exit)"""
+    with _pools_lock:
+        versions = list(_pools)
+    for version in versions:
+        close_sandbox_pool(version)
@@ -0,0 +1,174 @@
+"""
+Shared Dataset Module
+Writes the film dataset and its derived index tables once to memory-mapped
+Arrow IPC files so several server processes on the same box can map them
+read-only instead of each decoding the GeoPackage into its own heap.
+
+Enabled by setting SF_FILM_SHARED_DATASET_DIR to a directory shared by the
+processes (e.g. /dev/shm/sf_film). Layout:
+
+    <dir>/<version>/dataset.arrow              # GeoArrow-encoded dataset
+    <dir>/<version>/<index>/<table>.arrow      # derived tables (stats, ...)
+"""
+
+import os
+import uuid
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+from pathlib import Path
+from typing import Dict, Optional
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+except ImportError:  # optional - only needed when the shared mode is on
+    pa = None
+
+
+SHARED_DATASET_DIR = os.getenv('SF_FILM_SHARED_DATASET_DIR', '')
+
+
+def is_enabled() -> bool:
+    """Check whether the shared memory-mapped mode is configured"""
+    return bool(SHARED_DATASET_DIR)
+
+
+def _require_pyarrow() -> None:
+    if pa is None:
+        raise RuntimeError(
+            "SF_FILM_SHARED_DATASET_DIR is set but pyarrow is not installed. "
+            "Install it with: pip install pyarrow"
+        )
+
+
+def _version_dir(version: str) -> Path:
+    return Path(SHARED_DATASET_DIR) / version
+
+
+def _string_types_mapper():
+    """Keep strings in Arrow buffers (backed by the mapping) instead of Python objects"""
+    try:
+        dtype = pd.StringDtype(storage='pyarrow', na_value=np.nan)
+    except TypeError:  # pandas < 2.3
+        dtype = pd.StringDtype(storage='pyarrow')
+    return {pa.string(): dtype, pa.large_string(): dtype}.get
+
+
+def _write_table(table: 'pa.Table', path: Path) -> None:
+    """Write an uncompressed IPC file atomically (tmp file + rename)"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        with pa.OSFile(str(tmp_path), 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        # Concurrent writers produce identical files, so last rename wins safely
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
+def _map_table(path: Path) -> 'pa.Table':
+    """Memory-map an IPC file read-only; buffers point into the page cache"""
+    source = pa.memory_map(str(path), 'r')
+    return pa.ipc.open_file(source).read_all()
+
+
+def write_dataset(gdf: gpd.GeoDataFrame, version: str) -> Path:
+    """
+    Export a dataset version to the shared directory.
+
+    Args:
+        gdf: The GeoPandas dataframe to export
+        version: Dataset version identifier
+
+    Returns:
+        Path of the written Arrow file
+    """
+    _require_pyarrow()
+    path = _version_dir(version) / 'dataset.arrow'
+    table = pa.table(gdf.to_arrow(index=False, geometry_encoding='geoarrow'))
+    _write_table(table, path)
+    return path
+
+
+def open_dataset(version: str) -> Optional[gpd.GeoDataFrame]:
+    """
+    Map a previously exported dataset version.
+
+    Args:
+        version: Dataset version identifier
+
+    Returns:
+        GeoDataFrame whose attribute columns are backed by the mapping,
+        or None if the version has not been exported yet
+    """
+    _require_pyarrow()
+    path = _version_dir(version) / 'dataset.arrow'
+    if not path.exists():
+        return None
+
+    table = _map_table(path)
+    # Only the point geometries are materialized per process (shapely objects)
+    return gpd.GeoDataFrame.from_arrow(
+        table, to_pandas_kwargs={'types_mapper': _string_types_mapper()}
+    )
+
+
+def write_index(version: str, name: str, tables: Dict[str, pd.DataFrame]) -> None:
+    """
+    Export derived tables for a dataset version.
+
+    Args:
+        version: Dataset version identifier
+        name: Index name (one directory per index)
+        tables: Table name -> DataFrame
+    """
+    _require_pyarrow()
+    for table_name, df in tables.items():
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        _write_table(table, _version_dir(version) / name / f"{table_name}.arrow")
+
+
+def read_index(version: str, name: str) -> Optional[Dict[str, pd.DataFrame]]:
+    """
+    Map the derived tables of a dataset version.
+
+    Args:
+        version: Dataset version identifier
+        name: Index name
+
+    Returns:
+        Table name -> DataFrame, or None if the index has not been exported
+    """
+    _require_pyarrow()
+    index_dir = _version_dir(version) / name
+    if not index_dir.is_dir():
+        return None
+
+    return {
+        path.stem: _map_table(path).to_pandas(types_mapper=_string_types_mapper())
+        for path in sorted(index_dir.glob('*.arrow'))
+    }
+
+
+def load_or_export(gdf_loader, version: str) -> gpd.GeoDataFrame:
+    """
+    Map the shared copy of a version, exporting it first if this is the
+    first process to need it.
+
+    Args:
+        gdf_loader: Zero-argument callable that decodes the source file
+        version: Dataset version identifier
+
+    Returns:
+        GeoDataFrame backed by the shared mapping
+    """
+    gdf = open_dataset(version)
+    if gdf is not None:
+        return gdf
+
+    write_dataset(gdf_loader(), version)
+    return open_dataset(version)
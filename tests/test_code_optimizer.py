@@ -0,0 +1,175 @@
+"""
+Equivalence tests for CodeOptimizer: every rewrite must give the same result
+as the original script, and scalar row['col'] expressions are left alone.
+"""
+
+import geopandas as gpd
+import pandas as pd
+import pytest
+from shapely.geometry import Point
+
+from src.code_executor import CodeExecutor
+from src.code_optimizer import CodeOptimizer
+
+
+@pytest.fixture
+def gdf():
+    return gpd.GeoDataFrame(
+        {
+            "Title": ["Vertigo", "Bullitt", "The Rock", "Milk", "Vertigo", "Zodiac"],
+            "Locations": ["Golden Gate Bridge", "Russian Hill", "Alcatraz Island",
+                          "Castro Theatre", "Fort Point", "Golden Gate Park"],
+            "Year": [1958, 1968, 1996, 2008, 1958, 2007],
+        },
+        geometry=[Point(-122.4 - i / 100, 37.8) for i in range(6)],
+        crs="EPSG:4326",
+    )
+
+
+def _run(code, gdf):
+    namespace = {"gdf": gdf, "pd": pd, "gpd": gpd}
+    exec(code, namespace)
+    return namespace["process_sf_film_query"](gdf)
+
+
+def _assert_equivalent(code, gdf, rewrite):
+    optimized, rewrites = CodeOptimizer(text_columns={"Title", "Locations"}).optimize(code)
+    assert rewrite in [r["rewrite"] for r in rewrites]
+    expected, actual = _run(code, gdf), _run(optimized, gdf)
+    if isinstance(expected, (pd.DataFrame, pd.Series)):
+        assert expected.equals(actual)
+    else:
+        assert expected == actual
+
+
+def test_str_accessor(gdf):
+    code = """
+def process_sf_film_query(gdf):
+    return gdf['Title'].apply(lambda t: t.lower()).tolist()
+"""
+    _assert_equivalent(code, gdf, "str_accessor")
+
+
+def test_str_contains(gdf):
+    code = """
+def process_sf_film_query(gdf):
+    df = gdf.copy()
+    return df[df['Locations'].apply(lambda loc: 'Golden' in loc)]
+"""
+    _assert_equivalent(code, gdf, "str_contains")
+
+
+def test_apply_isin(gdf):
+    code = """
+def process_sf_film_query(gdf):
+    return gdf[gdf['Title'].map(lambda t: t in ['Milk', 'Zodiac'])]
+"""
+    _assert_equivalent(code, gdf, "isin")
+
+
+def test_or_chain_isin(gdf):
+    code = """
+def process_sf_film_query(gdf):
+    recent = gdf[gdf['Year'] > 1960]
+    return recent[(recent['Year'] == 1996) | (recent['Year'] == 2007) | (recent['Year'] == 2008)]
+"""
+    _assert_equivalent(code, gdf, "isin")
+
+
+def test_iterrows_collect(gdf):
+    code = """
+def process_sf_film_query(gdf):
+    titles = []
+    for _, row in gdf.iterrows():
+        if row['Year'] < 2000:
+            titles.append(row['Title'])
+    return titles
+"""
+    _assert_equivalent(code, gdf, "iterrows_collect")
+
+
+def test_iterrows_count(gdf):
+    code = """
+def process_sf_film_query(gdf):
+    counts = {}
+    for _, row in gdf.iterrows():
+        counts[row['Title']] = counts.get(row['Title'], 0) + 1
+    return counts
+"""
+    _assert_equivalent(code, gdf, "iterrows_count")
+
+
+def test_hoisted_mask(gdf):
+    code = """
+def process_sf_film_query(gdf):
+    matches = gdf[gdf['Locations'].str.contains('Golden')]
+    count = int(gdf['Locations'].str.contains('Golden').sum())
+    return matches['Title'].tolist(), count
+"""
+    _assert_equivalent(code, gdf, "hoisted_mask")
+
+
+def test_row_wise_apply_is_not_rewritten(gdf):
+    # row['Year'] is a scalar here; .isin() would raise on an int
+    code = """
+def process_sf_film_query(gdf):
+    return gdf[gdf.apply(lambda row: (row['Year'] == 1958) | (row['Year'] == 2008), axis=1)]
+"""
+    optimized, rewrites = CodeOptimizer().optimize(code)
+    assert rewrites == []
+    assert optimized == code
+    assert _run(code, gdf)["Title"].tolist() == ["Vertigo", "Milk", "Vertigo"]
+
+
+def test_non_frame_names_are_not_rewritten():
+    code = """
+def process_sf_film_query(gdf):
+    for record in gdf.to_dict('records'):
+        if (record['Year'] == 1958) | (record['Year'] == 2008):
+            return record
+    row = gdf.iloc[0]
+    return (row['Year'] == 1958) | (row['Year'] == 2008)
+"""
+    assert CodeOptimizer().optimize(code) == (code, [])
+
+
+def test_executor_reverts_rewrite_on_caught_error(gdf):
+    # The template's try/except reports failures in the result metadata
+    # instead of raising; a rewrite that fails this way must still be reverted
+    code = """
+def process_sf_film_query(gdf):
+    try:
+        titles = gdf['Title'].apply(lambda t: t.lower())
+        return {'data': titles.tolist(), 'summary': 'ok', 'metadata': {}}
+    except Exception as e:
+        return {'data': None, 'summary': 'failed', 'metadata': {'error': str(e)}}
+"""
+    executor = CodeExecutor(gdf, sandbox_workers=0, cache_results=False)
+    broken = {"rewrite": "str_accessor", "line": 4, "description": "broken rewrite"}
+    executor.optimizer.optimize = lambda source, function_name: (
+        source.replace("t.lower()", "t.no_such_method()"), [broken])
+
+    result = executor.execute_code(code)
+    assert result["metadata"]["optimizations"]["reverted"] == [broken]
+    assert result["data"]["metadata"] == {}
+    assert result["data"]["data"] == [t.lower() for t in gdf["Title"]]
+
+
+@pytest.mark.parametrize("expression", [
+    "t.count('.')",
+    "t.split('.')",
+    "t.split('.|', 1)",
+    "t.rsplit('.', 1)",
+    "t.replace('.', '-')",
+    "t.replace('(c)', '')",
+    "t.find('.')",
+])
+def test_str_accessor_treats_patterns_literally(expression):
+    # Regex metacharacters must keep their plain-string meaning
+    frame = pd.DataFrame({"Title": ["a.b", "St. John.s (c)", "x", ".|.|y"]})
+    code = f"""
+def process_sf_film_query(gdf):
+    return gdf['Title'].apply(lambda t: {expression}).tolist()
+"""
+    optimized, _ = CodeOptimizer(text_columns={"Title"}).optimize(code)
+    assert _run(optimized, frame) == _run(code, frame)
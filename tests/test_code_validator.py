@@ -0,0 +1,92 @@
+"""
+Safety tests for CodeValidator's attribute allowlist.
+"""
+
+import pytest
+
+from src.code_validator import CodeValidator
+
+
+@pytest.fixture
+def validator():
+    return CodeValidator(max_complexity=None, extra_attributes={"Title", "Year", "Locations"})
+
+
+def _script(body):
+    return "def process_sf_film_query(gdf):\n" + "\n".join(f"    {line}" for line in body.splitlines())
+
+
+@pytest.mark.parametrize("body", [
+    "pd.io.common.os.remove('x')\nreturn None",
+    "return np.lib.format",
+    "return pd.core.common",
+    "import operator\nreturn operator.attrgetter('io')(pd)",
+])
+def test_module_traversal_is_rejected(validator, body):
+    result = validator.validate(_script(body))
+    assert not result["is_valid"]
+
+
+@pytest.mark.parametrize("body", [
+    "a = np.zeros(3)\nnp.save('f', a)\nreturn a",
+    "np.savez('f', np.zeros(3))\nreturn None",
+    "np.zeros(3).tofile('f')\nreturn None",
+    "return np.load('f.npy')",
+    "return pd.read_csv('/etc/passwd')",
+    "return gpd.read_file('x.gpkg')",
+    "gdf.to_parquet('x.parquet')\nreturn None",
+    "gdf.to_file('x.gpkg')\nreturn None",
+])
+def test_io_is_rejected(validator, body):
+    result = validator.validate(_script(body))
+    assert not result["is_valid"]
+    assert any("file/database access" in issue for issue in result["issues"])
+
+
+def test_unknown_attribute_is_rejected(validator):
+    result = validator.validate(_script("return gdf.no_such_attribute"))
+    assert not result["is_valid"]
+
+
+@pytest.mark.parametrize("body", [
+    "df = gdf[gdf['Locations'].str.contains('Golden', na=False)]\n"
+    "return df.groupby('Title').size().sort_values(ascending=False).head(5)",
+    "return gdf.to_crs(epsg=3857).geometry.centroid.x.tolist()",
+    "return [row.Title for row in gdf.itertuples() if row.Year > 2000]",
+    "return float(np.linalg.norm(np.asarray([gdf.Year.min(), gdf.Year.max()])))",
+    "from collections import Counter\nreturn Counter(gdf['Title']).most_common(3)",
+    "return gdf.geometry.buffer(0.01).unary_union.bounds",
+    "return gdf.to_csv(index=False)",
+])
+def test_common_analysis_code_is_allowed(validator, body):
+    result = validator.validate(_script(body))
+    assert result["is_valid"], result["issues"]
+
+
+FORMATTER_PAYLOAD = '''
+from string import Formatter
+
+def process_sf_film_query(gdf):
+    def f():
+        pass
+    g = Formatter().get_field('0.__globals__', [f], {})[0]
+    g['__builtins__']['exec']("import os; os.system('echo pwned')")
+    return None
+'''
+
+
+def test_format_field_escape_is_rejected(validator):
+    result = validator.validate(FORMATTER_PAYLOAD)
+    assert not result["is_valid"]
+    assert any("import from 'string'" in issue for issue in result["issues"])
+    assert any("__globals__" in issue for issue in result["issues"])
+    assert any("__builtins__" in issue for issue in result["issues"])
+
+
+@pytest.mark.parametrize("body", [
+    "return '{0.__class__}'.format(gdf)",
+    "return {'a': 1}['__builtins__']",
+    "return f'{gdf}__globals__'",
+])
+def test_dunder_strings_are_rejected(validator, body):
+    assert not validator.validate(_script(body))["is_valid"]